@@ -72,6 +72,8 @@ function showPopup(message: string): void {
 
         popupClose.onclick = () => {
             popup.classList.add('hidden');
+            // The status of a protective stop recovery belongs to the message that is closed
+            document.getElementById('popup-status')?.classList.add('hidden');
         };
     }
 }
\ No newline at end of file
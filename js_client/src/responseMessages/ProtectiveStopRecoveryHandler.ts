@@ -0,0 +1,29 @@
+import {ResponseMessage, ResponseMessageType, Status} from "./responseMessageDefinitions";
+
+const failedClass = "recovery-failed"
+
+/**
+ * Shows the progress of the protective stop recovery below the message of the popup, so the protective stop message
+ * the popup already shows stays visible. Only a failed recovery opens the popup, since the operator has to act then.
+ */
+export function handleProtectiveStopRecoveryMessage(message: ResponseMessage): void {
+    if (message.type !== ResponseMessageType.ProtectiveStopRecovery) {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    console.log(`Protective stop recovery ${message.data.state}: ${message.data.message}`);
+
+    const popup = document.getElementById('popup');
+    const popupStatus = document.getElementById('popup-status');
+    if (!popup || !popupStatus) {
+        console.error('Popup element not found');
+        return;
+    }
+
+    popupStatus.textContent = message.data.message;
+    popupStatus.classList.toggle(failedClass, message.data.status === Status.Error);
+    popupStatus.classList.remove('hidden');
+
+    if (message.data.state === 'failed') {
+        popup.classList.remove('hidden');
+    }
+}
@@ -5,7 +5,12 @@ export enum ResponseMessageType {
     AckResponse = 'Ack_response',
     Feedback = 'Feedback',
     RtdeState = 'Robot_state',
-    ReportState = 'Report_state'
+    ReportState = 'Report_state',
+    RtdeHistory = 'Rtde_history',
+    RtdeSamples = 'Rtde_samples',
+    ProxyState = 'Proxy_state',
+    RtdeConnection = 'Rtde_connection',
+    ProtectiveStopRecovery = 'Protective_stop_recovery'
 }
 
 export enum Status {
@@ -13,7 +18,7 @@ export enum Status {
     Error = 'Error'
 }
 
-export type ResponseMessage = AckResponseMessage | FeedbackMessage | RtdeStateMessage | ReportStateMessage
+export type ResponseMessage = AckResponseMessage | FeedbackMessage | RtdeStateMessage | ReportStateMessage | RtdeHistoryMessage | RtdeSamplesMessage | ProxyStateMessage | RtdeConnectionMessage | ProtectiveStopRecoveryMessage
 
 export type AckResponseMessageData = {
     id: number,
@@ -78,4 +83,80 @@ export type ReportStateMessage = {
     data: VariableObject[],
     id: number,
     timestamp: number
-}
\ No newline at end of file
+}
+
+/**
+ * The answer to a RtdeHistoryRequestMessage. The timestamps are in ms since the epoch.
+ * fields holds one entry per requested field, a number per sample for scalar fields and an array per sample for vectors.
+ */
+export type RtdeHistoryMessageData = {
+    id: number,
+    start: number,
+    end: number,
+    timestamps: number[],
+    fields: Record<string, number[] | number[][]>
+}
+
+export type RtdeHistoryMessage = {
+    type: ResponseMessageType.RtdeHistory,
+    data: RtdeHistoryMessageData
+}
+
+/**
+ * Samples for the RTDE subscription of this client. The timestamps are in ms since the epoch.
+ */
+export type RtdeSamplesMessageData = {
+    timestamps: number[],
+    fields: Record<string, number[] | number[][]>
+}
+
+export type RtdeSamplesMessage = {
+    type: ResponseMessageType.RtdeSamples,
+    data: RtdeSamplesMessageData
+}
+
+/**
+ * Whether the proxy is connected to the robot. Sent as the first message after connecting and whenever it changes.
+ * Commands are rejected until the state is ready.
+ */
+export type ProxyStateMessageData = {
+    state: 'starting' | 'connecting' | 'ready' | 'failed',
+    message: string
+}
+
+export type ProxyStateMessage = {
+    type: ResponseMessageType.ProxyState,
+    data: ProxyStateMessageData
+}
+
+/**
+ * Sent when the RTDE stream from the robot is lost and again when it resumes. The times are in ms since the epoch,
+ * resumedAt is null while the stream is lost. No samples exist between lostAt and resumedAt.
+ */
+export type RtdeConnectionMessageData = {
+    connected: boolean,
+    message: string,
+    lostAt: number,
+    resumedAt: number | null
+}
+
+export type RtdeConnectionMessage = {
+    type: ResponseMessageType.RtdeConnection,
+    data: RtdeConnectionMessageData
+}
+
+/**
+ * The progress of the automatic recovery from a protective stop, sent whenever its state changes.
+ * attempt is the number of unlock attempts so far. The status is Error if the recovery gave up.
+ */
+export type ProtectiveStopRecoveryMessageData = {
+    state: 'idle' | 'locked_out' | 'unlocking' | 'releasing' | 'failed',
+    message: string,
+    attempt: number,
+    status: Status
+}
+
+export type ProtectiveStopRecoveryMessage = {
+    type: ResponseMessageType.ProtectiveStopRecovery,
+    data: ProtectiveStopRecoveryMessageData
+}
@@ -1,8 +1,11 @@
 import {
     AckResponseMessage,
-    FeedbackMessage, ReportStateMessage,
+    FeedbackMessage, ProtectiveStopRecoveryMessage, ProxyStateMessage, ReportStateMessage,
     ResponseMessage,
     ResponseMessageType,
+    RtdeConnectionMessage,
+    RtdeHistoryMessage,
+    RtdeSamplesMessage,
     RtdeStateMessage,
     Status, VariableObject
 } from "./responseMessageDefinitions";
@@ -19,6 +22,16 @@ export function parseMessage(message: string): ResponseMessage {
             return parseRtdeStateMessage(parsed);
         case "Report_state":
             return parseReportStateMessage(parsed);
+        case "Rtde_history":
+            return parseRtdeHistoryMessage(parsed);
+        case "Rtde_samples":
+            return parseRtdeSamplesMessage(parsed);
+        case "Proxy_state":
+            return parseProxyStateMessage(parsed);
+        case "Rtde_connection":
+            return parseRtdeConnectionMessage(parsed);
+        case "Protective_stop_recovery":
+            return parseProtectiveStopRecoveryMessage(parsed);
         default:
             throw new Error(`Invalid message type: ${parsed.type}`);
     }
@@ -98,3 +111,75 @@ function parseReportStateMessage(message: any): ReportStateMessage {
         timestamp: noneGuard(message.timestamp),
     };
 }
+
+function parseRtdeHistoryMessage(message: any): RtdeHistoryMessage {
+    if (message.type !== "Rtde_history") {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    return {
+        type: ResponseMessageType.RtdeHistory,
+        data: {
+            id: noneGuard(message.data.id),
+            start: noneGuard(message.data.start),
+            end: noneGuard(message.data.end),
+            timestamps: noneGuard(message.data.timestamps),
+            fields: noneGuard(message.data.fields),
+        }
+    };
+}
+
+function parseRtdeSamplesMessage(message: any): RtdeSamplesMessage {
+    if (message.type !== "Rtde_samples") {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    return {
+        type: ResponseMessageType.RtdeSamples,
+        data: {
+            timestamps: noneGuard(message.data.timestamps),
+            fields: noneGuard(message.data.fields),
+        }
+    };
+}
+
+function parseProxyStateMessage(message: any): ProxyStateMessage {
+    if (message.type !== "Proxy_state") {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    return {
+        type: ResponseMessageType.ProxyState,
+        data: {
+            state: noneGuard(message.data.state),
+            message: noneGuard(message.data.message),
+        }
+    };
+}
+
+function parseRtdeConnectionMessage(message: any): RtdeConnectionMessage {
+    if (message.type !== "Rtde_connection") {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    return {
+        type: ResponseMessageType.RtdeConnection,
+        data: {
+            connected: noneGuard(message.data.connected),
+            message: noneGuard(message.data.message),
+            lostAt: noneGuard(message.data.lostAt),
+            resumedAt: message.data.resumedAt ?? null,
+        }
+    };
+}
+
+function parseProtectiveStopRecoveryMessage(message: any): ProtectiveStopRecoveryMessage {
+    if (message.type !== "Protective_stop_recovery") {
+        throw new Error(`Invalid message type: ${message.type}`);
+    }
+    return {
+        type: ResponseMessageType.ProtectiveStopRecovery,
+        data: {
+            state: noneGuard(message.data.state),
+            message: noneGuard(message.data.message),
+            attempt: noneGuard(message.data.attempt),
+            status: parseStatus(message.data.status),
+        }
+    };
+}
@@ -12,6 +12,7 @@ import {
 } from "./userMessages/userMessageFactory";
 import {InspectionPointFormat, UserMessage} from "./userMessages/userMessageDefinitions";
 import {handleReportStateMessage} from "./responseMessages/ReportStateMessageHandler";
+import {handleProtectiveStopRecoveryMessage} from "./responseMessages/ProtectiveStopRecoveryHandler";
 
 /**
  * This is the time in milliseconds that the client will wait between attempting to reconnect to the server after losing connection.
@@ -46,6 +47,9 @@ function handleMessageFromProxyServer(message: ResponseMessage) {
         case ResponseMessageType.ReportState:
             handleReportStateMessage(message);
             break;
+        case ResponseMessageType.ProtectiveStopRecovery:
+            handleProtectiveStopRecoveryMessage(message);
+            break;
         default:
             break;
     }
@@ -5,9 +5,11 @@ export enum UserMessageType {
     Command = 'Command',
     Debug = 'Debug',
     StopCommand = 'StopCommand',
+    RtdeHistoryRequest = 'Rtde_history_request',
+    RtdeSubscription = 'Rtde_subscription',
 }
 
-export type UserMessage = CommandMessage | InspectionPointMessage | StopCommandMessage;
+export type UserMessage = CommandMessage | InspectionPointMessage | StopCommandMessage | RtdeHistoryRequestMessage | RtdeSubscriptionMessage;
 
 export type CommandMessageData = {
     id: number,
@@ -51,3 +53,37 @@ export type StopCommandMessage = {
     type: UserMessageType.StopCommand,
     data: StopCommandMessageData
 }
+
+/**
+ * start and end are in ms since the epoch, the same time base as the timestamp of a ReportStateMessage.
+ * If maxSamples is set, the proxy thins out the samples evenly to at most that many.
+ */
+export type RtdeHistoryRequestMessageData = {
+    id: number,
+    fields: string[],
+    start: number,
+    end: number,
+    maxSamples?: number,
+}
+
+export type RtdeHistoryRequestMessage = {
+    type: UserMessageType.RtdeHistoryRequest,
+    data: RtdeHistoryRequestMessageData
+}
+
+/**
+ * Subscribes this client to the given RTDE fields, sent at most maxRate times per second.
+ * "decimate" sends the first sample of every period, "average" sends the mean of the samples in the period.
+ * An empty list of fields ends the subscription.
+ */
+export type RtdeSubscriptionMessageData = {
+    id: number,
+    fields: string[],
+    maxRate: number,
+    mode: 'decimate' | 'average',
+}
+
+export type RtdeSubscriptionMessage = {
+    type: UserMessageType.RtdeSubscription,
+    data: RtdeSubscriptionMessageData
+}
@@ -1,7 +1,7 @@
 import {
     CommandMessage,
     InspectionPointFormat, InspectionPointMessage, InspectionVariable, InspectionPointMessageData,
-    UserMessageType, StopCommandMessage
+    UserMessageType, StopCommandMessage, RtdeHistoryRequestMessage, RtdeSubscriptionMessage
 } from "./userMessageDefinitions";
 
 
@@ -47,4 +47,29 @@ export function createStopCommandMessage(id: number, command: string): StopComma
             message: command,
         }
     };
-}
\ No newline at end of file
+}
+
+export function createRtdeHistoryRequestMessage(id: number, fields: string[], start: number, end: number, maxSamples?: number): RtdeHistoryRequestMessage {
+    return {
+        type: UserMessageType.RtdeHistoryRequest,
+        data: {
+            id: id,
+            fields: fields,
+            start: start,
+            end: end,
+            maxSamples: maxSamples,
+        }
+    };
+}
+
+export function createRtdeSubscriptionMessage(id: number, fields: string[], maxRate: number, mode: 'decimate' | 'average' = 'decimate'): RtdeSubscriptionMessage {
+    return {
+        type: UserMessageType.RtdeSubscription,
+        data: {
+            id: id,
+            fields: fields,
+            maxRate: maxRate,
+            mode: mode,
+        }
+    };
+}
@@ -0,0 +1,149 @@
+"""
+The opt-in binary framing of messages sent to web clients.
+
+A client asks for it by offering the websocket subprotocol BINARY_SUBPROTOCOL when it connects.
+Clients that do not offer it keep receiving JSON text frames.
+Messages without a binary encoding are still sent as JSON text frames to binary clients.
+
+All numbers are little-endian. Every binary frame starts with a one byte BinaryTag followed by the payload:
+
+    str         u32 length in bytes, followed by the utf-8 bytes
+    f64 array   u32 number of values, followed by the f64 values
+    value       u8 ValueKind followed by the value itself, see ValueKind
+
+    Robot_state     i8 safety_status, i8 runtime_state, i8 robot_mode (the enum values)
+    Ack_response    i64 id, u8 status (0 = Ok, 1 = Error), str command, str message
+    Report_state    i64 id, i64 timestamp (same unit as in the JSON message), u16 number of variables,
+                    per variable: str name, str type, u8 global, value
+    Rtde_samples    u32 number of samples, u16 number of fields, f64 array timestamps in ms,
+                    per field: str name, u8 values per sample, f64 array values (sample by sample)
+    Rtde_history    i64 id, f64 start, f64 end, followed by the same layout as Rtde_samples
+"""
+import json
+import struct
+from enum import IntEnum, Enum
+
+import numpy as np
+
+BINARY_SUBPROTOCOL = "inspection-points.binary"
+JSON_SUBPROTOCOL = "inspection-points.json"
+
+
+class WireFormat(Enum):
+    json = "json"
+    binary = "binary"
+
+    @classmethod
+    def from_subprotocol(cls, subprotocol: str | None):
+        if subprotocol == BINARY_SUBPROTOCOL:
+            return cls.binary
+        return cls.json
+
+
+class BinaryTag(IntEnum):
+    Robot_state = 1
+    Ack_response = 2
+    Report_state = 3
+    Rtde_samples = 4
+    Rtde_history = 5
+
+
+class ValueKind(IntEnum):
+    Null = 0
+    Boolean = 1  # u8
+    Integer = 2  # i64
+    Float = 3  # f64
+    String = 4  # str
+    Float_array = 5  # f64 array
+    Json = 6  # str holding any other value as JSON
+
+
+_u8 = struct.Struct("<B")
+_i8 = struct.Struct("<b")
+_u16 = struct.Struct("<H")
+_u32 = struct.Struct("<I")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+
+
+class BinaryWriter:
+    """Builds a single binary frame. The methods return the writer, so calls can be chained."""
+
+    def __init__(self, tag: BinaryTag):
+        self._parts: list[bytes] = [_u8.pack(tag)]
+
+    def u8(self, value: int):
+        self._parts.append(_u8.pack(value))
+        return self
+
+    def i8(self, value: int):
+        self._parts.append(_i8.pack(value))
+        return self
+
+    def u16(self, value: int):
+        self._parts.append(_u16.pack(value))
+        return self
+
+    def u32(self, value: int):
+        self._parts.append(_u32.pack(value))
+        return self
+
+    def i64(self, value: int):
+        self._parts.append(_i64.pack(value))
+        return self
+
+    def f64(self, value: float):
+        self._parts.append(_f64.pack(value))
+        return self
+
+    def string(self, value: str):
+        encoded = value.encode()
+        self._parts.append(_u32.pack(len(encoded)))
+        self._parts.append(encoded)
+        return self
+
+    def f64_array(self, values):
+        array = np.ascontiguousarray(values, dtype="<f8").ravel()
+        self._parts.append(_u32.pack(len(array)))
+        self._parts.append(array.tobytes())
+        return self
+
+    def value(self, value):
+        match value:
+            case None:
+                self.u8(ValueKind.Null)
+            case bool():
+                self.u8(ValueKind.Boolean).u8(value)
+            case int() if -2 ** 63 <= value < 2 ** 63:
+                self.u8(ValueKind.Integer).i64(value)
+            case float():
+                self.u8(ValueKind.Float).f64(value)
+            case str():
+                self.u8(ValueKind.String).string(value)
+            case list() | tuple() if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+                self.u8(ValueKind.Float_array).f64_array(value)
+            case _:
+                self.u8(ValueKind.Json).string(json.dumps(value))
+        return self
+
+    def fields(self, timestamps, fields: dict):
+        """Writes the sample layout shared by Rtde_samples and Rtde_history."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.u32(len(timestamps)).u16(len(fields)).f64_array(timestamps)
+        for name, values in fields.items():
+            values = np.asarray(values, dtype=np.float64)
+            width = 1 if values.ndim == 1 else values.shape[1]
+            self.string(name).u8(width).f64_array(values)
+        return self
+
+    def build(self) -> bytes:
+        return b"".join(self._parts)
+
+
+def encode(message, wire_format: WireFormat) -> str | bytes:
+    """Encodes a message for a client. Messages without a binary encoding are sent as JSON."""
+    if isinstance(message, str):
+        return message
+    if wire_format is WireFormat.binary and hasattr(message, "__bytes__"):
+        return bytes(message)
+    return str(message)
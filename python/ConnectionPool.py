@@ -0,0 +1,279 @@
+import random
+import select
+import socket
+import threading
+import time
+from enum import Enum
+from socket import socket as Socket
+
+from constants import CONNECT_TIMEOUT, CONNECT_FIRST_RETRY_DELAY, CONNECT_MAX_RETRY_DELAY, CONNECT_ATTEMPTS
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+_BROKEN_CONNECTION_ERRORS = (BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+"""The errors of a connection the robot closed, which is replaced by a new one"""
+
+
+class ConnectionState(Enum):
+    disconnected = "disconnected"
+    connecting = "connecting"
+    backing_off = "backing_off"
+    connected = "connected"
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter. Every delay is about twice as long as the one before, up to the maximum.
+    Half of every delay is random, so connections that failed together do not retry in lockstep.
+    """
+
+    def __init__(self, first_delay: float = CONNECT_FIRST_RETRY_DELAY, max_delay: float = CONNECT_MAX_RETRY_DELAY):
+        self.first_delay: float = first_delay
+        self.max_delay: float = max_delay
+        self.failures: int = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.max_delay, self.first_delay * 2 ** self.failures)
+        self.failures += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.failures = 0
+
+
+class ConnectionStatistics:
+    """The state of a connection to one of the robot's socket servers, and how often it failed and was replaced."""
+
+    def __init__(self):
+        self.state: ConnectionState = ConnectionState.disconnected
+        self.connects: int = 0
+        self.failed_attempts: int = 0
+        self.probe_failures: int = 0
+        """Cached connections that were found closed before they were used"""
+        self.broken: int = 0
+        """Connections that failed while sending or receiving"""
+        self.last_error: str | None = None
+        self.connected_since: float | None = None
+        self.total_downtime: float = 0.0
+        self._down_since: float | None = None
+
+    def record_connected(self):
+        now = time.monotonic()
+        if self._down_since is not None:
+            self.total_downtime += now - self._down_since
+            self._down_since = None
+        self.connects += 1
+        self.connected_since = now
+        self.state = ConnectionState.connected
+
+    def record_failed_attempt(self, error: Exception):
+        self.failed_attempts += 1
+        self.last_error = str(error)
+
+    def record_disconnected(self, error: str):
+        self.last_error = error
+        self.connected_since = None
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+        self.state = ConnectionState.disconnected
+
+    def dump(self):
+        """Dumps the state and the counters to a dictionary that can be converted to JSON."""
+        now = time.monotonic()
+        return {
+            "state": self.state.value,
+            "connects": self.connects,
+            "reconnects": max(0, self.connects - 1),
+            "failed_attempts": self.failed_attempts,
+            "probe_failures": self.probe_failures,
+            "broken": self.broken,
+            "last_error": self.last_error,
+            "uptime": now - self.connected_since if self.connected_since is not None else 0.0,
+            "total_downtime": self.total_downtime + (now - self._down_since if self._down_since is not None else 0.0)
+        }
+
+
+class ManagedConnection:
+    """
+    A connection to one of the robot's socket servers that replaces itself when the robot closed it.
+
+    The cached socket is probed before it is handed out, a socket the robot closed or reset is replaced by a new
+    connection. A send that fails because the connection broke is sent once more on a new connection, a receive
+    that fails drops the connection and raises, since the reply it waited for is lost. Connecting is retried with
+    exponential backoff, a call fails after CONNECT_ATTEMPTS attempts and the next call starts over.
+    The connection can be passed to select(), it selects on the current socket.
+    """
+
+    def __init__(self, ip: str, port: int):
+        self.ip: str = ip
+        self.port: int = port
+        self.statistics: ConnectionStatistics = ConnectionStatistics()
+        self.generation: int = 0
+        """Incremented with every new connection, a changed generation means the robot lost what was sent before"""
+        self._socket: Socket | None = None
+        self._lock = threading.RLock()
+
+    def __str__(self):
+        return f"{self.ip}:{self.port}"
+
+    def socket(self) -> Socket:
+        """
+        Returns the connected socket, after connecting or replacing it if it is closed.
+
+            Raises:
+                ConnectionError: If the robot could not be reached within CONNECT_ATTEMPTS attempts.
+        """
+        with self._lock:
+            if self._socket is not None and not self._is_alive(self._socket):
+                self.statistics.probe_failures += 1
+                self._drop(f"Connection to {self} was closed by the robot")
+            if self._socket is None:
+                self._socket = self._connect()
+            return self._socket
+
+    def fileno(self) -> int:
+        with self._lock:
+            if self._socket is None:
+                raise ConnectionError(f"Not connected to {self}")
+            return self._socket.fileno()
+
+    def send(self, data: bytes):
+        """
+        Sends all the data, on a new connection if the current one broke.
+
+            Raises:
+                ConnectionError: If the robot could not be reached, or the new connection broke as well.
+        """
+        for attempt in (1, 2):
+            sock = self.socket()
+            try:
+                self._send_all(sock, data)
+                return
+            except _BROKEN_CONNECTION_ERRORS as e:
+                self.statistics.broken += 1
+                self.invalidate(e)
+                if attempt == 2:
+                    raise
+                non_recurring_logger.warning(f"Connection to {self} broke ({e}), sending again on a new connection")
+
+    def recv(self, size: int) -> bytes:
+        """
+        Receives up to size bytes that are ready to be read.
+
+            Raises:
+                ConnectionError: If the robot closed or reset the connection, which is dropped then.
+        """
+        with self._lock:
+            sock = self._socket
+        if sock is None:
+            raise ConnectionError(f"Not connected to {self}")
+        try:
+            data = sock.recv(size)
+        except _BROKEN_CONNECTION_ERRORS as e:
+            self.statistics.broken += 1
+            self.invalidate(e)
+            raise
+        if not data:
+            error = ConnectionResetError(f"Connection to {self} was closed by the robot")
+            self.statistics.broken += 1
+            self.invalidate(error)
+            raise error
+        return data
+
+    def invalidate(self, error: Exception | str):
+        """Drops the connection, the next call connects again."""
+        with self._lock:
+            self._drop(str(error))
+
+    def close(self):
+        self.invalidate("Closed by the proxy")
+
+    def _connect(self) -> Socket:
+        backoff = Backoff()
+        for attempt in range(1, CONNECT_ATTEMPTS + 1):
+            self.statistics.state = ConnectionState.connecting
+            try:
+                my_socket = socket.create_connection((self.ip, self.port), CONNECT_TIMEOUT)
+            except OSError as e:
+                self.statistics.record_failed_attempt(e)
+                if attempt == CONNECT_ATTEMPTS:
+                    self.statistics.state = ConnectionState.disconnected
+                    raise ConnectionError(f"Connecting to {self} failed after {attempt} attempts: {e}") from e
+                delay = backoff.next_delay()
+                self.statistics.state = ConnectionState.backing_off
+                non_recurring_logger.info(f"Connection to {self} failed ({e}) - retrying in {delay:.2f} seconds")
+                time.sleep(delay)
+                continue
+
+            my_socket.setblocking(False)
+            self.generation += 1
+            self.statistics.record_connected()
+            non_recurring_logger.debug(f"Socket connected to {self}")
+            return my_socket
+
+    def _drop(self, error: str):
+        if self._socket is None:
+            return
+        non_recurring_logger.warning(f"Dropping connection to {self}: {error}")
+        try:
+            self._socket.close()
+        except OSError:
+            pass
+        self._socket = None
+        self.statistics.record_disconnected(error)
+
+    @staticmethod
+    def _is_alive(sock: Socket) -> bool:
+        # A readable socket with nothing to read was closed by the robot. Peeking leaves unread replies in place
+        try:
+            return sock.recv(1, socket.MSG_PEEK) != b""
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _send_all(sock: Socket, data: bytes):
+        # The socket is non-blocking, a full send buffer is waited out instead of raising
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[sock.send(view):]
+            except BlockingIOError:
+                _, writable, _ = select.select([], [sock], [], CONNECT_TIMEOUT)
+                if not writable:
+                    raise TimeoutError(f"The robot did not take any data within {CONNECT_TIMEOUT} s") from None
+
+
+class ConnectionPool:
+    """
+    The managed connections to the robot's socket servers, one for every address.
+    Connections that manage themselves, like the dashboard client, add their statistics so they are dumped together.
+    """
+
+    def __init__(self):
+        self._connections: dict[tuple[str, int], ManagedConnection] = dict()
+        self._other_statistics: dict[str, ConnectionStatistics] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, ip: str, port: int) -> ManagedConnection:
+        """Returns the managed connection to the address. It connects when its socket is first needed."""
+        with self._lock:
+            if (ip, port) not in self._connections:
+                self._connections[(ip, port)] = ManagedConnection(ip, port)
+            return self._connections[(ip, port)]
+
+    def add_statistics(self, ip: str, port: int, statistics: ConnectionStatistics):
+        with self._lock:
+            self._other_statistics[f"{ip}:{port}"] = statistics
+
+    def dump(self):
+        """Dumps the state and the counters of every connection to a dictionary that can be converted to JSON."""
+        with self._lock:
+            managed = {str(connection): connection.statistics.dump() for connection in self._connections.values()}
+            return managed | {address: statistics.dump() for address, statistics in self._other_statistics.items()}
+
+
+connection_pool = ConnectionPool()
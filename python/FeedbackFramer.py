@@ -0,0 +1,149 @@
+from typing import Final
+
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+START_BYTE: Final = 0x02
+"""STX, sent by the robot before every message"""
+END_BYTE: Final = 0x03
+"""ETX, sent by the robot after every message"""
+_START: Final = bytes([START_BYTE])
+_END: Final = bytes([END_BYTE])
+_END_AND_START: Final = _END + _START
+
+
+class FeedbackFramerStatistics:
+    """
+    Counters of the framer of a single robot connection.
+
+    truncated_frames counts frames that were cut off by the start of a new frame before their end byte arrived.
+    discarded_bytes counts the bytes that were thrown away, either outside of any frame or as part of a truncated frame.
+    """
+
+    def __init__(self):
+        self.bytes_received: int = 0
+        self.frames: int = 0
+        self.truncated_frames: int = 0
+        self.discarded_bytes: int = 0
+
+    def dump(self):
+        """Dumps the counters to a dictionary that can be converted to JSON."""
+        return {
+            "bytes_received": self.bytes_received,
+            "frames": self.frames,
+            "truncated_frames": self.truncated_frames,
+            "discarded_bytes": self.discarded_bytes
+        }
+
+
+class FeedbackFramer:
+    """
+    Splits the byte stream of the robot feedback socket into STX ... ETX framed messages.
+
+    The stream may be cut into chunks anywhere, also between the bytes of a single message. Chunks are appended to one
+    growable buffer and only the bytes that arrived since the last call are searched. Consumed bytes are removed from
+    the front of the buffer, which does not move the remaining bytes.
+
+    Usually the complete frames of a chunk follow each other without anything in between. They are then split off
+    all at once, and only bytes outside of frames or truncated frames are handled one frame at a time.
+    """
+
+    def __init__(self):
+        self.statistics = FeedbackFramerStatistics()
+        self._buffer = bytearray()
+        self._scanned = 0
+        """Index in the buffer up to which it has been searched for start and end bytes"""
+        self._frame_start: int | None = None
+        """Index of the first payload byte of the frame being received, or None if between frames"""
+
+    @property
+    def pending(self) -> int:
+        """The number of buffered bytes that are not part of a complete frame yet."""
+        return len(self._buffer)
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Appends a chunk of the stream and returns the payloads of all frames it completed, without STX and ETX."""
+        self.statistics.bytes_received += len(chunk)
+        self._buffer.extend(chunk)
+        if self._frame_start is not None and END_BYTE not in chunk and START_BYTE not in chunk:
+            # The chunk only continues the frame being received
+            self._scanned = len(self._buffer)
+            return []
+        buffer = self._buffer
+        frames = self._split_consecutive_frames()
+
+        while self._scanned < len(buffer):
+            if self._frame_start is None:
+                start = buffer.find(START_BYTE, self._scanned)
+                if start == -1:
+                    self._discard(len(buffer) - self._scanned, "outside of a frame")
+                    self._scanned = len(buffer)
+                    break
+                if start > self._scanned:
+                    self._discard(start - self._scanned, "outside of a frame")
+                self._frame_start = start + 1
+                self._scanned = start + 1
+                continue
+
+            end = buffer.find(END_BYTE, self._scanned)
+            search_end = len(buffer) if end == -1 else end
+            restart = buffer.find(START_BYTE, self._scanned, search_end)
+            if restart != -1:
+                # The robot started a new message before finishing this one, e.g. because its program was restarted
+                self.statistics.truncated_frames += 1
+                self._discard(restart - self._frame_start + 1, "of a truncated frame")
+                self._frame_start = restart + 1
+                self._scanned = restart + 1
+                continue
+            if end == -1:
+                self._scanned = len(buffer)
+                break
+
+            with memoryview(buffer) as view:
+                frames.append(bytes(view[self._frame_start:end]))
+            self.statistics.frames += 1
+            self._frame_start = None
+            self._scanned = end + 1
+
+        self._compact()
+        return frames
+
+    def _split_consecutive_frames(self) -> list[bytes]:
+        """
+        Splits off the complete frames at the front of the unscanned bytes in one go, if they are well formed: the first
+        byte starts a frame, every end byte is directly followed by a start byte, and no frame holds a second start
+        byte. Returns an empty list and leaves the state alone otherwise, the frames are then found one at a time.
+        """
+        buffer = self._buffer
+        first = self._scanned if self._frame_start is None else self._frame_start - 1
+        last_end = buffer.rfind(END_BYTE, self._scanned)
+        if last_end == -1 or buffer[first] != START_BYTE:
+            return []
+
+        with memoryview(buffer) as view:
+            frames = bytes(view[first + 1:last_end]).split(_END_AND_START)
+            # Any other start or end byte lies inside a frame
+            if (buffer.count(_START, first, last_end) != len(frames)
+                    or buffer.count(_END, first, last_end) != len(frames) - 1):
+                return []
+
+        self.statistics.frames += len(frames)
+        self._frame_start = None
+        self._scanned = last_end + 1
+        return frames
+
+    def _discard(self, count: int, reason: str):
+        self.statistics.discarded_bytes += count
+        recurring_logger.warning(f"Discarded {count} bytes {reason}")
+
+    def _compact(self):
+        """Removes the bytes in front of the frame being received. The remaining bytes keep their content."""
+        consumed = self._scanned if self._frame_start is None else self._frame_start - 1
+        if consumed == 0:
+            return
+        del self._buffer[:consumed]
+        self._scanned -= consumed
+        if self._frame_start is not None:
+            self._frame_start -= consumed
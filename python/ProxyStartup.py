@@ -0,0 +1,170 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Callable, Coroutine
+
+from SocketMessages import ProxyStateMessage
+from WebsocketNotifier import websocket_notifier
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+CONNECT_RETRY_DELAY = 2
+"""Seconds to wait before connecting to the robot again after the connection failed"""
+RESTART_DELAY = 1
+"""Seconds to wait before a robot connection task that failed is started again"""
+
+
+class ReadinessState(Enum):
+    starting = "starting"
+    connecting = "connecting"
+    ready = "ready"
+    failed = "failed"
+
+
+class ProxyReadiness:
+    """
+    Whether the proxy is connected to the robot yet, and how long the startup took.
+
+    The servers accept web clients right away, while the connections to the robot are opened in the background.
+    Every change of state is sent to the web clients, and a new client gets the current state as its first message.
+    All times are in seconds since this module was imported, which happens first thing at startup.
+    """
+
+    def __init__(self):
+        self.state: ReadinessState = ReadinessState.starting
+        self.message: str = "Proxy is starting"
+        self.started_at: float = time.monotonic()
+        self.listening_after: float | None = None
+        """When the websocket server accepted connections"""
+        self.first_byte_after: float | None = None
+        """When the first web client was sent its first message"""
+        self.ready_after: float | None = None
+        """When the robot was connected"""
+        self._ready = asyncio.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == ReadinessState.ready
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    def set_state(self, state: ReadinessState, message: str):
+        """Must be called on the event loop."""
+        self.state = state
+        self.message = message
+        if state == ReadinessState.ready:
+            self.ready_after = self._elapsed()
+            self._ready.set()
+        non_recurring_logger.info(f"Proxy {state.value} after {self._elapsed():.3f} s: {message}")
+        websocket_notifier.notify_observers(self.state_message())
+
+    def state_message(self) -> ProxyStateMessage:
+        return ProxyStateMessage(self.state.value, self.message)
+
+    def mark_listening(self):
+        self.listening_after = self._elapsed()
+        non_recurring_logger.info(f"Websocket server listening after {self.listening_after:.3f} s")
+
+    def mark_first_byte(self):
+        """Called whenever a web client is sent its first message. Only the first client of the process counts."""
+        if self.first_byte_after is None:
+            self.first_byte_after = self._elapsed()
+            non_recurring_logger.info(f"First web client served after {self.first_byte_after:.3f} s")
+
+    def dump(self):
+        """Dumps the state and the startup times to a dictionary that can be converted to JSON."""
+        return {
+            "state": self.state.value,
+            "message": self.message,
+            "listening_after": self.listening_after,
+            "first_byte_after": self.first_byte_after,
+            "ready_after": self.ready_after
+        }
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+proxy_readiness = ProxyReadiness()
+
+
+_supervised_tasks: set[asyncio.Task] = set()
+"""Keeps the supervised tasks referenced, the event loop only holds weak references to its tasks"""
+
+
+def supervise(name: str, start: Callable[[], Coroutine]) -> asyncio.Task:
+    """
+    Runs a robot connection task on its own, outside of the servers' task group, so its failure cannot stop the servers.
+    When the task fails, the error is logged and the task is started again after RESTART_DELAY seconds.
+    The supervised task ends when the task returns or is cancelled.
+
+        Args:
+            name: Names the task in the log.
+            start: Creates the coroutine of the task, it is called again for every restart.
+
+        Returns:
+            The supervising task.
+    """
+    task = asyncio.create_task(__run_supervised(name, start), name=name)
+    _supervised_tasks.add(task)
+    task.add_done_callback(_supervised_tasks.discard)
+    return task
+
+
+async def __run_supervised(name: str, start: Callable[[], Coroutine]):
+    while True:
+        try:
+            await start()
+            return
+        except Exception as e:
+            non_recurring_logger.error(f"{name} failed, restarting it in {RESTART_DELAY} s: {e}")
+        await asyncio.sleep(RESTART_DELAY)
+
+
+def __import_robot_modules():
+    # Imported here instead of at the top, so loading paramiko, rtde and the robot classes does not delay the servers
+    from RobotControl.ProtectiveStopRecovery import start_protective_stop_recovery
+    from RobotControl.Robot import Robot
+    from RobotControl.RunningWithSSH import start_robot_log_stream
+    from RtdeConnection import start_rtde_loop
+    return Robot, start_rtde_loop, start_robot_log_stream, start_protective_stop_recovery
+
+
+async def start_robot_connections():
+    """
+    Connects to the robot in the background, while the servers already accept clients.
+    RTDE starts streaming at once, the dashboard, secondary, interpreter and SSH connections are opened concurrently.
+    A failed connection is retried until it succeeds. Returns once the connection tasks are started, they are supervised
+    on their own and restarted when they fail.
+    """
+    proxy_readiness.set_state(ReadinessState.connecting, "Connecting to the robot")
+    try:
+        robot_class, start_rtde_loop, start_robot_log_stream, start_protective_stop_recovery = \
+            await asyncio.to_thread(__import_robot_modules)
+        await start_protective_stop_recovery()
+    except Exception as e:
+        # Nothing awaits this function, the error must end up in the log and with the web clients
+        non_recurring_logger.error(f"Starting the robot connections failed: {e}")
+        proxy_readiness.set_state(ReadinessState.failed, f"Starting the robot connections failed: {e}")
+        return
+
+    supervise("RTDE loop", start_rtde_loop)
+    supervise("Robot connection", lambda: __connect_robot(robot_class, start_robot_log_stream))
+
+
+async def __connect_robot(robot_class, start_robot_log_stream: Callable[[], Coroutine]):
+    while True:
+        try:
+            await asyncio.to_thread(robot_class.get_instance)
+            break
+        except Exception as e:
+            non_recurring_logger.error(f"Connecting to the robot failed: {e}")
+            proxy_readiness.set_state(ReadinessState.failed, f"Connecting to the robot failed, retrying: {e}")
+            await asyncio.sleep(CONNECT_RETRY_DELAY)
+            proxy_readiness.set_state(ReadinessState.connecting, "Connecting to the robot")
+
+    await start_robot_log_stream()
+    proxy_readiness.set_state(ReadinessState.ready, "Robot connected")
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from enum import Enum
+
+from RobotControl.Robot import Robot
+from RobotStatus import robot_status, RobotStatus
+from SocketMessages import ProtectiveStopRecoveryMessage, Status, SafetyStatusTypes
+from WebsocketNotifier import websocket_notifier
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+LOCKOUT_TIME = 5
+"""Seconds after a protective stop before the controller accepts the unlock"""
+POPUP_DELAY = 1
+"""Seconds to give Polyscope to show the safety popup before it is closed"""
+UNLOCK_TIMEOUT = 1
+"""Seconds to wait for the dashboard to answer the unlock command"""
+FIRST_RETRY_DELAY = 0.5
+"""Seconds before the first retry of a failed unlock. Every further retry waits twice as long"""
+MAX_RETRY_DELAY = 5
+"""The longest wait between two unlock attempts"""
+MAX_ATTEMPTS = 8
+"""Unlock attempts before the recovery gives up and leaves the robot to the operator"""
+RELEASE_TIMEOUT = 3
+"""Seconds to wait for RTDE to report the normal safety status after the dashboard accepted the unlock"""
+
+
+class RecoveryState(Enum):
+    idle = "idle"
+    locked_out = "locked_out"
+    unlocking = "unlocking"
+    releasing = "releasing"
+    failed = "failed"
+
+
+class ProtectiveStopRecovery:
+    """
+    Unlocks the robot after a protective stop without blocking a thread.
+
+    The recovery starts when RTDE reports the protective stop, or when the robot's log does while RTDE is not current.
+    The safety popup is closed, and the unlock is sent the moment the lockout after the stop ends. A refused unlock is
+    retried with a growing delay. The recovery is done once RTDE reports the normal safety status again.
+    After MAX_ATTEMPTS refused unlocks the recovery fails, and no recovery is started until the robot left the
+    protective stop.
+    Every change of state is sent to the web clients.
+    """
+
+    def __init__(self):
+        self.state: RecoveryState = RecoveryState.idle
+        self.attempts: int = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Starts following the RTDE safety status. Triggers can only start a recovery after this was called."""
+        self._loop = loop
+        robot_status.add_listener(self._on_status_changed)
+
+    def trigger(self, stopped_at: float | None = None):
+        """
+        Starts a recovery unless one is running already. Safe to call from any thread.
+
+            Args:
+                stopped_at: The monotonic time of the protective stop, now if it is not known.
+        """
+        stopped_at = stopped_at if stopped_at is not None else time.monotonic()
+        if self._loop is None:
+            non_recurring_logger.error("Protective stop recovery is not started, the robot stays stopped")
+            return
+        self._loop.call_soon_threadsafe(self._start_recovery, stopped_at)
+
+    def _on_status_changed(self, status: RobotStatus):
+        # Called on the RTDE reader thread
+        if status.safety_status == SafetyStatusTypes.protective_stop:
+            self.trigger(status.updated_at)
+        elif status.safety_status == SafetyStatusTypes.normal_mode and self.state != RecoveryState.idle:
+            self._loop.call_soon_threadsafe(self._finish)
+
+    def _start_recovery(self, stopped_at: float):
+        if self._task is not None and not self._task.done():
+            return
+        if self.state == RecoveryState.failed:
+            # The operator was told to unlock the robot, it is only recovered again after it left the protective stop
+            recurring_logger.debug("Protective stop recovery failed before, leaving the robot to the operator")
+            return
+        self._task = self._loop.create_task(self._recover(stopped_at))
+
+    async def _recover(self, stopped_at: float):
+        self.attempts = 0
+        self._set_state(RecoveryState.locked_out, f"Protective stop, unlocking in {LOCKOUT_TIME} seconds")
+
+        await asyncio.sleep(POPUP_DELAY)
+        await self._send_dashboard_command("close safety popup")
+        await asyncio.sleep(max(0.0, stopped_at + LOCKOUT_TIME - time.monotonic()))
+
+        retry_delay = FIRST_RETRY_DELAY
+        while self.attempts < MAX_ATTEMPTS:
+            self.attempts += 1
+            self._set_state(RecoveryState.unlocking, f"Unlocking protective stop, attempt {self.attempts}")
+            reply = await self._send_dashboard_command("unlock protective stop")
+            if reply.startswith("Protective stop releasing"):
+                break
+            recurring_logger.info(f"Unlock protective stop refused: {reply}")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+        else:
+            self._set_state(RecoveryState.failed, f"Protective stop could not be unlocked after {self.attempts} "
+                                                  f"attempts, unlock it on the teach pendant", Status.Error)
+            return
+
+        self._set_state(RecoveryState.releasing, "Protective stop releasing")
+        if robot_status.is_available:
+            # The normal safety status finishes the recovery and cancels this task
+            await asyncio.sleep(RELEASE_TIMEOUT)
+            non_recurring_logger.warning(f"Safety status is still {robot_status.safety_status} after the unlock")
+        self._finish()
+
+    def _finish(self):
+        if self.state == RecoveryState.idle:
+            return
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._set_state(RecoveryState.idle, "Protective stop released")
+
+    async def _send_dashboard_command(self, command: str) -> str:
+        try:
+            return await Robot.get_instance().controller.dashboard.request(command, UNLOCK_TIMEOUT)
+        except (TimeoutError, ConnectionError, OSError) as e:
+            recurring_logger.warning(f"Dashboard command '{command}' failed during recovery: {e}")
+            return ""
+
+    def _set_state(self, state: RecoveryState, message: str, status: Status = Status.Ok):
+        self.state = state
+        non_recurring_logger.info(f"Protective stop recovery {state.value}: {message}")
+        websocket_notifier.notify_observers(ProtectiveStopRecoveryMessage(state.value, message, self.attempts, status))
+
+
+protective_stop_recovery = ProtectiveStopRecovery()
+
+
+async def start_protective_stop_recovery():
+    """Lets protective stops reported over RTDE start the recovery."""
+    protective_stop_recovery.start(asyncio.get_running_loop())
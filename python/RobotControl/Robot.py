@@ -1,3 +1,7 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from custom_logging import LogConfig
 from RobotControl.RobotClasses.RobotController import RobotController
 from RobotControl.RobotClasses.SSH import SSH
@@ -9,6 +13,7 @@ non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
 class Robot:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -18,16 +23,32 @@ class Robot:
 
     @classmethod
     def get_instance(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = cls(*args, **kwargs)
+        # The robot's connections are opened by several threads at once during startup
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls(*args, **kwargs)
+                except Exception:
+                    # A failed connection is retried by the next call
+                    cls._instance = None
+                    raise
         return cls._instance
     
     def __initialize(self):
-        self.controller: RobotController = RobotController.get_instance()
-        self.ssh: SSH = SSH.get_instance()
-        self.interpreter_mode: InterpreterMode = InterpreterMode.get_instance()
+        started_at = time.monotonic()
+        # The connections do not depend on each other, so they are opened concurrently
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="RobotConnect") as executor:
+            controller = executor.submit(RobotController.get_instance)
+            ssh = executor.submit(self.__connect_ssh)
+            interpreter_mode = executor.submit(InterpreterMode.get_instance)
+            self.controller: RobotController = controller.result()
+            self.ssh: SSH = ssh.result()
+            self.interpreter_mode: InterpreterMode = interpreter_mode.result()
+        non_recurring_logger.info(f"Robot connected in {time.monotonic() - started_at:.2f} s")
 
+    @staticmethod
+    def __connect_ssh() -> SSH:
+        ssh = SSH.get_instance()
         # Write program.urp to the robot
-        self.ssh.write_file("RobotControl/program.urp", "/programs/program.urp")
-
-    
\ No newline at end of file
+        ssh.write_file("RobotControl/program.urp", "/programs/program.urp")
+        return ssh
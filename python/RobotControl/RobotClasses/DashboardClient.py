@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Iterable
+
+from ConnectionPool import Backoff, ConnectionStatistics, ConnectionState, connection_pool
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+CONNECT_TIMEOUT = 5
+"""Seconds to wait for the dashboard server to accept the connection and send its welcome line"""
+
+
+class DashboardTimeout(TimeoutError):
+    """Raised when the dashboard server did not answer a command in time."""
+
+
+class DashboardCommandStatistics:
+    """The latency of one dashboard command, like "robotmode" or "play", measured from sending to the reply line."""
+
+    def __init__(self):
+        self.count: int = 0
+        self.timeouts: int = 0
+        self.last_latency: float = 0.0
+        self.max_latency: float = 0.0
+        self.total_latency: float = 0.0
+
+    def record(self, latency: float):
+        self.count += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def dump(self):
+        """Dumps the counters to a dictionary that can be converted to JSON."""
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "average_latency": self.total_latency / self.count if self.count else 0.0
+        }
+
+
+class _PendingRequest:
+    def __init__(self, command: str, future: asyncio.Future[str]):
+        self.command: str = command
+        self.future: asyncio.Future[str] = future
+        self.sent_at: float = time.monotonic()
+
+
+class DashboardClient:
+    """
+    Talks to the dashboard server over a single connection that is driven by its own event loop on a daemon thread,
+    so it can be used from worker threads and from the proxy's event loop alike.
+
+    The dashboard server answers every command with one line, in order. Requests are therefore written without
+    waiting for the previous reply and matched to the replies through a FIFO. A request that times out stays in the
+    FIFO until its late reply arrives, so that reply is discarded instead of being taken for the answer to the next
+    command. If the connection fails, all pending requests fail and the next request reconnects. After a failed
+    connection attempt, requests fail at once until the backoff delay has passed, instead of waiting for the timeout.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host: str = host
+        self.port: int = port
+        self.statistics: dict[str, DashboardCommandStatistics] = dict()
+        self.connection_statistics: ConnectionStatistics = ConnectionStatistics()
+        self._backoff = Backoff()
+        self._retry_at: float = 0.0
+        self._pending: deque[_PendingRequest] = deque()
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._connect_lock: asyncio.Lock | None = None
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="DashboardClient", daemon=True)
+        self._thread.start()
+        connection_pool.add_statistics(host, port, self.connection_statistics)
+
+    def send(self, command: str, timeout: float) -> str:
+        """
+        Sends a command from any thread but the client's own and blocks until its reply line arrives.
+
+            Raises:
+                DashboardTimeout: If no reply arrived within the timeout in seconds.
+                ConnectionError: If the dashboard server could not be reached or closed the connection.
+        """
+        return asyncio.run_coroutine_threadsafe(self._request(command, timeout), self._loop).result()
+
+    async def request(self, command: str, timeout: float) -> str:
+        """Sends a command from any event loop and returns its reply line. Raises like send()."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._request(command, timeout), self._loop))
+
+    async def request_many(self, commands: Iterable[str], timeout: float) -> list[str]:
+        """Sends several commands at once and returns their replies in order. Costs a single round trip."""
+        return await asyncio.gather(*(self.request(command, timeout) for command in commands))
+
+    def close(self):
+        """Closes the connection and stops the client's event loop. The client cannot be used afterwards."""
+        def stop():
+            if self._writer is not None:
+                self._writer.close()
+            self._loop.stop()
+        self._loop.call_soon_threadsafe(stop)
+
+    def get_statistics(self) -> dict:
+        """Returns the latency statistics of every command that was sent, by command name."""
+        return {name: statistics.dump() for name, statistics in self.statistics.items()}
+
+    async def _request(self, command: str, timeout: float) -> str:
+        writer = await self._ensure_connected()
+        statistics = self.statistics.setdefault(command.split(" ", 1)[0], DashboardCommandStatistics())
+        request = _PendingRequest(command, self._loop.create_future())
+        self._pending.append(request)
+        writer.write((command.replace("\n", " ") + "\n").encode())
+        try:
+            # A timed out request is cancelled but stays in the FIFO, where it takes its late reply
+            return await asyncio.wait_for(request.future, timeout)
+        except TimeoutError:
+            statistics.timeouts += 1
+            non_recurring_logger.warning(f"Dashboard did not answer '{command}' within {timeout} s")
+            raise DashboardTimeout(f"Dashboard did not answer '{command}' within {timeout} s") from None
+
+    async def _ensure_connected(self) -> asyncio.StreamWriter:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                if (wait := self._retry_at - time.monotonic()) > 0:
+                    raise ConnectionError(f"Dashboard server unreachable, next attempt in {wait:.2f} s")
+                self.connection_statistics.state = ConnectionState.connecting
+                try:
+                    reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                                  CONNECT_TIMEOUT)
+                    welcome = await asyncio.wait_for(reader.readline(), CONNECT_TIMEOUT)
+                except (OSError, TimeoutError) as e:
+                    if self._writer is not None:
+                        self._writer.close()
+                    self.connection_statistics.record_failed_attempt(e)
+                    self.connection_statistics.state = ConnectionState.backing_off
+                    self._retry_at = time.monotonic() + self._backoff.next_delay()
+                    raise ConnectionError(f"Connecting to the dashboard server failed: {e!r}") from e
+                self._backoff.reset()
+                self.connection_statistics.record_connected()
+                non_recurring_logger.info(f"Connected to dashboard server: {welcome.decode().strip()}")
+                self._reader_task = asyncio.create_task(self._read_replies(reader))
+            return self._writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                reply = line.decode(errors="replace").rstrip("\r\n")
+                if not self._pending:
+                    recurring_logger.warning(f"Unexpected dashboard reply: {reply}")
+                    continue
+                request = self._pending.popleft()
+                latency = time.monotonic() - request.sent_at
+                if request.future.done():
+                    recurring_logger.debug(f"Discarding late reply to '{request.command}' after {latency:.3f} s")
+                    continue
+                self.statistics[request.command.split(" ", 1)[0]].record(latency)
+                request.future.set_result(reply)
+            error = ConnectionError("Dashboard server closed the connection")
+        except Exception as e:
+            error = ConnectionError(f"Reading from the dashboard server failed: {e}")
+
+        non_recurring_logger.error(str(error))
+        self._writer.close()
+        self.connection_statistics.broken += 1
+        self.connection_statistics.record_disconnected(str(error))
+        while self._pending:
+            request = self._pending.popleft()
+            if not request.future.done():
+                request.future.set_exception(error)
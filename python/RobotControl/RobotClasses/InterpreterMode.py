@@ -1,16 +1,60 @@
-from socket import socket as Socket
+import re
+import threading
+import time
 from time import sleep
 
+from ConnectionPool import connection_pool, ManagedConnection
 from RobotControl.RobotClasses.RobotController import RobotController
-from ToolBox import escape_string, get_socket
-from constants import ROBOT_IP, INTERPRETER_PORT
+from RobotStatus import robot_status
+from SocketMessages import RuntimeStateTypes
+from ToolBox import escape_string
+from constants import ROBOT_IP, INTERPRETER_PORT, INTERPRETER_MAX_COMMAND_LENGTH, INTERPRETER_CLEAR_AFTER
 from custom_logging import LogConfig
 
 recurring_logger = LogConfig.get_recurring_logger(__name__)
 non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
+START_TIMEOUT = 2
+"""Seconds to wait for the interpreter program to start playing"""
+REPLY_TIMEOUT = 0.5
+"""Seconds to wait for the interpreter to acknowledge or discard a statement"""
+
+_BLOCK_PATTERN = re.compile(r"^\s*(def|thread)\b|\b(interpreter_mode|end_interpreter|clear_interpreter)\s*\(")
+
+
+def is_interpreter_statement(script: str) -> bool:
+    """
+    True if the script is a short single statement the interpreter can take directly.
+    Multi-line scripts, function and thread definitions and commands that control the interpreter itself run as
+    a program instead.
+    """
+    statement = script.strip()
+    return (0 < len(statement) <= INTERPRETER_MAX_COMMAND_LENGTH and "\n" not in statement
+            and _BLOCK_PATTERN.search(statement) is None)
+
+
+def _without_whitespace(text: str) -> str:
+    return "".join(text.split())
+
+
+class InterpreterReply:
+    """
+    The interpreter's answer to a statement, "ack: <id>: <statement>" or "discard: <reason>: <statement>".
+    A discarded statement was not run, the reason is the compile error.
+    """
+
+    def __init__(self, line: str):
+        kind, _, rest = line.partition(":")
+        self.accepted: bool = kind.strip() == "ack"
+        # The reason of a discard may contain colons itself, so it is kept together with the statement
+        self.message: str = rest.split(":", 1)[0].strip() if self.accepted else rest.strip() or line
+
+    def __str__(self):
+        return f"{'ack' if self.accepted else 'discard'}: {self.message}"
+
 class InterpreterMode:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -19,23 +63,153 @@ class InterpreterMode:
 
     @classmethod
     def get_instance(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = cls(*args, **kwargs)
+        # The robot's connections are opened by several threads at once during startup
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls(*args, **kwargs)
+                except Exception:
+                    # A failed connection is retried by the next call
+                    cls._instance = None
+                    raise
         return cls._instance
 
     def __init__(self):
         self.controller: RobotController = RobotController.get_instance()
-        self.interpreter_socket: Socket = get_socket(ROBOT_IP, INTERPRETER_PORT)
+        self.interpreter_connection: ManagedConnection = connection_pool.get(ROBOT_IP, INTERPRETER_PORT)
+        self.interpreter_connection.socket()
+        self._lock = threading.Lock()
+        self._session_active = False
+        self._session_generation = 0
+        self._session_setup = ""
+        self._statements_since_clear = 0
+        self._received = ""
+
+    @property
+    def is_active(self) -> bool:
+        """
+        True while the interpreter program started by the proxy is running.
+        Playing another program or stopping ends it, RTDE shows that even if nobody called end_session.
+        A new interpreter connection ends it as well, the controller may have been restarted in between.
+        """
+        if not self._session_active:
+            return False
+        if self.interpreter_connection.generation != self._session_generation:
+            self._session_active = False
+        if robot_status.is_available and robot_status.runtime_state != RuntimeStateTypes.playing:
+            self._session_active = False
+        return self._session_active
 
     def start(self):
         """
         Starts the interpreter mode.
         """
         command = f"interpreter_mode(clearQueueOnEnter = True, clearOnEnd = True)"
-        response = self.controller.send_command(self.controller.secondary_socket, command)
-        sleep(0.5) # Wait for the interpreter mode to be ready
+        started_at = time.monotonic()
+        response = self.controller.send_command(self.controller.secondary_connection, command)
+        if robot_status.is_available:
+            def has_started(status) -> bool:
+                entered_at = status.runtime_state_entered_at(RuntimeStateTypes.playing)
+                return entered_at is not None and entered_at >= started_at
+            if not robot_status.wait_for(has_started, START_TIMEOUT):
+                non_recurring_logger.warning(f"Interpreter mode did not start within {START_TIMEOUT} s")
+        else:
+            sleep(0.5) # Wait for the interpreter mode to be ready
         return response
 
+    def end_session(self):
+        """Forgets the interpreter session, called when a program is played or stopped and replaces it."""
+        self._session_active = False
+
+    def interpret(self, statement: str, session_setup: str) -> InterpreterReply | None:
+        """
+        Runs a single statement in the interpreter session and returns the interpreter's reply, which arrives as soon
+        as the statement is compiled. Starts the session with the setup statements first if it is not running.
+        The interpreter is cleared every INTERPRETER_CLEAR_AFTER statements, which also drops the variables that were
+        defined in the session.
+
+            Returns:
+                The reply, or None if the interpreter did not answer or could not be reached. The statement should
+                then run as a program.
+        """
+        with self._lock:
+            try:
+                return self._interpret(statement, session_setup)
+            except OSError as e:
+                non_recurring_logger.warning(f"Interpreter connection failed: {e}")
+                self._session_active = False
+                return None
+
+    def _interpret(self, statement: str, session_setup: str) -> InterpreterReply | None:
+        if not self.is_active or session_setup != self._session_setup:
+            if not self._start_session(session_setup):
+                return None
+        elif self._statements_since_clear >= INTERPRETER_CLEAR_AFTER:
+            recurring_logger.debug(f"Clearing interpreter after {self._statements_since_clear} statements")
+            if self._send_statement("clear_interpreter()") is None or not self._send_setup(session_setup):
+                return None
+
+        reply = self._send_statement(statement)
+        if reply is None:
+            return None
+        self._statements_since_clear += 1
+        return reply
+
+    def _start_session(self, session_setup: str) -> bool:
+        # Replace a connection the robot closed before the session is tied to it
+        self.interpreter_connection.socket()
+        self.start()
+        self._session_active = True
+        self._session_generation = self.interpreter_connection.generation
+        self._session_setup = session_setup
+        self._received = ""
+        return self._send_setup(session_setup)
+
+    def _send_setup(self, session_setup: str) -> bool:
+        self._statements_since_clear = 0
+        for line in session_setup.splitlines():
+            if line.strip():
+                reply = self._send_statement(line)
+                if reply is None or not reply.accepted:
+                    non_recurring_logger.warning(f"Interpreter session setup failed: {reply}")
+                    self._session_active = False
+                    return False
+        return True
+
+    def _send_statement(self, statement: str) -> InterpreterReply | None:
+        """
+        Sends a statement and returns the interpreter's reply to it. Every reply ends with the statement it answers,
+        so replies to earlier statements that timed out are skipped instead of being taken for this one.
+        """
+        command = self.controller.sanitize_command(statement)
+        if self._received:
+            recurring_logger.debug(f"Dropping unread interpreter replies: {escape_string(self._received)}")
+            self._received = ""
+        self.interpreter_connection.send(command.encode())
+
+        expected = _without_whitespace(command)
+        deadline = time.monotonic() + REPLY_TIMEOUT
+        while (line := self._read_line(deadline - time.monotonic())) is not None:
+            if _without_whitespace(line).endswith(expected):
+                return InterpreterReply(line)
+            recurring_logger.debug(f"Skipping interpreter reply to an earlier statement: {line}")
+
+        non_recurring_logger.warning(f"Interpreter did not answer within {REPLY_TIMEOUT} s")
+        self._session_active = False
+        return None
+
+    def _read_line(self, timeout: float) -> str | None:
+        deadline = time.monotonic() + timeout
+        while "\n" not in self._received:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = self.controller.read_from_socket(self.interpreter_connection, remaining)
+            if message != "nothing":
+                self._received += message
+        line, self._received = self._received.split("\n", 1)
+        return line
+
     def stop(self):
         """
         Stops the interpreter mode.
@@ -62,11 +236,11 @@ class InterpreterMode:
         command = self.controller.sanitize_command(command)
         recurring_logger.debug(f"Sending command to robot: {escape_string(command)}")
 
-        self.interpreter_socket.send(command.encode())
-        result = self.controller.read_from_socket(self.interpreter_socket)
+        self.interpreter_connection.send(command.encode())
+        result = self.controller.read_from_socket(self.interpreter_connection)
 
         while self._extremely_randomized_string not in result:
-            result += self.controller.read_from_socket(self.interpreter_socket)
+            result += self.controller.read_from_socket(self.interpreter_connection)
 
         result = result.replace(self._extremely_randomized_string, "")
 
@@ -75,5 +249,5 @@ class InterpreterMode:
     
     def send_small_command_on_interpreter(self, command: str) -> str:
         sanitized_command = self.controller.sanitize_command(command)
-        self.interpreter_socket.send(sanitized_command.encode())
-        return self.controller.read_from_socket_till_end(self.interpreter_socket)
\ No newline at end of file
+        self.interpreter_connection.send(sanitized_command.encode())
+        return self.controller.read_from_socket_till_end(self.interpreter_connection)
\ No newline at end of file
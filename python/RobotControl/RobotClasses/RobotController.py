@@ -1,9 +1,12 @@
 import socket
+import threading
 from socket import gethostbyname, gethostname
-from socket import socket as Socket
 from time import sleep
 
-from ToolBox import get_socket
+from ConnectionPool import connection_pool, ManagedConnection
+from RobotControl.RobotClasses.DashboardClient import DashboardClient, DashboardTimeout
+from RobotStatus import robot_status
+from SocketMessages import SafetyStatusTypes, RuntimeStateTypes
 from URIFY import SOCKET_NAME
 from constants import ROBOT_IP, DASHBOARD_PORT, SECONDARY_PORT, ROBOT_FEEDBACK_PORT, ROBOT_FEEDBACK_HOST
 from custom_logging import LogConfig
@@ -11,8 +14,32 @@ from custom_logging import LogConfig
 recurring_logger = LogConfig.get_recurring_logger(__name__)
 non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
+READ_TIMEOUT = 0.1
+"""Seconds to wait for the answer to a dashboard command"""
+LOAD_TIMEOUT = 10
+"""Seconds to wait for the answer to a load command. The dashboard answers once the program is loaded"""
+PLAY_TIMEOUT = 2
+"""Seconds to wait for the answer to a play command"""
+
+_DASHBOARD_SAFETY_STATUS: dict[SafetyStatusTypes, str] = {
+    SafetyStatusTypes.normal_mode: "NORMAL",
+    SafetyStatusTypes.reduced_mode: "REDUCED",
+    SafetyStatusTypes.recovery_mode: "RECOVERY",
+}
+"""Safety statuses the dashboard names differently than RTDE, the others are the upper case enum names"""
+_DASHBOARD_PROGRAM_STATE: dict[RuntimeStateTypes, str] = {
+    RuntimeStateTypes.stopping: "PLAYING",
+    RuntimeStateTypes.stopped: "STOPPED",
+    RuntimeStateTypes.playing: "PLAYING",
+    RuntimeStateTypes.pausing: "PLAYING",
+    RuntimeStateTypes.paused: "PAUSED",
+    RuntimeStateTypes.resuming: "PAUSED",
+}
+"""The dashboard's program state for every RTDE runtime state. It only changes once a transition is complete"""
+
 class RobotController:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -22,14 +49,30 @@ class RobotController:
 
     @classmethod
     def get_instance(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = cls(*args, **kwargs)
+        # The robot's connections are opened by several threads at once during startup
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls(*args, **kwargs)
+                except Exception:
+                    # A failed connection is retried by the next call
+                    cls._instance = None
+                    raise
         return cls._instance
 
     def __initialize(self, *args, **kwargs):      
+        # Commands on the secondary socket are sent from several threads, the answers must not get mixed up
+        self._socket_lock = threading.Lock()
         # Initialize sockets
-        self.dashboard_socket: Socket = get_socket(ROBOT_IP, DASHBOARD_PORT)
-        self.secondary_socket: Socket = get_socket(ROBOT_IP, SECONDARY_PORT)
+        self.dashboard: DashboardClient = DashboardClient(ROBOT_IP, DASHBOARD_PORT)
+        try:
+            self.secondary_connection: ManagedConnection = connection_pool.get(ROBOT_IP, SECONDARY_PORT)
+            # Connect now, an unreachable robot fails the startup, which tries again
+            self.secondary_connection.socket()
+        except Exception:
+            # The connection is retried with a new controller, which starts its own dashboard client
+            self.dashboard.close()
+            raise
         sleep(0.5)  # Wait for sockets to be ready
 
         # Wait for polyscope to be ready
@@ -45,35 +88,43 @@ class RobotController:
     @property
     def robot_mode(self) -> str:
         """
-        Property to get the robot mode.
+        Property to get the robot mode. Served from the RTDE status while it is current.
 
             Returns:
                 str: The robot mode. (Starting<program_name> or RUNNING)
         """
+        if robot_status.is_available and robot_status.robot_mode is not None:
+            return robot_status.robot_mode.name.upper()
         return self.__get_value_from_dashboard("robotmode")
 
     @property
     def safety_status(self) -> str:
         """
-        Property to get the safety status.
+        Property to get the safety status. Served from the RTDE status while it is current.
         """
+        if robot_status.is_available and robot_status.safety_status is not None:
+            return _DASHBOARD_SAFETY_STATUS.get(robot_status.safety_status, robot_status.safety_status.name.upper())
         return self.__get_value_from_dashboard("safetystatus")
 
     @property
     def running(self) -> str:
         """
-        Property to check if the robot is running.
+        Property to check if the robot is running. Served from the RTDE status while it is current.
         """
+        if robot_status.is_available and robot_status.runtime_state is not None:
+            return str(robot_status.runtime_state == RuntimeStateTypes.playing).lower()
         return self.__get_value_from_dashboard("running")
 
     @property
     def program_state(self) -> str:
         """
-        Property to get the program state.
+        Property to get the program state. Served from the RTDE status while it is current, without the program name.
 
             Returns:
                 str: STOPPED<program_name> or PLAYING<program_name>
         """
+        if robot_status.is_available and robot_status.runtime_state is not None:
+            return _DASHBOARD_PROGRAM_STATE[robot_status.runtime_state]
         return self.__get_value_from_dashboard("programState")
     
     @property
@@ -99,13 +150,17 @@ class RobotController:
         else:
             return True
 
-    def send_command(self, socket: Socket, command: str) -> str:
+    def send_command(self, connection: ManagedConnection, command: str, timeout: float = READ_TIMEOUT) -> str:
         """
-        Sends a command to the specified socket and returns the response.
+        Sends a command on the specified connection and returns the response.
+
+            Raises:
+                ConnectionError: If the robot could not be reached, or closed the connection before it answered.
         """
         sanitized_command = self.sanitize_command(command)
-        socket.send(sanitized_command.encode())
-        return self.read_from_socket(socket)
+        with self._socket_lock:
+            connection.send(sanitized_command.encode())
+            return self.read_from_socket(connection, timeout)
 
     def sanitize_command(self, command: str) -> str:
         """
@@ -114,65 +169,81 @@ class RobotController:
         command = command.replace('\n', ' ')
         return command + "\n"
 
-    def read_from_socket(self, socket: Socket) -> str:
+    def read_from_socket(self, connection: ManagedConnection, timeout: float = READ_TIMEOUT) -> str:
         """
-        Reads a response from the specified socket.
+        Reads a response from the specified connection.
+
+            Raises:
+                ConnectionError: If the robot closed the connection. The next send connects again.
         """
         import select
-        ready_to_read, _, _ = select.select([socket], [], [], 0.1)
+        ready_to_read, _, _ = select.select([connection], [], [], timeout)
         if ready_to_read:
-            message = socket.recv(4096)
+            message = connection.recv(4096)
             try:
                 return message.decode()
             except UnicodeDecodeError as e:
                 non_recurring_logger.error(f"Error decoding message: {e}")
         return "nothing"
     
-    def read_from_socket_till_end(self, socket: Socket) -> str:
+    def read_from_socket_till_end(self, connection: ManagedConnection) -> str:
         """
-        Reads from the socket and returns last message.
+        Reads from the connection and returns last message.
         """
         out = ""
-        message = self.read_from_socket(socket)
+        message = self.read_from_socket(connection)
         while message != "nothing":
             out = message
-            message = self.read_from_socket(socket)
+            message = self.read_from_socket(connection)
         return out
 
+    def send_dashboard_command(self, command: str, timeout: float = READ_TIMEOUT) -> str:
+        """
+        Sends a command to the dashboard server and returns its reply line.
+        Returns an empty string if the dashboard did not answer in time or could not be reached.
+        """
+        try:
+            return self.dashboard.send(command, timeout)
+        except (DashboardTimeout, ConnectionError, OSError) as e:
+            recurring_logger.warning(f"Dashboard command '{command}' failed: {e}")
+            return ""
+
     def power_on(self):
-        return self.send_command(self.dashboard_socket, "power on")
+        return self.send_dashboard_command("power on")
 
     def power_off(self):
-        return self.send_command(self.dashboard_socket, "power off")
+        return self.send_dashboard_command("power off")
 
     def brake_release(self):
-        return self.send_command(self.dashboard_socket, "brake release")
+        return self.send_dashboard_command("brake release")
 
     def restart_safety(self):
-        return self.send_command(self.dashboard_socket, "restart safety")
+        return self.send_dashboard_command("restart safety")
 
     def stop_program(self):
-        return self.send_command(self.dashboard_socket, "stop")
+        return self.send_dashboard_command("stop")
     
     def load_program(self, program_name: str = "program.urp"):
         assert program_name.endswith(".urp"), "Program name must end with .urp"
-        return self.send_command(self.dashboard_socket, f"load {program_name}")
+        return self.send_dashboard_command(f"load {program_name}", LOAD_TIMEOUT)
     
+    def is_program_loaded(self, program_name: str = "program.urp") -> bool:
+        """
+        Checks with the dashboard whether the program is the one loaded in Polyscope.
+        The dashboard answers "Loaded program: <path>", which is a lot faster than loading the program again.
+        """
+        reply = self.send_dashboard_command("get loaded program")
+        return reply.startswith("Loaded program:") and reply.rstrip().endswith("/" + program_name)
+
     def start_program(self):
-        return self.send_command(self.dashboard_socket, "play")
+        return self.send_dashboard_command("play", PLAY_TIMEOUT)
 
     def unlock_protective_stop(self):
-        sleep(5)  # Wait for 5 seconds before attempting to unlock
-        result = self.__get_value_from_dashboard("unlock protective stop")
-        if result == "Protectivestopreleasing":
-            non_recurring_logger.warning("Protective stop releasing")
-            return
-        else:
-            non_recurring_logger.info(f"Unlock protective stop result: {result}")
-            self.unlock_protective_stop()  # Retry if release fails
+        """Sends a single unlock. It is refused during the first five seconds after the stop, see ProtectiveStopRecovery."""
+        return self.send_dashboard_command("unlock protective stop")
 
     def __get_value_from_dashboard(self, command: str) -> str:
-        response = self.send_command(self.dashboard_socket, command)
+        response = self.send_dashboard_command(command)
         return self.__sanitize_dashboard_reads(response)
 
     def __sanitize_dashboard_reads(self, response: str) -> str:
@@ -181,18 +252,16 @@ class RobotController:
         return message.replace('\\n', '').replace(' ', '').replace('\n', '')
 
     def close_popup(self):
-        sleep(1)
-        result = self.send_command(self.dashboard_socket, "close popup")
+        result = self.send_dashboard_command("close popup")
         non_recurring_logger.debug(f"Popup closed: {result}")
 
     def close_safety_popup(self):
-        sleep(1)
-        result = self.send_command(self.dashboard_socket, "close safety popup")
+        result = self.send_dashboard_command("close safety popup")
         non_recurring_logger.debug(f"Safety popup closed: {result}")
 
     def send_popup(self, message: str):
         command = f"popup {message}"
-        result = self.send_command(self.dashboard_socket, command)
+        result = self.send_dashboard_command(command)
         non_recurring_logger.debug(f"Popup: {result}")
     
 
@@ -0,0 +1,179 @@
+import asyncio
+import mmap
+import os
+import re
+import shlex
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable
+
+from RobotControl.RobotClasses.SSH import SSH
+from constants import LOCAL_LOG_POLL_INTERVAL
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+RETRY_DELAY = 1
+"""Seconds to wait before the log stream is reopened after it failed"""
+RECENT_EVENTS = 100
+"""The number of events kept for wait_for_event"""
+
+
+class RobotLogEventType(Enum):
+    program_started = "program_started"
+    compile_error = "compile_error"
+    runtime_error = "runtime_error"
+    type_error = "type_error"
+    protective_stop = "protective_stop"
+
+
+_EVENT_PATTERNS: list[tuple[RobotLogEventType, re.Pattern]] = [
+    (RobotLogEventType.compile_error, re.compile(r"Compile error|Lexer exception|Syntax error")),
+    (RobotLogEventType.type_error, re.compile(r"Type error")),
+    (RobotLogEventType.runtime_error, re.compile(r"Runtime error")),
+    (RobotLogEventType.protective_stop, re.compile(r"New safety mode: SAFETY_MODE_PROTECTIVE_STOP")),
+    (RobotLogEventType.program_started, re.compile(r"Starting program")),
+]
+
+
+class RobotLogEvent:
+    """
+    A line of the robot's log that is of interest to the proxy.
+
+    message is the part of the line after "ERROR -", or the whole line if it is no error.
+    received_at is the monotonic time the line was read.
+    """
+
+    def __init__(self, event_type: RobotLogEventType, line: str):
+        self.type: RobotLogEventType = event_type
+        self.line: str = line
+        parts = re.split(r'ERROR\s+-', line, maxsplit=1)
+        self.message: str = parts[1] if len(parts) == 2 else line
+        self.received_at: float = time.monotonic()
+
+    def __str__(self):
+        return f"{self.type.value}: {self.message}"
+
+
+def parse_log_line(line: str) -> RobotLogEvent | None:
+    """Returns the event described by a line of the robot's log, or None if the line is not of interest."""
+    for event_type, pattern in _EVENT_PATTERNS:
+        if pattern.search(line):
+            return RobotLogEvent(event_type, line)
+    return None
+
+
+type LogEventListener = Callable[[RobotLogEvent], None]
+
+
+class RobotLogStream(threading.Thread):
+    """
+    Follows the robot's log with `tail -F` on an SSH exec channel and turns new lines into RobotLogEvents.
+    A log that is mounted locally is followed directly instead.
+
+    The channel stays open for the lifetime of the proxy, so events arrive as soon as the controller writes them
+    instead of after a program has finished. The listeners are called on the event loop.
+    If the channel or the SSH connection fails, the stream is reopened.
+    """
+
+    def __init__(self, ssh: SSH, loop: asyncio.AbstractEventLoop):
+        super().__init__(name="RobotLogStream", daemon=True)
+        self.ssh: SSH = ssh
+        self.loop: asyncio.AbstractEventLoop = loop
+        self.streaming = threading.Event()
+        """Set while the exec channel is open. Events can be missed while it is not set"""
+        self._listeners: list[LogEventListener] = []
+        self._recent_events: deque[RobotLogEvent] = deque(maxlen=RECENT_EVENTS)
+        self._event_received = threading.Condition()
+
+    def add_listener(self, listener: LogEventListener):
+        self._listeners.append(listener)
+
+    def run(self):
+        while True:
+            try:
+                if self.ssh.local_error_log is not None:
+                    self._follow_local_log(self.ssh.local_error_log)
+                else:
+                    self._follow_log()
+            except Exception as e:
+                non_recurring_logger.error(f"Robot log stream failed: {e}")
+            self.streaming.clear()
+            time.sleep(RETRY_DELAY)
+
+    def _follow_log(self):
+        transport = self.ssh.ssh_client.get_transport()
+        channel = transport.open_session()
+        try:
+            # -n 0 skips the existing lines, -F keeps following the log when it is rotated
+            channel.exec_command(f"tail -n 0 -F {shlex.quote(self.ssh.path_to_error_log)}")
+            self.streaming.set()
+            non_recurring_logger.info(f"Streaming robot log {self.ssh.path_to_error_log}")
+
+            with channel.makefile("rb") as stdout:
+                for raw_line in stdout:
+                    self._handle_line(raw_line.rstrip(b"\n"))
+            non_recurring_logger.warning(f"Robot log stream ended with exit status {channel.recv_exit_status()}")
+        finally:
+            self.streaming.clear()
+            channel.close()
+
+    def _follow_local_log(self, path: str):
+        """
+        Follows a locally mounted log like `tail -n 0 -F`. New bytes are read through a memory map of the file,
+        a file that shrank or was replaced is read from its start again.
+        """
+        offset = os.path.getsize(path)
+        identity = os.stat(path).st_ino
+        partial_line = b""
+        self.streaming.set()
+        non_recurring_logger.info(f"Streaming local robot log {path}")
+
+        while True:
+            attributes = os.stat(path)
+            if attributes.st_ino != identity or attributes.st_size < offset:
+                recurring_logger.debug("Local robot log was rotated, reading it from the start")
+                identity, offset, partial_line = attributes.st_ino, 0, b""
+            if attributes.st_size == offset:
+                time.sleep(LOCAL_LOG_POLL_INTERVAL)
+                continue
+
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = len(mapped)
+                lines = (partial_line + mapped[offset:end]).split(b"\n")
+            offset = end
+            # The last line is not complete yet
+            partial_line = lines.pop()
+            for raw_line in lines:
+                self._handle_line(raw_line)
+
+    def _handle_line(self, raw_line: bytes):
+        event = parse_log_line(raw_line.decode("utf-8", errors="replace").rstrip("\r"))
+        if event is not None:
+            recurring_logger.debug(f"Robot log event: {event}")
+            with self._event_received:
+                self._recent_events.append(event)
+                self._event_received.notify_all()
+            self.loop.call_soon_threadsafe(self._dispatch, event)
+
+    def wait_for_event(self, event_types: set[RobotLogEventType], since: float, timeout: float) -> RobotLogEvent | None:
+        """
+        Blocks until an event of one of the types was received after the monotonic time since.
+        Returns the event, or None if the timeout in seconds ran out. Meant for threads other than the event loop.
+        """
+        def find_event() -> RobotLogEvent | None:
+            return next((event for event in reversed(self._recent_events)
+                         if event.type in event_types and event.received_at >= since), None)
+
+        with self._event_received:
+            return self._event_received.wait_for(find_event, timeout)
+
+    def _dispatch(self, event: RobotLogEvent):
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                recurring_logger.error(f"Error in robot log listener {listener}: {e}")
@@ -1,15 +1,26 @@
+import hashlib
+import io
+import mmap
 import os
+import shlex
+import threading
+from contextlib import contextmanager
+from typing import Iterator, BinaryIO
+
 import paramiko
 
-from constants import ROBOT_IP, SSH_USERNAME, SSH_PASSWORD, IS_PHYSICAL_ROBOT
+from constants import ROBOT_IP, SSH_USERNAME, SSH_PASSWORD, IS_PHYSICAL_ROBOT, SSH_KEEPALIVE_INTERVAL
+from constants import SFTP_IDLE_SESSIONS, SFTP_HEALTH_CHECK_AFTER, LOG_READ_BLOCK_SIZE
+from constants import LOCAL_PROGRAMS_DIR, LOCAL_LOG_DIR
 from custom_logging import LogConfig
-from RobotControl.RobotClasses.RobotController import RobotController
+from RobotControl.RobotClasses.SftpSessionPool import SftpSessionPool
 
 recurring_logger = LogConfig.get_recurring_logger(__name__)
 non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
 class SSH:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -18,158 +29,263 @@ class SSH:
 
     @classmethod
     def get_instance(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = cls(*args, **kwargs)
+        # The robot's connections are opened by several threads at once during startup
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls(*args, **kwargs)
+                except Exception:
+                    # A failed connection is retried by the next call
+                    cls._instance = None
+                    raise
         return cls._instance
 
     def __init__(self):
-        self.controller: RobotController = RobotController.get_instance()
-        self.ssh_client = paramiko.SSHClient()
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        non_recurring_logger.debug(f"SSH: Connecting to {ROBOT_IP} with username {SSH_USERNAME}")
-        self.ssh_client.connect(ROBOT_IP, username=SSH_USERNAME, password=SSH_PASSWORD)
+        self.sftp_pool = SftpSessionPool(self.__connect, SFTP_IDLE_SESSIONS, SFTP_HEALTH_CHECK_AFTER)
+        # Connect right away, so a wrong address or password shows up at startup
+        self.sftp_pool.client
 
         self.path_to_programs_dir = "/programs"
 
         self.path_to_error_log = "../ursim/URControl.log"
         if IS_PHYSICAL_ROBOT:
             self.path_to_error_log = "/root/polyscope.log"
+        self.program_start_offset: int | None = None
+        """The size of the log file when the last program was started, see mark_program_start"""
+        self._written_files: dict[str, tuple[str, int, int]] = dict()
+        """The content hash, size and modification time of every file written by write_script"""
+
+        # URSim's directories can be bind-mounted into the proxy's container, a physical robot always uses SSH
+        self.local_programs_dir: str | None = self.__local_directory(LOCAL_PROGRAMS_DIR)
+        """The local mount of path_to_programs_dir, or None if files are written over SFTP"""
+        log_dir = self.__local_directory(LOCAL_LOG_DIR)
+        self.local_error_log: str | None = \
+            os.path.join(log_dir, os.path.basename(self.path_to_error_log)) if log_dir is not None else None
+        """The local mount of path_to_error_log, or None if the log is read over SSH"""
+
+    @staticmethod
+    def __local_directory(path: str) -> str | None:
+        if not path or IS_PHYSICAL_ROBOT:
+            return None
+        if not os.path.isdir(path):
+            non_recurring_logger.warning(f"Local directory {path} does not exist, using SSH instead")
+            return None
+        non_recurring_logger.info(f"Using local directory {path} instead of SSH")
+        return path
+
+    @staticmethod
+    def __connect() -> paramiko.SSHClient:
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        non_recurring_logger.debug(f"SSH: Connecting to {ROBOT_IP} with username {SSH_USERNAME}")
+        ssh_client.connect(ROBOT_IP, username=SSH_USERNAME, password=SSH_PASSWORD)
+        ssh_client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        return ssh_client
+
+    @property
+    def ssh_client(self) -> paramiko.SSHClient:
+        """The SSH connection to the robot. It is reconnected if it was lost."""
+        return self.sftp_pool.client
 
     def close(self):
         """
-        Closes the SSH connection.
+        Closes the SFTP sessions and the SSH connection.
         """
-        self.ssh_client.close()
+        self.sftp_pool.close()
 
-    def write_script(self, content: str, filename: str = "script_code.script"):
+    def write_script(self, content: str, filename: str = "script_code.script") -> bool:
         """
-        Writes a script to the robot's file system using SSH.
+        Writes a script to the robot's file system using SSH, or to the local mount of the programs directory.
+        The write is skipped if the file still holds the same content, which is checked by the hash of the content
+        written last and the size and modification time the file had then.
+
+            Returns:
+                True if the file was written, False if it was already up to date.
+
+            Raises:
+                Exception: If the file could not be written. The next call writes it again.
         """
         filepath = os.path.join(self.path_to_programs_dir, filename)
+        data = content.encode()
+        digest = hashlib.sha256(data).hexdigest()
 
         try:
-            sftp = self.ssh_client.open_sftp()
-            recurring_logger.debug("Opened SFTP connection")
-        except Exception as e:
-            non_recurring_logger.error(f"Failed to open SFTP connection: {e}")
-            return
+            if self.local_programs_dir is not None:
+                return self.__write_local_file(os.path.join(self.local_programs_dir, filename), data)
 
-        try:
-            with sftp.file(filepath, 'w') as f:
-                f.write(content)
+            with self.sftp_pool.session() as sftp:
+                written = self._written_files.get(filepath)
+                if written is not None and written[0] == digest:
+                    attributes = sftp.stat(filepath)
+                    if (attributes.st_size, attributes.st_mtime) == written[1:]:
+                        recurring_logger.debug(f"Script at {filepath} is up to date, skipping the write")
+                        return False
+
+                self._written_files.pop(filepath, None)
+                with sftp.file(filepath, 'w') as f:
+                    f.write(data)
+                attributes = sftp.stat(filepath)
+                self._written_files[filepath] = (digest, attributes.st_size, attributes.st_mtime)
                 recurring_logger.debug(f"Script written to {filepath}")
         except Exception as e:
             non_recurring_logger.error(f"Failed to write script: {e}")
-        finally:
-            recurring_logger.debug("Closing SFTP connection")
-            sftp.close()
+            # The file may be partly written, so it must not be taken as up to date
+            self._written_files.pop(filepath, None)
+            raise
+        return True
+
+    @staticmethod
+    def __write_local_file(path: str, data: bytes) -> bool:
+        """Replaces a local file at once, so the controller never reads a half written file. Skips identical files."""
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        recurring_logger.debug(f"{path} is up to date, skipping the write")
+                        return False
+        except FileNotFoundError:
+            pass
+
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+        recurring_logger.debug(f"File written to {path}")
+        return True
+
+    def forget_written_script(self, filename: str = "script_code.script"):
+        """Makes the next write_script write the file, for example after it could not be loaded."""
+        self._written_files.pop(os.path.join(self.path_to_programs_dir, filename), None)
 
     def write_file(self, filepath: str, endpath: str):
         """
         Writes a binary file (e.g., .URP) to the robot's file system using SSH.
+        The upload is skipped if the remote file has the same content.
         :param filepath: The local path to the file to be transferred.
         :param endpath: The destination path on the robot's file system.
         """
         try:
-            # Open an SFTP connection
-            sftp = self.ssh_client.open_sftp()
-            recurring_logger.debug("Opened SFTP connection")
-        except Exception as e:
-            non_recurring_logger.error(f"Failed to open SFTP connection: {e}")
-            return
-
-        try:
-            # Open the local file in binary read mode
             with open(filepath, 'rb') as local_file:
-                # Open the remote file in binary write mode
-                with sftp.file(endpath, 'wb') as remote_file:
-                    # Read and write the file in chunks to handle large files
-                    while chunk := local_file.read(4096):  # Read 4KB at a time
-                        remote_file.write(chunk)
-                    recurring_logger.debug(f"Binary file written to {endpath}")
+                content = local_file.read()
+
+            programs_dir = self.path_to_programs_dir + "/"
+            if self.local_programs_dir is not None and endpath.startswith(programs_dir):
+                self.__write_local_file(os.path.join(self.local_programs_dir, endpath[len(programs_dir):]), content)
+                return
+
+            if self.__remote_file_hash(endpath) == hashlib.sha256(content).hexdigest():
+                recurring_logger.debug(f"{endpath} is up to date, skipping the upload")
+                return
+
+            with self.sftp_pool.session() as sftp, sftp.file(endpath, 'wb') as remote_file:
+                remote_file.write(content)
+                recurring_logger.debug(f"Binary file written to {endpath}")
         except Exception as e:
             non_recurring_logger.error(f"Failed to write binary file: {e}")
-        finally:
-            # Close the SFTP connection
-            recurring_logger.debug("Closing SFTP connection")
-            sftp.close()
 
-    def read_lines_from_log(self, lines: int):
+    def __remote_file_hash(self, path: str) -> str | None:
+        """Returns the SHA-256 hash of a file on the robot, computed there, or None if the file does not exist."""
+        _, stdout, _ = self.ssh_client.exec_command(f"sha256sum {shlex.quote(path)}")
+        output = stdout.read().decode()
+        if stdout.channel.recv_exit_status() != 0:
+            return None
+        return output.split(" ", 1)[0]
+
+    def mark_program_start(self):
         """
-        Reads the last `lines` number of lines from the robot's log file.
+        Remembers the current end of the robot's log file, right before a program is started.
+        get_logs_from_last_program_run then only has to read the lines written after it.
         """
         try:
-            sftp = self.ssh_client.open_sftp()
-            recurring_logger.debug("Opened SFTP connection")
+            if self.local_error_log is not None:
+                self.program_start_offset = os.path.getsize(self.local_error_log)
+            else:
+                with self.sftp_pool.session() as sftp:
+                    self.program_start_offset = sftp.stat(self.path_to_error_log).st_size
+            recurring_logger.debug(f"Program starts at offset {self.program_start_offset} of the log")
         except Exception as e:
-            non_recurring_logger.error(f"Failed to open SFTP connection: {e}")
-            return ""
+            non_recurring_logger.error(f"Failed to read size of error log: {e}")
+            self.program_start_offset = None
+
+    @contextmanager
+    def __open_error_log(self) -> Iterator[tuple[BinaryIO, int]]:
+        """
+        Opens the robot's log and returns it with its current size.
+        A locally mounted log is memory-mapped, so reading it from the end costs no copies of the whole file.
+        """
+        if self.local_error_log is None:
+            with self.sftp_pool.session() as sftp, sftp.file(self.path_to_error_log, 'rb') as f:
+                yield f, f.stat().st_size
+            return
 
+        with open(self.local_error_log, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                # An empty file cannot be mapped
+                yield io.BytesIO(), 0
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped, size
+
+    def read_lines_from_log(self, lines: int):
+        """
+        Reads the last `lines` number of lines from the robot's log file.
+        """
         try:
-            with sftp.file(self.path_to_error_log, 'rb') as f:
-                # Move to the end of the file
-                f.seek(0, os.SEEK_END)
-                position = f.tell()
-                lines_read = 0
-                line = b""
-
-                # Read backwards until the desired number of lines is found
-                while position >= 0 and lines_read < lines:
-                    f.seek(position)
-                    char = f.read(1)
-                    if char == b'\n' and line:
-                        lines_read += 1
-                        if lines_read == lines:
-                            break
-                    line = char + line
-                    position -= 1
-
-                return line.decode("utf-8")
+            with self.__open_error_log() as (f, size):
+                last_lines = []
+                for line in self.__read_lines_backwards(f, size):
+                    last_lines.append(line)
+                    if len(last_lines) == lines:
+                        break
+                return "\n".join(reversed(last_lines))
         except Exception as e:
             non_recurring_logger.error(f"Failed to read error log: {e}")
             return ""
-        finally:
-            recurring_logger.debug("Closing SFTP connection")
-            sftp.close()
 
     def get_logs_from_last_program_run(self) -> list[str]:
         """
-        Reads the logs up to the last "Starting program" line.
+        Reads the logs up to the last "Starting program" line, newest line first.
         This is used to get the logs from the last program run.
+        If mark_program_start was called, only the lines written since then are read.
         """
         try:
-            sftp = self.ssh_client.open_sftp()
-            recurring_logger.debug("Opened SFTP connection")
-        except Exception as e:
-            non_recurring_logger.error(f"Failed to open SFTP connection: {e}")
-            return []
+            with self.__open_error_log() as (f, size):
+                start = 0
+                if self.program_start_offset is not None and self.program_start_offset <= size:
+                    start = self.program_start_offset
+                else:
+                    recurring_logger.debug("Start of the program in the log is unknown, searching the whole log")
 
-        try:
-            with sftp.file(self.path_to_error_log, 'rb') as f:
-                # Move to the end of the file
-                f.seek(0, os.SEEK_END)
-                position = f.tell()
-                line = b""
                 logs = []
-                
-                # Read backwards until the "Starting program" line is found
-                while position >= 0:
-                    f.seek(position)
-                    char = f.read(1)
-                    if char == b'\n' and line:
-                        line_decoded = line.decode("utf-8")
-                        if "Starting program" in line_decoded:
-                            break
-                        logs.append(line_decoded)
-                        line = b""
-                    line = char + line
-                    position -= 1
-                
-                return logs  
+                for line in self.__read_lines_backwards(f, size, start):
+                    if "Starting program" in line:
+                        break
+                    logs.append(line)
+                return logs
         except Exception as e:
             non_recurring_logger.error(f"Failed to read error log: {e}")
             return []
-        finally:
-            recurring_logger.debug("Closing SFTP connection")
-            sftp.close()
 
+    @staticmethod
+    def __read_lines_backwards(f: BinaryIO, end: int, start: int = 0) -> Iterator[str]:
+        """
+        Yields the non-empty lines between the byte offsets start and end, newest line first, without line endings.
+        The file is read from the end in blocks of LOG_READ_BLOCK_SIZE bytes, which are split into lines locally.
+        """
+        position = end
+        remainder = b""
+        while position > start:
+            size = min(LOG_READ_BLOCK_SIZE, position - start)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+            # The first line may continue in the previous block
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                line = line.removesuffix(b"\r")
+                if line:
+                    yield line.decode("utf-8", errors="replace")
+        remainder = remainder.removesuffix(b"\r")
+        if remainder:
+            yield remainder.decode("utf-8", errors="replace")
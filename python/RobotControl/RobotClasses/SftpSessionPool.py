@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import paramiko
+
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class SftpSessionPool:
+    """
+    Keeps SFTP sessions open between calls instead of opening a new one for every file operation.
+
+    All sessions are channels on the same SSH transport. Every caller gets its own session, so a log read can run
+    while a script is written. Sessions are handed out again after use, as long as they are healthy.
+    If the transport has died, the connect function is called to open a new SSH connection before new sessions are opened.
+    """
+
+    def __init__(self, connect: Callable[[], paramiko.SSHClient], max_idle_sessions: int, health_check_after: float):
+        """
+            Args:
+                connect: Opens the SSH connection and returns the connected client.
+                max_idle_sessions: The number of unused sessions kept open. More sessions are opened when needed.
+                health_check_after: Seconds a session may be idle before it is checked with a round trip to the robot.
+        """
+        self._connect = connect
+        self._client: paramiko.SSHClient | None = None
+        self.max_idle_sessions: int = max_idle_sessions
+        self.health_check_after: float = health_check_after
+
+        self._lock = threading.Lock()
+        self._idle: list[tuple[paramiko.SFTPClient, float]] = []
+        self.sessions_opened: int = 0
+        self.sessions_reused: int = 0
+        self.reconnects: int = 0
+
+    @property
+    def client(self) -> paramiko.SSHClient:
+        """The SSH client the sessions run on. Connects if it is not connected."""
+        with self._lock:
+            return self._ensure_client()
+
+    def _ensure_client(self) -> paramiko.SSHClient:
+        transport = self._client.get_transport() if self._client is not None else None
+        if transport is None or not transport.is_active():
+            if self._client is not None:
+                non_recurring_logger.warning("SSH connection to the robot was lost, reconnecting")
+                self.reconnects += 1
+                self._close_idle()
+                self._client.close()
+            self._client = self._connect()
+        return self._client
+
+    @contextmanager
+    def session(self) -> Iterator[paramiko.SFTPClient]:
+        """
+        Hands out an SFTP session for the duration of the with block.
+
+        A session that raised an exception is closed instead of reused, the next call opens a fresh one.
+        """
+        sftp = self._acquire()
+        try:
+            yield sftp
+        except Exception:
+            self._discard(sftp)
+            raise
+        self._release(sftp)
+
+    def _acquire(self) -> paramiko.SFTPClient:
+        with self._lock:
+            client = self._ensure_client()
+            while self._idle:
+                sftp, idle_since = self._idle.pop()
+                if self._is_healthy(sftp, idle_since):
+                    self.sessions_reused += 1
+                    return sftp
+                self._discard(sftp)
+
+        sftp = client.open_sftp()
+        with self._lock:
+            self.sessions_opened += 1
+        recurring_logger.debug("Opened SFTP session")
+        return sftp
+
+    def _is_healthy(self, sftp: paramiko.SFTPClient, idle_since: float) -> bool:
+        channel = sftp.get_channel()
+        if channel is None or channel.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            sftp.normalize(".")
+            return True
+        except Exception as e:
+            recurring_logger.debug(f"Idle SFTP session failed the health check: {e}")
+            return False
+
+    def _release(self, sftp: paramiko.SFTPClient):
+        with self._lock:
+            if len(self._idle) < self.max_idle_sessions:
+                self._idle.append((sftp, time.monotonic()))
+                return
+        self._discard(sftp)
+
+    @staticmethod
+    def _discard(sftp: paramiko.SFTPClient):
+        try:
+            sftp.close()
+        except Exception as e:
+            recurring_logger.debug(f"Failed to close SFTP session: {e}")
+
+    def _close_idle(self):
+        for sftp, _ in self._idle:
+            self._discard(sftp)
+        self._idle.clear()
+
+    def close(self):
+        """Closes all idle sessions and the SSH connection."""
+        with self._lock:
+            self._close_idle()
+            if self._client is not None:
+                self._client.close()
+                self._client = None
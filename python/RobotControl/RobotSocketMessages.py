@@ -3,7 +3,9 @@ import math
 import time
 from enum import Enum, auto
 
-from URIFY import URIFY_return_string
+from BinaryWireFormat import BinaryWriter, BinaryTag
+from URIFY import URIFY_return_string, URIFY_compact_report, COMPACT_REPORT_MARKER, estimate_compact_report_length
+from URIFY import URSCRIPT_MAX_STRING_LENGTH
 
 from RobotControl.RobotSocketVariableTypes import VariableTypes
 from custom_logging import LogConfig
@@ -58,6 +60,13 @@ class ReportState:
     def __str__(self):
         return json.dumps(self.dump(True, True))
 
+    def __bytes__(self):
+        writer = BinaryWriter(BinaryTag.Report_state).i64(self.id).i64(self.timestamp).u16(len(self.variables))
+        for variable in self.variables:
+            writer.string(variable.name).string(variable.variable_type.name).u8(variable.global_variable)
+            writer.value(variable.value)
+        return writer.build()
+
     def dump(self, raw_values=False, with_timestamp=False):
         out = {
             "type": self.type.name,
@@ -75,6 +84,19 @@ class ReportState:
     def dump_string_post_urify(self):
         return URIFY_return_string(self.dump_string_pre_urify())
 
+    def dump_string_compact(self):
+        """Returns the URScript that sends this report as a compact report with a single socket_send_string."""
+        return URIFY_compact_report(self.id, self._compact_variables())
+
+    def fits_compact_report(self, value_length: int) -> bool:
+        """Whether the compact report stays within the string limit of the controller if no value is longer."""
+        return estimate_compact_report_length(self.id, self._compact_variables(),
+                                              value_length) <= URSCRIPT_MAX_STRING_LENGTH
+
+    def _compact_variables(self) -> list[tuple[str, str, bool, str]]:
+        return [(variable.name, variable.variable_type.name, variable.global_variable, str(variable.value))
+                for variable in self.variables]
+
 
 def parse_list_to_variable_objects(variable_list: list[dict]) -> list[VariableObject]:
     out: list[VariableObject] = list()
@@ -93,6 +115,50 @@ def parse_list_to_variable_objects(variable_list: list[dict]) -> list[VariableOb
     return out
 
 
+def parse_compact_value(variable_type: VariableTypes, value: str):
+    """Converts a value sent with to_str to the value the JSON report would have contained."""
+    if variable_type == VariableTypes.String:
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        # Values like poses are no valid JSON, they are kept as the robot sent them
+        return value
+
+
+def is_compact_report(message: bytes) -> bool:
+    return message[:1] == COMPACT_REPORT_MARKER.encode()
+
+
+def parse_compact_report(message: bytes) -> ReportState:
+    """Parses a report built by URIFY_compact_report. Lengths are counted in bytes, so the fields are decoded one by one."""
+    timestamp = math.floor(time.time_ns() / 1_000_000)
+    marker = COMPACT_REPORT_MARKER.encode()
+
+    fields: list[str] = list()
+    position = 1
+    while position < len(message):
+        length_end = message.index(marker, position)
+        field_end = length_end + 1 + int(message[position:length_end])
+        if field_end > len(message):
+            raise ValueError("Compact report was truncated, the controller limits strings to 1023 bytes")
+        fields.append(message[length_end + 1:field_end].decode())
+        position = field_end
+
+    if len(fields) % 4 != 1:
+        raise ValueError(f"Compact report has {len(fields)} fields, expected the id and 4 fields per variable")
+    variables: list[VariableObject] = list()
+    for index in range(1, len(fields), 4):
+        name, type_name, global_variable, value = fields[index:index + 4]
+        if type_name not in VariableTypes.__members__:
+            raise ValueError(f"Compact report has a variable of unknown type: {type_name}")
+        variable_type = VariableTypes[type_name]
+        variables.append(VariableObject(name, variable_type, parse_compact_value(variable_type, value),
+                                        global_variable == "1"))
+
+    return ReportState(int(fields[0]), variables, timestamp)
+
+
 def parse_robot_message(message: str) -> ReportState:
     timestamp = math.floor(time.time_ns() / 1_000_000)
     parsed = json.loads(message)
@@ -1,55 +1,147 @@
 import asyncio
 import re
 import threading
+import time
 from time import sleep
-from typing import Callable
+from typing import Callable, Hashable
 
+from RobotControl.ProtectiveStopRecovery import protective_stop_recovery
 from RobotControl.Robot import Robot
-from SocketMessages import AckResponse, Status
+from RobotControl.RobotClasses.InterpreterMode import is_interpreter_statement
+from RobotControl.RobotClasses.RobotLogStream import RobotLogStream, RobotLogEvent, RobotLogEventType, parse_log_line
+from RobotJobScheduler import robot_job_scheduler, CancellationToken
+from RobotStatus import robot_status
+from SocketMessages import AckResponse, Status, RuntimeStateTypes
 from WebsocketNotifier import websocket_notifier
-from constants import IS_PHYSICAL_ROBOT
+from constants import IS_PHYSICAL_ROBOT, INTERPRETER_FAST_PATH
 from custom_logging import LogConfig
 
 recurring_logger = LogConfig.get_recurring_logger(__name__)
 non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
-robot = Robot.get_instance()
+_log_stream: RobotLogStream | None = None
+
+PROGRAM_START_TIMEOUT = 2
+"""Seconds to wait for the program to start playing or to fail to compile after play was sent"""
+SIGNAL_CHECK_TIME = 0.01
+"""Seconds between checks of the RTDE status while waiting on the log stream"""
+LOG_CHECK_TIME = 0.1
+"""Seconds between reads of the robot's log while waiting on RTDE without the log stream"""
+
+PROTECTIVE_STOP_MESSAGE = """
+        PROTECTIVE STOP: Reconsider how the robot is moving.
+        You will not be able to run a program for five seconds.
+        """
 
 def augment_script(script: str) -> str:
+    robot = Robot.get_instance()
 
     socket_connection_text = robot.controller.open_feedback_socket_string
     out = socket_connection_text + script
 
     return out
 
-def run_script_on_robot(script: str) -> str:
+async def run_script_on_robot_async(client: Hashable, script: str, allow_interpreter: bool = False) -> str:
+    """
+    Queues the script with the robot job scheduler, which runs run_script_on_robot on a worker thread, so the event
+    loop keeps forwarding RTDE data and serving the other clients while the script is uploaded and started.
+    Only one script is started at a time.
+
+        Args:
+            client: The web client that sent the script. A newer script of the same client replaces a queued one.
+            script (str): The script to run.
+            allow_interpreter: Short single statements may run in interpreter mode instead, see run_command_on_robot.
+
+        Returns:
+            An error message or an empty string.
+
+        Raises:
+            RateLimitExceeded: If the client sends scripts too fast.
+            JobCancelled: If the script was stopped or replaced before it was started.
+    """
+    run = run_command_on_robot if allow_interpreter else run_script_on_robot
+    return await robot_job_scheduler.submit(client, lambda cancellation: run(script, cancellation))
+
+
+def run_command_on_robot(command: str, cancellation: CancellationToken | None = None) -> str:
+    """
+    Runs a short single statement in interpreter mode, which answers within milliseconds since nothing is uploaded,
+    loaded or played. Everything else, or a statement the interpreter does not answer, runs as a program.
+
+        Args:
+            command (str): The command to run.
+            cancellation: Checked before the command is sent.
+
+        Returns:
+            An error message or an empty string.
+    """
+    robot = Robot.get_instance()
+    cancellation = cancellation or CancellationToken()
+    if INTERPRETER_FAST_PATH and is_interpreter_statement(command):
+        started_at = time.monotonic()
+        with cancellation.step():
+            reply = robot.interpreter_mode.interpret(command, robot.controller.open_feedback_socket_string)
+        if reply is not None:
+            recurring_logger.debug(f"Interpreter answered in {time.monotonic() - started_at:.3f} s: {reply}")
+            # Runtime errors are reported by the log stream, like for programs
+            return "" if reply.accepted else reply.message
+        non_recurring_logger.warning("Interpreter mode is not available, running the command as a program")
+    return run_script_on_robot(command, cancellation)
+
+
+def run_script_on_robot(script: str, cancellation: CancellationToken | None = None) -> str:
     """
     Run a script on the robot using SSH.
     
         Args:
             script (str): The script to run.
+            cancellation: Checked before the program is loaded and before it is started.
     
         Returns: 
             An error message or an empty string.
     """
+    robot = Robot.get_instance()
+    cancellation = cancellation or CancellationToken()
     augmented_script = augment_script(script)
-    robot.ssh.write_script(augmented_script)
-    sleep(0.2)
+    # The script is completely written once write_script returns, so it can be loaded right away
+    try:
+        script_written = robot.ssh.write_script(augmented_script)
+    except Exception as e:
+        # Loading now would run the program that is on the robot from before
+        return f"Writing the script to the robot failed: {e}"
     
-    if not IS_PHYSICAL_ROBOT: 
-        robot.controller.load_program()
-        sleep(1)
+    if not IS_PHYSICAL_ROBOT:
+        # Loading reads the script again, which is only needed if it changed or another program is loaded
+        if script_written or not robot.controller.is_program_loaded():
+            # The dashboard answers once the program is loaded
+            with cancellation.step():
+                result = robot.controller.load_program()
+            if result.startswith(("File not found", "Error while loading")):
+                non_recurring_logger.error(f"Loading the program failed: {result}")
+                robot.ssh.forget_written_script()
+                return result
+        else:
+            recurring_logger.debug("Same script is loaded already, playing it right away")
     
-    robot.controller.start_program()
-    sleep(0.1)
+    # A stop that arrives while play is sent waits for it, so the program cannot start after it was stopped
+    with cancellation.step():
+        # Playing the program replaces the interpreter program
+        robot.interpreter_mode.end_session()
+        robot.ssh.mark_program_start()
+        started_at = time.monotonic()
+        result = robot.controller.start_program()
+    if result.startswith("Failed"):
+        non_recurring_logger.error(f"Starting the program failed: {result}")
+        return result
 
-    latest_error = robot.ssh.read_lines_from_log(1)
+    compile_error = __wait_for_program_start(started_at)
+    if compile_error:
+        non_recurring_logger.debug(f"Error in script: {compile_error}")
+        return compile_error
 
-    if "Compile error" in latest_error or "Lexer exception" in latest_error or "Syntax error" in latest_error:
-        non_recurring_logger.debug("Compile error or Lexer exception found")
-        non_recurring_logger.debug(f"Error in script: {latest_error}")
-        parts = re.split(r'ERROR\s+-', latest_error, maxsplit=1)
-        return parts[1]
+    if _log_stream is not None and _log_stream.streaming.is_set():
+        # Runtime errors are sent by handle_robot_log_event as soon as the robot logs them
+        return ""
 
     #Start thread to check for runtime errors
     def run_async_checker():
@@ -71,11 +163,15 @@ async def run_script_finished_error_checker(id: int):
         Returns: 
             None
     """
-    recurring_logger.debug(f"Robot mode: {robot.controller.robot_mode}")
-    __wait_for_condition(lambda: "Starting" not in robot.controller.robot_mode)
-    
-    recurring_logger.debug(f"Program state: {robot.controller.program_state}")
-    __wait_for_condition(lambda: "PLAYING" not in robot.controller.program_state)
+    robot = Robot.get_instance()
+    if robot_status.is_available:
+        robot_status.wait_for(lambda status: status.runtime_state != RuntimeStateTypes.playing, 60)
+    else:
+        recurring_logger.debug(f"Robot mode: {robot.controller.robot_mode}")
+        __wait_for_condition(lambda: "Starting" not in robot.controller.robot_mode)
+
+        recurring_logger.debug(f"Program state: {robot.controller.program_state}")
+        __wait_for_condition(lambda: "PLAYING" not in robot.controller.program_state)
     
     latest_errors: list[str] = robot.ssh.get_logs_from_last_program_run()
     non_recurring_logger.debug(f"Latest errors:")
@@ -95,17 +191,88 @@ async def run_script_finished_error_checker(id: int):
         return
     
     if "New safety mode: SAFETY_MODE_PROTECTIVE_STOP" in error:
-        error_text = """
-        PROTECTIVE STOP: Reconsider how the robot is moving.
-        You will not be able to run a program for five seconds.
-        """
-        __send_error_message_to_web_clients(id, error_text)
-
-        # Close safety popup
-        robot.controller.close_safety_popup()
-        robot.controller.unlock_protective_stop()
+        __send_error_message_to_web_clients(id, PROTECTIVE_STOP_MESSAGE)
+        protective_stop_recovery.trigger()
         return
 
+
+def __wait_for_program_start(started_at: float) -> str:
+    """
+    Waits until RTDE reports that the program started playing, or the robot's log reports a compile error.
+    Without the log stream, the log is read every LOG_CHECK_TIME seconds while waiting on RTDE.
+    Falls back to reading the log if neither signal arrives in time.
+
+        Args:
+            started_at (float): The monotonic time play was sent.
+
+        Returns:
+            The compile error, or an empty string if the program started.
+    """
+    robot = Robot.get_instance()
+    def has_started(status) -> bool:
+        entered_at = status.runtime_state_entered_at(RuntimeStateTypes.playing)
+        return entered_at is not None and entered_at >= started_at
+
+    streaming = _log_stream is not None and _log_stream.streaming.is_set()
+    if robot_status.is_available or streaming:
+        deadline = started_at + PROGRAM_START_TIMEOUT
+        while (remaining := deadline - time.monotonic()) > 0:
+            if has_started(robot_status):
+                recurring_logger.debug(f"Program started after {time.monotonic() - started_at:.3f} s")
+                return ""
+            if streaming:
+                event = _log_stream.wait_for_event({RobotLogEventType.compile_error}, started_at,
+                                                   min(SIGNAL_CHECK_TIME, remaining))
+                if event is not None:
+                    return event.message
+            elif not robot_status.wait_for(has_started, min(LOG_CHECK_TIME, remaining)):
+                # A program that failed to compile never plays, so RTDE alone would wait for the whole timeout
+                compile_error = __read_compile_error(robot)
+                if compile_error:
+                    return compile_error
+        non_recurring_logger.warning(f"Program start was not observed within {PROGRAM_START_TIMEOUT} s")
+    else:
+        # Without any signal, the compiler gets the time the fixed wait used to give it
+        sleep(0.1)
+
+    return __read_compile_error(robot)
+
+
+def __read_compile_error(robot: Robot) -> str:
+    """Returns the compile error the robot logged since the program was started, or an empty string."""
+    for line in robot.ssh.get_logs_from_last_program_run():
+        event = parse_log_line(line)
+        if event is not None and event.type == RobotLogEventType.compile_error:
+            non_recurring_logger.debug("Compile error or Lexer exception found")
+            return event.message
+    return ""
+
+
+async def start_robot_log_stream():
+    """Starts following the robot's log, so runtime errors reach the web clients while the program is running."""
+    robot = Robot.get_instance()
+    global _log_stream
+    _log_stream = RobotLogStream(robot.ssh, asyncio.get_running_loop())
+    _log_stream.add_listener(handle_robot_log_event)
+    _log_stream.start()
+
+
+def handle_robot_log_event(event: RobotLogEvent):
+    """
+    Sends runtime errors and protective stops to all web clients as soon as they appear in the robot's log.
+    Compile errors are returned by run_script_on_robot instead.
+    """
+    match event.type:
+        case RobotLogEventType.runtime_error | RobotLogEventType.type_error:
+            __send_error_message_to_web_clients(0, event.message)
+        case RobotLogEventType.protective_stop:
+            __send_error_message_to_web_clients(0, PROTECTIVE_STOP_MESSAGE)
+            # Usually RTDE has started the recovery already, then this does nothing
+            protective_stop_recovery.trigger(event.received_at)
+        case _:
+            pass
+
+
 def add_line_number_text(text: str) -> str:
     """
     Modifies the text to include line number. 
@@ -137,20 +304,22 @@ def __send_error_message_to_web_clients(id: int, message: str):
             None
     """
     response = AckResponse(id, "Error", message, Status.Error)
-    str_response = str(response)
-    recurring_logger.debug(f"Sending error to web clients: {str_response}")
-    websocket_notifier.notify_observers(str_response)
+    recurring_logger.debug(f"Sending error to web clients: {response}")
+    websocket_notifier.notify_observers(response)
 
 def __wait_for_condition(condition: Callable[[], bool]):
     max_wait_time = 60
     sleep_time = 0.1
-    runs = 0
+    started_at = time.monotonic()
     
     while True:
-        if condition() or runs >= max_wait_time / sleep_time:
+        waited = time.monotonic() - started_at
+        if condition() or waited >= max_wait_time:
             recurring_logger.debug(f"Condition met: {condition}")
-            recurring_logger.debug(f"Run took {runs * sleep_time} seconds")
+            recurring_logger.debug(f"Run took {waited:.3f} seconds")
             break
-        sleep(sleep_time)
-        runs += 1
-    
\ No newline at end of file
+        if robot_status.is_available:
+            # The condition reads the RTDE status, so it can only change when the status does
+            robot_status.wait_for_change(sleep_time)
+        else:
+            sleep(sleep_time)
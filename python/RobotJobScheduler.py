@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator
+
+from constants import ROBOT_JOB_RATE, ROBOT_JOB_BURST
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised to the submitter of a job that was cancelled, either while queued or while running."""
+
+
+class JobSuperseded(JobCancelled):
+    """Raised to the submitter of a queued job that was replaced by a newer job of the same client."""
+
+
+class RateLimitExceeded(ValueError):
+    """Raised when a client submits jobs faster than its rate limit allows."""
+
+
+class CancellationToken:
+    """
+    Lets a job running on a worker thread notice that it was cancelled.
+
+    The steps of a job that must not happen after a cancellation, like pressing play, run inside step().
+    Cancelling waits for a running step, so whatever is done after cancel() returns, like stopping the program,
+    happens after the step.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+
+    @contextmanager
+    def step(self) -> Iterator[None]:
+        """Runs the with block unless the job was cancelled. Raises JobCancelled if it was."""
+        with self._lock:
+            if self.cancelled:
+                raise JobCancelled()
+            yield
+
+
+type JobFunction = Callable[[CancellationToken], str]
+
+
+class RobotJob:
+    def __init__(self, client: Hashable, execute: JobFunction):
+        self.client: Hashable = client
+        self.execute: JobFunction = execute
+        self.cancellation = CancellationToken()
+        self.result: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self.submitted_at: float = time.monotonic()
+        self.started_at: float | None = None
+
+
+class TokenBucket:
+    """Allows `burst` jobs at once, refilled with `rate` jobs per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate: float = rate
+        self.burst: int = burst
+        self._tokens: float = burst
+        self._updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class RobotJobStatistics:
+    """
+    Counters of the robot job scheduler.
+
+    The wait time is the time a job spent in the queue, the execution time is the time it ran on the robot.
+    """
+
+    def __init__(self):
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.cancelled: int = 0
+        self.superseded: int = 0
+        self.rate_limited: int = 0
+        self.last_wait_time: float = 0.0
+        self.max_wait_time: float = 0.0
+        self.total_wait_time: float = 0.0
+        self.last_execution_time: float = 0.0
+        self.max_execution_time: float = 0.0
+        self.total_execution_time: float = 0.0
+
+    def record(self, wait_time: float, execution_time: float):
+        self.last_wait_time = wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.total_wait_time += wait_time
+        self.last_execution_time = execution_time
+        self.max_execution_time = max(self.max_execution_time, execution_time)
+        self.total_execution_time += execution_time
+
+    def dump(self):
+        """Dumps the counters to a dictionary that can be converted to JSON."""
+        started = self.completed + self.failed + self.cancelled
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "superseded": self.superseded,
+            "rate_limited": self.rate_limited,
+            "last_wait_time": self.last_wait_time,
+            "max_wait_time": self.max_wait_time,
+            "average_wait_time": self.total_wait_time / started if started else 0.0,
+            "last_execution_time": self.last_execution_time,
+            "max_execution_time": self.max_execution_time,
+            "average_execution_time": self.total_execution_time / started if started else 0.0
+        }
+
+
+class RobotJobScheduler:
+    """
+    Runs the jobs of all web clients on the robot one at a time, since they share the script file and the dashboard.
+
+    Every client has at most one queued job. A newer job of the same client replaces the queued one, but keeps its
+    place in the queue. Clients take turns in the order they first queued a job, so one busy client cannot starve the
+    others. Jobs run on a worker thread, so the event loop is never blocked by the robot.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.statistics = RobotJobStatistics()
+        self._queued: OrderedDict[Hashable, RobotJob] = OrderedDict()
+        self._rate_limits: dict[Hashable, TokenBucket] = dict()
+        self._running: RobotJob | None = None
+        self._job_queued = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._queued)
+
+    async def submit(self, client: Hashable, execute: JobFunction) -> str:
+        """
+        Queues a job and waits for its result.
+
+            Raises:
+                RateLimitExceeded: If the client submits jobs too fast.
+                JobCancelled: If the job was cancelled, JobSuperseded if a newer job of the client replaced it.
+        """
+        bucket = self._rate_limits.setdefault(client, TokenBucket(self.rate, self.burst))
+        if not bucket.take():
+            self.statistics.rate_limited += 1
+            raise RateLimitExceeded(f"Too many commands, at most {self.rate:g} per second are accepted")
+
+        job = RobotJob(client, execute)
+        self.statistics.submitted += 1
+        superseded = self._queued.get(client)
+        if superseded is not None:
+            self.statistics.superseded += 1
+            if not superseded.result.done():
+                superseded.result.set_exception(JobSuperseded())
+            recurring_logger.debug("Queued job was superseded by a newer job of the same client")
+        self._queued[client] = job
+        self._job_queued.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_jobs())
+        return await job.result
+
+    async def cancel(self, client: Hashable):
+        """Cancels the queued job of the client and the job that is running, whichever client it belongs to."""
+        queued = self._drop_queued(client)
+        if queued is not None and not queued.result.done():
+            queued.result.set_exception(JobCancelled())
+        if self._running is not None:
+            # Waits for a running step of the job, which may take a moment
+            await asyncio.to_thread(self._running.cancellation.cancel)
+
+    def forget(self, client: Hashable):
+        """Drops the queued job and the rate limit of a client that disconnected."""
+        queued = self._drop_queued(client)
+        if queued is not None:
+            # Nobody is left to answer, so the submitter's wait simply ends
+            queued.result.cancel()
+        self._rate_limits.pop(client, None)
+
+    def _drop_queued(self, client: Hashable) -> RobotJob | None:
+        """Removes the queued job of the client from the queue and counts it as cancelled."""
+        queued = self._queued.pop(client, None)
+        if queued is not None:
+            self.statistics.cancelled += 1
+        return queued
+
+    async def _run_jobs(self):
+        while True:
+            while not self._queued:
+                self._job_queued.clear()
+                await self._job_queued.wait()
+
+            _, job = self._queued.popitem(last=False)
+            self._running = job
+            job.started_at = time.monotonic()
+            try:
+                result = await asyncio.to_thread(job.execute, job.cancellation)
+                self.statistics.completed += 1
+                # The submitter may have stopped waiting, e.g. because its web client disconnected
+                if not job.result.done():
+                    job.result.set_result(result)
+            except JobCancelled as e:
+                self.statistics.cancelled += 1
+                if not job.result.done():
+                    job.result.set_exception(e)
+            except Exception as e:
+                self.statistics.failed += 1
+                if not job.result.done():
+                    job.result.set_exception(e)
+            finally:
+                self._running = None
+                self.statistics.record(job.started_at - job.submitted_at, time.monotonic() - job.started_at)
+                recurring_logger.debug(f"Robot job finished: {self.statistics.dump()}")
+
+
+robot_job_scheduler = RobotJobScheduler(ROBOT_JOB_RATE, ROBOT_JOB_BURST)
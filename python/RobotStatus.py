@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Callable
+
+from SocketMessages import SafetyStatusTypes, RuntimeStateTypes, RobotModeTypes
+from SocketMessages import lookup_state_types, lookup_runtime_state_types, lookup_robot_mode_types
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+STALE_AFTER = 1
+"""Seconds without an RTDE sample after which the status is no longer considered current"""
+
+
+class RobotStatus:
+    """
+    The newest safety status, runtime state and robot mode reported over RTDE.
+
+    It is updated by the RTDE reader thread with every sample, so it can be read and waited on from any thread without
+    a round trip to the robot. Waiting threads are only woken when one of the values changes.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.safety_status: SafetyStatusTypes | None = None
+        self.runtime_state: RuntimeStateTypes | None = None
+        self.robot_mode: RobotModeTypes | None = None
+        self.updated_at: float | None = None
+        """Monotonic time of the newest sample"""
+        self._runtime_state_entered_at: dict[RuntimeStateTypes, float] = dict()
+        self._listeners: list[StatusListener] = []
+
+    @property
+    def is_available(self) -> bool:
+        """True if RTDE samples are arriving, so the status can be relied on."""
+        return self.updated_at is not None and time.monotonic() - self.updated_at < STALE_AFTER
+
+    def add_listener(self, listener: "StatusListener"):
+        """Registers a function that is called with the status on the RTDE reader thread whenever a value changes."""
+        self._listeners.append(listener)
+
+    def runtime_state_entered_at(self, runtime_state: RuntimeStateTypes) -> float | None:
+        """The monotonic time the runtime state was last entered. Also catches states that were left again already."""
+        return self._runtime_state_entered_at.get(runtime_state)
+
+    def update(self, safety_status: int, runtime_state: int, robot_mode: int):
+        """Called from the RTDE reader thread with the raw values of every sample."""
+        now = time.monotonic()
+        new_values = (lookup_state_types.get(safety_status), lookup_runtime_state_types.get(runtime_state),
+                      lookup_robot_mode_types.get(robot_mode))
+        self.updated_at = now
+        if new_values == (self.safety_status, self.runtime_state, self.robot_mode):
+            return
+
+        with self._condition:
+            if new_values[1] != self.runtime_state:
+                self._runtime_state_entered_at[new_values[1]] = now
+            self.safety_status, self.runtime_state, self.robot_mode = new_values
+            recurring_logger.debug(f"Robot status changed: {self}")
+            self._condition.notify_all()
+
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                recurring_logger.error(f"Error in robot status listener {listener}: {e}")
+
+    def wait_for(self, predicate: Callable[["RobotStatus"], bool], timeout: float) -> bool:
+        """Blocks until the predicate holds for the status, or the timeout in seconds runs out. Returns the predicate."""
+        with self._condition:
+            return self._condition.wait_for(lambda: predicate(self), timeout)
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Blocks until one of the values changes, or the timeout in seconds runs out. Returns whether it changed."""
+        with self._condition:
+            return self._condition.wait(timeout)
+
+    def __str__(self):
+        names = [value.name if value is not None else None
+                 for value in (self.safety_status, self.runtime_state, self.robot_mode)]
+        return f"safety_status={names[0]}, runtime_state={names[1]}, robot_mode={names[2]}"
+
+
+type StatusListener = Callable[[RobotStatus], None]
+
+
+robot_status = RobotStatus()
@@ -22,49 +22,350 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import asyncio
-import sys
+import select
+import threading
+import time
+from collections import deque
+from socket import socket as Socket
 from typing import Callable, Coroutine
 
 from rtde import rtde_config, rtde
 from rtde.serialize import DataObject
 
-from SocketMessages import RtdeState
+from ConnectionPool import Backoff, ConnectionStatistics, ConnectionState, connection_pool
+from RobotStatus import robot_status
+from RtdeHistory import rtde_history
+from RtdeSampleBlock import RtdeRecipeLayout, RtdeBlockBuilder, RtdeSampleBlock, RtdeStreamFramer, rtde_clock
+from RtdeSubscriptions import rtde_subscriptions
+from SocketMessages import RtdeState, TransmittedInformationOptions, RtdeConnectionMessage
 from WebsocketNotifier import websocket_notifier
 from WebsocketProxy import has_new_client
-from constants import ROBOT_IP, RTDE_PORT, RTDE_CONFIG_FILE
+from constants import ROBOT_IP, RTDE_PORT, RTDE_CONFIG_FILE, RTDE_FREQUENCY, RTDE_BLOCK_SIZE, RTDE_BLOCK_MAX_AGE, \
+    RTDE_HISTORY_SECONDS
 from custom_logging import LogConfig
 
 conf = rtde_config.ConfigFile(RTDE_CONFIG_FILE)
 state_names, state_types = conf.get_recipe("state")
+recipe_layout = RtdeRecipeLayout(state_names, state_types)
+read_robot_status = recipe_layout.field_reader([option.value for option in TransmittedInformationOptions])
+"""Unpacks the safety status, runtime state and robot mode of a package, in the order of RobotStatus.update"""
 
-TRANSMIT_FREQUENCY_IN_HERTZ = 30
-SLEEP_TIME = 1 / TRANSMIT_FREQUENCY_IN_HERTZ
+MAX_RTDE_FREQUENCY = 500
+"""The highest output frequency the controller supports"""
+MAX_PENDING_BLOCKS = 100
+"""The number of finished blocks that may wait for the event loop before the oldest is dropped"""
+
+STREAM_TIMEOUT = 1
+"""Seconds without a package after which the RTDE session is considered lost and opened again"""
 
 type ListenerFunction = Callable[[DataObject], Coroutine[None, None, None]]
 listeners: list[ListenerFunction] = []
 
+type BlockListenerFunction = Callable[[RtdeSampleBlock], None]
+block_listeners: list[BlockListenerFunction] = []
+
 recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class RtdeReaderStatistics:
+    """
+    Counters describing how well the event loop keeps up with the RTDE stream.
+
+    samples_received is counted by the reader thread for every package read from the controller.
+    samples_dropped counts the samples that were replaced by a newer sample before the event loop picked them up.
+    The consumer lag is the time between a sample arriving in the reader thread and the event loop consuming it.
+    Blocks always carry every sample, blocks_dropped only grows if the event loop falls MAX_PENDING_BLOCKS behind.
+    """
+
+    def __init__(self):
+        self.samples_received: int = 0
+        self.samples_dropped: int = 0
+        self.samples_consumed: int = 0
+        self.last_consumer_lag: float = 0.0
+        self.max_consumer_lag: float = 0.0
+        self.blocks_published: int = 0
+        self.blocks_dropped: int = 0
+
+    def dump(self):
+        """Dumps the counters to a dictionary that can be converted to JSON."""
+        return {
+            "samples_received": self.samples_received,
+            "samples_dropped": self.samples_dropped,
+            "samples_consumed": self.samples_consumed,
+            "last_consumer_lag": self.last_consumer_lag,
+            "max_consumer_lag": self.max_consumer_lag,
+            "blocks_published": self.blocks_published,
+            "blocks_dropped": self.blocks_dropped
+        }
+
+
+class RtdeSessionError(ConnectionError):
+    """Raised when the controller refused the output recipe or the start of the synchronization."""
+
+
+class RtdeReader(threading.Thread):
+    """
+    Reads the RTDE stream on its own thread, so the blocking socket reads never stall the event loop.
+
+    The rtde library only sets up the session. The thread then reads the socket itself, blocking in select until data
+    arrives or a partial block is due, and splits it into packages without unpacking them, see RtdeStreamFramer.
+    It drains every package the controller sends. Only the newest sample is kept for the event loop,
+    which picks it up with next_sample. Samples that are overwritten before the loop gets to them are counted
+    as dropped in the statistics.
+
+    Besides the newest sample, every package is collected into sample blocks, which are handed to the block
+    listeners on the event loop. That way no sample is lost, while the per-sample work stays in this thread.
+
+    The thread supervises the RTDE session. A session that fails, is closed by the controller or stops sending for
+    STREAM_TIMEOUT seconds is replaced by a new one, opened with exponential backoff. Every new session sets up the
+    output recipe and starts the synchronization again. The clients are told when the stream is lost and when it
+    resumes, with the time range of the gap. While the robot is down only the first failed attempt is logged above
+    debug level.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, frequency: float = RTDE_FREQUENCY):
+        super().__init__(name="RtdeReader", daemon=True)
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._latest: tuple[bytes, float] | None = None
+        self._sample_available = asyncio.Event()
+        self._pending_blocks: deque[RtdeSampleBlock] = deque()
+        self._block_builder = RtdeBlockBuilder(recipe_layout, RTDE_BLOCK_SIZE, RTDE_BLOCK_MAX_AGE)
+        self.statistics = RtdeReaderStatistics()
+        self.connection_statistics = ConnectionStatistics()
+        connection_pool.add_statistics(ROBOT_IP, RTDE_PORT, self.connection_statistics)
+        self._last_package_time: float | None = None
+        """Wall clock time of the newest package, the start of the gap if the session is lost"""
+        self._lost_at: float | None = None
+        self._backoff = Backoff()
+
+        if not 0 < frequency <= MAX_RTDE_FREQUENCY:
+            non_recurring_logger.warning(f"RTDE frequency {frequency} Hz is out of range, using {MAX_RTDE_FREQUENCY} Hz")
+            frequency = MAX_RTDE_FREQUENCY
+        self.frequency: float = frequency
+
+    def run(self):
+        while True:
+            self.connection_statistics.state = ConnectionState.connecting
+            try:
+                con = self._open_session()
+            except Exception as e:
+                self.connection_statistics.record_failed_attempt(e)
+                self.connection_statistics.state = ConnectionState.backing_off
+                first_failure = self._backoff.failures == 0
+                delay = self._backoff.next_delay()
+                message = f"Opening the RTDE session failed ({e}) - retrying in {delay:.2f} seconds"
+                if first_failure:
+                    non_recurring_logger.warning(message)
+                else:
+                    recurring_logger.debug(message)
+                time.sleep(delay)
+                continue
+
+            self.connection_statistics.record_connected()
+            if self._lost_at is None:
+                non_recurring_logger.info(f"RTDE session started at {self.frequency} Hz")
+            else:
+                recurring_logger.debug(f"RTDE session started again at {self.frequency} Hz")
+            reason = self._read_session(con)
+            con.disconnect()
+            self._lose_stream(reason)
+
+    def _open_session(self) -> rtde.RTDE:
+        con = rtde.RTDE(ROBOT_IP, RTDE_PORT)
+        try:
+            con.connect()
+            # get controller version
+            con.get_controller_version()
+            # setup recipes
+            if not con.send_output_setup(state_names, state_types, frequency=self.frequency):
+                raise RtdeSessionError("Unable to configure the RTDE output recipe")
+            # start data synchronization
+            if not con.send_start():
+                raise RtdeSessionError("Unable to start synchronization")
+        except Exception:
+            con.disconnect()
+            raise
+        return con
+
+    def _read_session(self, con: rtde.RTDE) -> str:
+        """Reads packages until the session is lost. Returns the reason it was lost."""
+        sock, buffered = _take_over_socket(con)
+        framer = RtdeStreamFramer()
+        framer.feed(buffered)
+        last_package_at = time.monotonic()
+        delivered = False
+        while True:
+            try:
+                packages = framer.split()
+            except ValueError as e:
+                return f"Reading RTDE data failed: {e}"
+
+            if packages:
+                last_package_at = time.monotonic()
+                if not delivered:
+                    # Only a session that delivers data ends the backoff, one that is dropped right away does not
+                    self._backoff.reset()
+                    delivered = True
+                if self._lost_at is not None:
+                    self._resume_stream()
+                self._publish(packages)
+
+            stream_timeout = last_package_at + STREAM_TIMEOUT - time.monotonic()
+            if stream_timeout <= 0:
+                return f"No RTDE data received for {STREAM_TIMEOUT} s"
+            block_due = self._block_builder.time_until_due(time.time())
+            timeout = stream_timeout if block_due is None else min(stream_timeout, block_due)
+
+            try:
+                readable, _, _ = select.select([sock], [], [], timeout)
+                if not readable:
+                    if self._block_builder.is_due(time.time()):
+                        self._publish_block(self._block_builder.flush())
+                    continue
+                if framer.receive(sock) == 0:
+                    return "The controller closed the RTDE connection"
+            except OSError as e:
+                return f"Receiving RTDE data failed: {e}"
+
+    def _lose_stream(self, reason: str):
+        """Called from the reader thread when a session is lost. Hands out the samples so far and tells the clients."""
+        block = self._block_builder.flush()
+        if block is not None:
+            self._publish_block(block)
+
+        self.connection_statistics.broken += 1
+        self.connection_statistics.record_disconnected(reason)
+        if self._lost_at is None:
+            non_recurring_logger.warning(f"RTDE stream lost: {reason}")
+            self._lost_at = self._last_package_time if self._last_package_time is not None else time.time()
+            websocket_notifier.notify_observers(RtdeConnectionMessage(False, reason, self._lost_at * 1000))
+        else:
+            recurring_logger.debug(f"RTDE session lost again before it delivered data: {reason}")
+
+    def _resume_stream(self):
+        resumed_at = time.time()
+        gap = resumed_at - self._lost_at
+        non_recurring_logger.info(f"RTDE stream resumed after a gap of {gap:.3f} s")
+        websocket_notifier.notify_observers(RtdeConnectionMessage(True, f"RTDE stream resumed after {gap:.1f} s",
+                                                                  self._lost_at * 1000, resumed_at * 1000))
+        self._lost_at = None
+
+    def _publish(self, packages: list[memoryview]):
+        """
+        Called from the reader thread with the packages of one read. Stages them into the block builder, and
+        replaces the pending sample with the newest one and wakes the event loop if it is idle.
+        """
+        now = time.time()
+        self._last_package_time = now
+        for package in packages:
+            # Threads waiting for the robot are woken from here, without waiting for the event loop
+            robot_status.update(*read_robot_status(package))
+
+            block = self._block_builder.append(package, now)
+            if block is not None:
+                self._publish_block(block)
+        if self._block_builder.is_due(now):
+            self._publish_block(self._block_builder.flush())
+
+        # Only the newest package is copied, the views into the framer's buffer are reused by the next read
+        newest = bytes(packages[-1])
+        received_at = time.monotonic()
+        with self._lock:
+            self.statistics.samples_received += len(packages)
+            loop_is_waiting = self._latest is None
+            self.statistics.samples_dropped += len(packages) - (1 if loop_is_waiting else 0)
+            self._latest = (newest, received_at)
+
+        if loop_is_waiting:
+            self._loop.call_soon_threadsafe(self._sample_available.set)
+
+    def _publish_block(self, block: RtdeSampleBlock):
+        """Called from the reader thread. Queues a finished block and schedules its delivery on the event loop."""
+        with self._lock:
+            self.statistics.blocks_published += 1
+            if len(self._pending_blocks) >= MAX_PENDING_BLOCKS:
+                self._pending_blocks.popleft()
+                self.statistics.blocks_dropped += 1
+            loop_is_waiting = not self._pending_blocks
+            self._pending_blocks.append(block)
+
+        if loop_is_waiting:
+            self._loop.call_soon_threadsafe(self._deliver_blocks)
+
+    def _deliver_blocks(self):
+        """Runs on the event loop and hands every pending block to the block listeners."""
+        with self._lock:
+            blocks = list(self._pending_blocks)
+            self._pending_blocks.clear()
+
+        for block in blocks:
+            call_block_listeners(block)
+
+    async def next_sample(self) -> DataObject:
+        """Waits for and returns the newest sample that has not been consumed yet."""
+        while True:
+            await self._sample_available.wait()
+            self._sample_available.clear()
+            with self._lock:
+                latest = self._latest
+                self._latest = None
+            if latest is not None:
+                break
+
+        package, received_at = latest
+        lag = time.monotonic() - received_at
+        self.statistics.samples_consumed += 1
+        self.statistics.last_consumer_lag = lag
+        self.statistics.max_consumer_lag = max(self.statistics.max_consumer_lag, lag)
+        return recipe_layout.to_data_object(package)
+
+
+def _take_over_socket(con: rtde.RTDE) -> tuple[Socket, bytes]:
+    """
+    Returns the socket of a started session and the bytes the rtde library has already read from it.
+    The library offers no access to either, so its private attributes are used. Reading the socket through the library
+    would unpack every package into a DataObject, even when binary packages are asked for.
+    """
+    return con._RTDE__sock, bytes(con._RTDE__buf)
+
+
+_rtde_reader: RtdeReader | None = None
+
+
+def get_rtde_statistics() -> RtdeReaderStatistics | None:
+    """Returns the counters of the running RTDE reader, or None if the RTDE loop has not been started."""
+    if _rtde_reader is None:
+        return None
+    return _rtde_reader.statistics
 
 
 async def start_rtde_loop():
-    con = rtde.RTDE(ROBOT_IP, RTDE_PORT)
-    con.connect()
-    # get controller version
-    con.get_controller_version()
-    # setup recipes
-    con.send_output_setup(state_names, state_types)
-    # start data synchronization
-    if not con.send_start():
-        recurring_logger.error("Unable to start synchronization")
-        sys.exit()
-
-    register_listener(send_state_through_websocket)
+    """
+    Starts the RTDE reader and sends new states to the listeners. When the loop is started again after it failed,
+    the running reader and the registered listeners are kept.
+    """
+    global _rtde_reader
+    if _rtde_reader is None:
+        _rtde_reader = RtdeReader(asyncio.get_running_loop())
+        _rtde_reader.start()
+
+        register_listener(send_state_through_websocket)
+
+        register_block_listener(rtde_clock.observe)
+
+        rtde_history.configure(recipe_layout, int(RTDE_HISTORY_SECONDS * _rtde_reader.frequency))
+        register_block_listener(rtde_history.append_block)
+
+        rtde_subscriptions.configure(recipe_layout)
+        register_block_listener(rtde_subscriptions.on_block)
 
     previous_state = None
 
     while True:
+        new_state = await _rtde_reader.next_sample()
         try:
-            new_state = con.receive()
             if has_new_client():
                 await call_listeners(new_state)
             if state_is_new(new_state, previous_state):
@@ -72,16 +373,16 @@ async def start_rtde_loop():
                 previous_state = new_state
         except Exception as e:
             recurring_logger.error(f"Error in recieve_rtde_data: {e}")
-        await asyncio.sleep(SLEEP_TIME)
 
 
 def states_are_equal(obj1: DataObject, obj2: DataObject):
-    return obj1.__dict__ == obj2.__dict__
+    """Compares the fields that are sent to the frontend, the kinematic fields change with every sample."""
+    return all(obj1.__dict__[option.value] == obj2.__dict__[option.value] for option in TransmittedInformationOptions)
 
 
 async def send_state_through_websocket(state: DataObject) -> None:
     robot_state = RtdeState(state)
-    websocket_notifier.notify_observers(str(robot_state))
+    websocket_notifier.notify_observers(robot_state)
 
 
 def state_is_new(new_state: DataObject | None, old_state: DataObject | None):
@@ -103,3 +404,16 @@ async def call_listeners(with_state: DataObject):
     for listener in listeners:
         await listener(with_state)
     recurring_logger.debug(f"All listeners called with state: {with_state}")
+
+
+def register_block_listener(listener: BlockListenerFunction):
+    """Registers a function that is called on the event loop with every finished block of RTDE samples."""
+    block_listeners.append(listener)
+
+
+def call_block_listeners(block: RtdeSampleBlock):
+    for listener in block_listeners:
+        try:
+            listener(block)
+        except Exception as e:
+            recurring_logger.error(f"Error in RTDE block listener {listener}: {e}")
@@ -0,0 +1,176 @@
+import numpy as np
+
+from RtdeSampleBlock import RtdeRecipeLayout, RtdeSampleBlock, TIME_FIELD, rtde_clock
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class RtdeRingBuffer:
+    """
+    Fixed-memory ring buffer holding the newest samples of one RTDE field together with their timestamps.
+
+    The timestamps must be monotonic, which allows lookups by time with a binary search on the time column.
+    """
+
+    def __init__(self, capacity: int, width: int):
+        if capacity < 1:
+            raise ValueError(f"Capacity must be at least 1, got {capacity}")
+        self.capacity: int = capacity
+        self.width: int = width
+        self.times: np.ndarray = np.empty(capacity, dtype=np.float64)
+        self.values: np.ndarray = np.empty((capacity, width), dtype=np.float64)
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    @property
+    def newest_time(self) -> float | None:
+        if self._count == 0:
+            return None
+        return float(self.times[(self._start + self._count - 1) % self.capacity])
+
+    def append(self, times: np.ndarray, values: np.ndarray):
+        """Appends the rows in order. When the buffer is full the oldest rows are overwritten."""
+        n = len(times)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            self.times[:] = times[n - self.capacity:]
+            self.values[:] = values[n - self.capacity:]
+            self._start = 0
+            self._count = self.capacity
+            return
+
+        end = (self._start + self._count) % self.capacity
+        first = min(n, self.capacity - end)
+        self.times[end:end + first] = times[:first]
+        self.values[end:end + first] = values[:first]
+        if first < n:
+            self.times[:n - first] = times[first:]
+            self.values[:n - first] = values[first:]
+
+        overflow = max(0, self._count + n - self.capacity)
+        self._count = min(self._count + n, self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+
+    def range(self, start_time: float, end_time: float) -> tuple[np.ndarray, np.ndarray]:
+        """Returns copies of the timestamps and values of all rows with start_time <= time <= end_time."""
+        low = self._search(start_time, "left")
+        high = self._search(end_time, "right")
+        if high <= low:
+            return np.empty(0, dtype=np.float64), np.empty((0, self.width), dtype=np.float64)
+        return self._take(low, high)
+
+    def _segments(self) -> tuple[slice, slice]:
+        """The buffer in logical order consists of the physical slices first followed by second."""
+        first_length = min(self._count, self.capacity - self._start)
+        return slice(self._start, self._start + first_length), slice(0, self._count - first_length)
+
+    def _search(self, time: float, side: str) -> int:
+        """Binary search for the logical index of the given time in the two sorted segments."""
+        first, second = self._segments()
+        first_times = self.times[first]
+        if len(first_times) == 0:
+            return 0
+        if time <= first_times[-1] or second.stop == 0:
+            return int(np.searchsorted(first_times, time, side=side))
+        return len(first_times) + int(np.searchsorted(self.times[second], time, side=side))
+
+    def _take(self, low: int, high: int) -> tuple[np.ndarray, np.ndarray]:
+        indices = (self._start + np.arange(low, high)) % self.capacity
+        return self.times[indices], self.values[indices]
+
+
+class RtdeHistory:
+    """
+    Keeps the last few minutes of every RTDE field at the full stream rate, one ring buffer per field.
+
+    The ring buffers are indexed by the controller timestamp. Queries use the proxy's wall clock in milliseconds,
+    the same time base as the timestamps of Report_state messages, and are translated with the RTDE clock.
+    """
+
+    def __init__(self):
+        self._layout: RtdeRecipeLayout | None = None
+        self._buffers: dict[str, RtdeRingBuffer] = dict()
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._buffers.keys())
+
+    def configure(self, layout: RtdeRecipeLayout, capacity: int):
+        """Allocates a ring buffer with room for capacity samples for every field of the recipe."""
+        if TIME_FIELD not in layout.columns:
+            raise ValueError(f"The RTDE recipe must contain the '{TIME_FIELD}' field to keep a history")
+
+        self._layout = layout
+        self._buffers = {
+            name: RtdeRingBuffer(capacity, columns.stop - columns.start)
+            for name, columns in layout.columns.items()
+            if name != TIME_FIELD
+        }
+        non_recurring_logger.info(f"RTDE history keeps {capacity} samples of {len(self._buffers)} fields")
+
+    def append_block(self, block: RtdeSampleBlock):
+        """Block listener that copies a block of samples into the ring buffers."""
+        if block.count == 0 or not self._buffers:
+            return
+
+        times = block.field(TIME_FIELD)[:, 0]
+        newest_time = next(iter(self._buffers.values())).newest_time
+        if newest_time is not None and times[0] < newest_time:
+            non_recurring_logger.warning("RTDE timestamps went backwards, the controller restarted. Clearing history")
+            self.clear()
+
+        for name, buffer in self._buffers.items():
+            buffer.append(times, block.field(name))
+
+    def clear(self):
+        for buffer in self._buffers.values():
+            buffer.clear()
+
+    def query(self, fields: list[str], start: float, end: float, max_samples: int | None = None) -> dict:
+        """
+        Returns the samples of the given fields between start and end.
+
+            Args:
+                fields: The RTDE fields to return.
+                start: Wall clock time in ms of the first sample.
+                end: Wall clock time in ms of the last sample.
+                max_samples: If given, the samples are thinned out evenly to at most this many.
+
+            Returns:
+                A dictionary with the timestamps in ms and the values of every field as numpy arrays.
+        """
+        unknown_fields = [field for field in fields if field not in self._buffers]
+        if unknown_fields:
+            raise ValueError(f"Unknown RTDE fields: {unknown_fields}. Known fields: {self.fields}")
+        if end < start:
+            raise ValueError(f"End of range ({end}) is before the start ({start})")
+
+        out = {"timestamps": [], "fields": {field: [] for field in fields}}
+        if not rtde_clock.is_synchronized:
+            return out
+
+        start_time = rtde_clock.to_controller_time(start)
+        end_time = rtde_clock.to_controller_time(end)
+        for field in fields:
+            times, values = self._buffers[field].range(start_time, end_time)
+            if max_samples is not None and len(times) > max_samples > 0:
+                step = int(np.ceil(len(times) / max_samples))
+                times, values = times[::step], values[::step]
+            if values.shape[1] == 1:
+                values = values[:, 0]
+            out["timestamps"] = rtde_clock.to_milliseconds(times)
+            out["fields"][field] = values
+        return out
+
+
+rtde_history = RtdeHistory()
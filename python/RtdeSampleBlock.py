@@ -0,0 +1,308 @@
+import struct
+from socket import socket as Socket
+from typing import Callable, Final
+
+import numpy as np
+from rtde.serialize import DataObject
+
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+TIME_FIELD = "timestamp"
+"""The RTDE field holding the controller time in seconds. It only ever increases while the controller runs"""
+
+RTDE_HEADER: Final = struct.Struct(">HB")
+"""Every RTDE package starts with its total size, header included, and its command byte"""
+RTDE_DATA_PACKAGE: Final = 85
+"""The command byte of a data package, ascii U. Its payload is the recipe id followed by the packed fields"""
+RTDE_TEXT_MESSAGE: Final = 77
+"""The command byte of a text message from the controller, ascii M"""
+
+_RTDE_TYPES: dict[str, tuple[str, str, int]] = {
+    # RTDE type: (struct format, numpy type, number of values)
+    "BOOL": ("?", "?", 1),
+    "UINT8": ("B", "u1", 1),
+    "UINT32": ("I", ">u4", 1),
+    "UINT64": ("Q", ">u8", 1),
+    "INT32": ("i", ">i4", 1),
+    "DOUBLE": ("d", ">f8", 1),
+    "VECTOR3D": ("d", ">f8", 3),
+    "VECTOR6D": ("d", ">f8", 6),
+    "VECTOR6INT32": ("i", ">i4", 6),
+    "VECTOR6UINT32": ("I", ">u4", 6),
+}
+
+
+class RtdeRecipeLayout:
+    """
+    Describes how the fields of an RTDE output recipe are laid out.
+
+    A package from the controller is a packed big-endian record of the recipe fields.
+    In a sample block every scalar value gets its own float64 column, so a VECTOR6D field spans six columns.
+    """
+
+    def __init__(self, names: list[str], types: list[str]):
+        if len(names) != len(types):
+            raise ValueError(f"Recipe has {len(names)} names but {len(types)} types")
+
+        self.names: list[str] = list(names)
+        self.types: list[str] = list(types)
+        self.columns: dict[str, slice] = dict()
+
+        struct_format = ">"
+        dtype_fields = []
+        column = 0
+        for name, rtde_type in zip(self.names, self.types):
+            if rtde_type not in _RTDE_TYPES:
+                raise ValueError(f"Unsupported RTDE type '{rtde_type}' for field '{name}'")
+            format_char, numpy_type, width = _RTDE_TYPES[rtde_type]
+            struct_format += format_char * width
+            dtype_fields.append((name, numpy_type, (width,)))
+            self.columns[name] = slice(column, column + width)
+            column += width
+
+        self.column_count: int = column
+        self.package_dtype = np.dtype(dtype_fields)
+        self.package_size: int = self.package_dtype.itemsize
+        self._package_struct = struct.Struct(struct_format)
+
+    def column(self, name: str) -> slice:
+        """Returns the columns that hold the given field in a sample block."""
+        if name not in self.columns:
+            raise ValueError(f"Field '{name}' is not part of the RTDE recipe")
+        return self.columns[name]
+
+    def field_reader(self, names: list[str]) -> Callable[[bytes], tuple]:
+        """
+        Returns a function that unpacks only the given scalar fields of a single binary package.
+        The values are returned in the order of the names. The other fields are skipped without being unpacked.
+        """
+        struct_format = ">"
+        position = 0
+        for name in sorted(names, key=lambda field: self.package_dtype.fields[field][1]):
+            format_char, _, width = _RTDE_TYPES[self.types[self.names.index(name)]]
+            if width != 1:
+                raise ValueError(f"Field '{name}' is not a scalar field")
+            offset = self.package_dtype.fields[name][1]
+            struct_format += f"{offset - position}x{format_char}"
+            position = offset + struct.calcsize(">" + format_char)
+
+        unpack = struct.Struct(struct_format).unpack_from
+        order = sorted(range(len(names)), key=lambda index: self.package_dtype.fields[names[index]][1])
+        positions = [order.index(index) for index in range(len(names))]
+        return lambda package: tuple(unpack(package)[position] for position in positions)
+
+    def to_data_object(self, package: bytes) -> DataObject:
+        """Unpacks a single binary package into the DataObject the rtde library would have produced."""
+        values = self._package_struct.unpack(package)
+        return DataObject.unpack((None,) + values, self.names, self.types)
+
+
+class RtdeSampleBlock:
+    """
+    A preallocated block of consecutive RTDE samples. Each row is a sample and the columns follow the recipe layout.
+
+    Only the first `count` rows are valid. received_at is the wall clock time in seconds at which the newest sample
+    of the block arrived at the proxy.
+    """
+
+    def __init__(self, layout: RtdeRecipeLayout, capacity: int):
+        self.layout: RtdeRecipeLayout = layout
+        self.capacity: int = capacity
+        self.values: np.ndarray = np.empty((capacity, layout.column_count), dtype=np.float64)
+        self.count: int = 0
+        self.received_at: float = 0.0
+
+    @property
+    def samples(self) -> np.ndarray:
+        """The valid rows of the block."""
+        return self.values[:self.count]
+
+    def field(self, name: str) -> np.ndarray:
+        """Returns the valid rows of the columns belonging to the given field."""
+        return self.values[:self.count, self.layout.column(name)]
+
+    def __len__(self):
+        return self.count
+
+    def __str__(self):
+        return f"RtdeSampleBlock with {self.count} samples of {self.layout.column_count} values"
+
+
+class RtdeBlockBuilder:
+    """
+    Collects binary RTDE packages into a block.
+
+    Packages are copied into preallocated staging memory as they arrive. Once the block is full, or the oldest sample
+    has waited for max_age seconds, the staged packages are converted to a sample block with one numpy operation per
+    field instead of one Python object per sample.
+    """
+
+    def __init__(self, layout: RtdeRecipeLayout, block_size: int, max_age: float):
+        if block_size < 1:
+            raise ValueError(f"Block size must be at least 1, got {block_size}")
+        self.layout: RtdeRecipeLayout = layout
+        self.block_size: int = block_size
+        self.max_age: float = max_age
+
+        self._staging = bytearray(layout.package_size * block_size)
+        self._staging_view = memoryview(self._staging)
+        self._packages = np.frombuffer(self._staging, dtype=layout.package_dtype)
+        self._count = 0
+        self._first_received_at = 0.0
+        self._last_received_at = 0.0
+
+    def append(self, package: bytes, received_at: float) -> RtdeSampleBlock | None:
+        """Stages a package. Returns a finished block when the block is full, otherwise None."""
+        size = self.layout.package_size
+        if len(package) != size:
+            raise ValueError(f"RTDE package has {len(package)} bytes, the recipe expects {size}")
+
+        offset = self._count * size
+        self._staging_view[offset:offset + size] = package
+        if self._count == 0:
+            self._first_received_at = received_at
+        self._last_received_at = received_at
+        self._count += 1
+
+        if self._count == self.block_size:
+            return self.flush()
+        return None
+
+    def is_due(self, now: float) -> bool:
+        """Checks if the staged samples have waited long enough that they should be flushed as a partial block."""
+        return self._count > 0 and now - self._first_received_at >= self.max_age
+
+    def time_until_due(self, now: float) -> float | None:
+        """Seconds until the staged samples are due, or None if nothing is staged."""
+        if self._count == 0:
+            return None
+        return max(0.0, self._first_received_at + self.max_age - now)
+
+    def flush(self) -> RtdeSampleBlock | None:
+        """Converts the staged packages to a sample block. Returns None if nothing is staged."""
+        count = self._count
+        if count == 0:
+            return None
+
+        block = RtdeSampleBlock(self.layout, self.block_size)
+        packages = self._packages[:count]
+        for name, columns in self.layout.columns.items():
+            block.values[:count, columns] = packages[name].reshape(count, -1)
+        block.count = count
+        block.received_at = self._last_received_at
+
+        self._count = 0
+        return block
+
+
+class RtdeClock:
+    """
+    Translates between the controller timestamps of RTDE samples and the proxy's wall clock.
+
+    The frontend works with ms since the epoch, the same time base as the timestamps of Report_state messages.
+    The offset between the clocks is the smallest observed difference between the time a block arrived at the proxy
+    and the controller timestamp of its newest sample, since that sample was delayed the least on its way here.
+    """
+
+    def __init__(self):
+        self._offset: float | None = None
+        self._newest_time: float | None = None
+
+    @property
+    def is_synchronized(self) -> bool:
+        return self._offset is not None
+
+    def observe(self, block: RtdeSampleBlock):
+        """Block listener that updates the clock offset."""
+        if block.count == 0:
+            return
+        times = block.field(TIME_FIELD)[:, 0]
+        if self._newest_time is not None and times[0] < self._newest_time:
+            non_recurring_logger.warning("RTDE timestamps went backwards, the controller restarted")
+            self._offset = None
+
+        offset = block.received_at - float(times[-1])
+        if self._offset is None or offset < self._offset:
+            self._offset = offset
+        self._newest_time = float(times[-1])
+
+    def to_milliseconds(self, times: np.ndarray) -> np.ndarray:
+        """Converts controller timestamps to wall clock ms since the epoch."""
+        return (times + self._offset) * 1000
+
+    def to_controller_time(self, milliseconds: float) -> float:
+        """Converts wall clock ms since the epoch to a controller timestamp."""
+        return milliseconds / 1000 - self._offset
+
+
+rtde_clock = RtdeClock()
+
+
+class RtdeStreamFramer:
+    """
+    Splits the byte stream of a started RTDE session into data packages, reading the socket directly.
+
+    The socket is read into a fixed buffer with recv_into. The payloads of the complete data packages are handed out
+    as views into that buffer, without the recipe id, so they can be copied straight into the staging memory of a
+    block builder. No bytes object or DataObject is created per sample. The views are only valid until the next call
+    to receive or feed, which moves the incomplete package that is left to the front of the buffer.
+    """
+
+    def __init__(self, capacity: int = 1 << 17):
+        # A package states its size in 16 bits, so the buffer always has room for at least one complete package
+        if capacity <= 0xFFFF:
+            raise ValueError(f"The buffer must hold more than {0xFFFF} bytes, got {capacity}")
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        """Index of the first byte that has not been split off as a package"""
+        self._end = 0
+        """Index behind the last byte that was received"""
+        self.skipped_packages: int = 0
+
+    @property
+    def pending(self) -> int:
+        """The number of buffered bytes that are not part of a complete package yet."""
+        return self._end - self._start
+
+    def feed(self, data: bytes):
+        """Appends bytes that were read from the session before, e.g. by the rtde library during the setup."""
+        self._compact()
+        self._view[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def receive(self, sock: Socket) -> int:
+        """Reads what the socket has ready into the buffer. Returns the number of bytes read, 0 if it was closed."""
+        self._compact()
+        received = sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def split(self) -> list[memoryview]:
+        """Returns the payloads of the complete data packages in the buffer. Other packages are skipped."""
+        packages = []
+        while self._end - self._start >= RTDE_HEADER.size:
+            size, command = RTDE_HEADER.unpack_from(self._buffer, self._start)
+            if size < RTDE_HEADER.size:
+                raise ValueError(f"RTDE package with an invalid size of {size} bytes")
+            if self._end - self._start < size:
+                break
+            if command == RTDE_DATA_PACKAGE:
+                # The first payload byte is the recipe id, there is only one recipe
+                packages.append(self._view[self._start + RTDE_HEADER.size + 1:self._start + size])
+            else:
+                self.skipped_packages += 1
+                recurring_logger.debug(f"Skipping RTDE package with command {command} and {size} bytes")
+            self._start += size
+        return packages
+
+    def _compact(self):
+        if self._start == 0:
+            return
+        remaining = self._end - self._start
+        self._buffer[:remaining] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = remaining
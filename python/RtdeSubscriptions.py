@@ -0,0 +1,167 @@
+import math
+from enum import Enum
+from typing import Callable, Hashable
+
+import numpy as np
+
+from RtdeSampleBlock import RtdeRecipeLayout, RtdeSampleBlock, TIME_FIELD, rtde_clock
+from SocketMessages import RtdeSamplesMessage
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class SubscriptionMode(Enum):
+    """
+    decimate: Every period the first sample is sent as it is.
+    average: Every period the mean of all samples in the period is sent. Meant for the continuous kinematic fields.
+    """
+    decimate = "decimate"
+    average = "average"
+
+
+class RtdeSubscription:
+    """
+    The RTDE fields a single web client wants, and the maximum rate it wants them with.
+
+    The samples of a block are grouped into periods of 1 / max_rate seconds of controller time.
+    At most one sample per period is sent to the client.
+    """
+
+    def __init__(self, layout: RtdeRecipeLayout, fields: list[str], max_rate: float,
+                 mode: SubscriptionMode = SubscriptionMode.decimate):
+        if not fields:
+            raise ValueError("A subscription needs at least one field")
+        unknown_fields = [field for field in fields if field not in layout.columns or field == TIME_FIELD]
+        if unknown_fields:
+            raise ValueError(f"Unknown RTDE fields: {unknown_fields}")
+        if not math.isfinite(max_rate) or max_rate <= 0:
+            raise ValueError(f"The maximum rate must be positive and finite, got {max_rate}")
+
+        self.fields: list[str] = fields
+        self.max_rate: float = max_rate
+        self.mode: SubscriptionMode = mode
+        self.period: float = 1 / max_rate
+
+        # The time column is placed first, so it is decimated and averaged together with the values
+        column_slices = [layout.column(TIME_FIELD)] + [layout.column(field) for field in fields]
+        self._columns = np.concatenate([np.arange(columns.start, columns.stop) for columns in column_slices])
+        self._field_slices: dict[str, slice] = dict()
+        offset = 1
+        for field, columns in zip(fields, column_slices[1:]):
+            width = columns.stop - columns.start
+            self._field_slices[field] = slice(offset, offset + width)
+            offset += width
+
+        self._last_period: int | None = None
+        self._partial_sum: np.ndarray | None = None
+        self._partial_count = 0
+
+    def consume(self, block: RtdeSampleBlock) -> RtdeSamplesMessage | None:
+        """Reduces a block to the samples that should be sent to the client. Returns None if nothing is due."""
+        if block.count == 0:
+            return None
+
+        rows = block.samples[:, self._columns]
+        periods = np.floor(rows[:, 0] / self.period).astype(np.int64)
+        if self._last_period is not None and periods[0] < self._last_period:
+            # The controller restarted and its clock with it
+            self._reset()
+
+        match self.mode:
+            case SubscriptionMode.decimate:
+                reduced = self._decimate(rows, periods)
+            case SubscriptionMode.average:
+                reduced = self._average(rows, periods)
+            case _:
+                raise ValueError(f"Unknown subscription mode: {self.mode}")
+
+        if len(reduced) == 0 or not rtde_clock.is_synchronized:
+            return None
+        return self._to_message(reduced)
+
+    def _reset(self):
+        self._last_period = None
+        self._partial_sum = None
+        self._partial_count = 0
+
+    def _decimate(self, rows: np.ndarray, periods: np.ndarray) -> np.ndarray:
+        if self._last_period is not None:
+            new_rows = periods > self._last_period
+            rows, periods = rows[new_rows], periods[new_rows]
+        if len(rows) == 0:
+            return rows
+        _, first_in_period = np.unique(periods, return_index=True)
+        self._last_period = int(periods[-1])
+        return rows[first_in_period]
+
+    def _average(self, rows: np.ndarray, periods: np.ndarray) -> np.ndarray:
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+        sums = np.add.reduceat(rows, starts, axis=0)
+        counts = np.diff(np.concatenate((starts, [len(rows)]))).astype(np.float64)
+
+        if self._partial_sum is not None and periods[0] == self._last_period:
+            sums[0] += self._partial_sum
+            counts[0] += self._partial_count
+        elif self._partial_sum is not None:
+            # The first period of this block is a new one, so the carried period is complete
+            sums = np.vstack((self._partial_sum, sums))
+            counts = np.concatenate(([self._partial_count], counts))
+
+        # The last period may continue in the next block, so it is carried over instead of sent
+        self._partial_sum = sums[-1]
+        self._partial_count = counts[-1]
+        self._last_period = int(periods[-1])
+        return sums[:-1] / counts[:-1, np.newaxis]
+
+    def _to_message(self, rows: np.ndarray) -> RtdeSamplesMessage:
+        fields = dict()
+        for field, columns in self._field_slices.items():
+            values = rows[:, columns]
+            if values.shape[1] == 1:
+                values = values[:, 0]
+            fields[field] = values
+        timestamps = rtde_clock.to_milliseconds(rows[:, 0])
+        return RtdeSamplesMessage(timestamps, fields)
+
+
+type SendFunction = Callable[[RtdeSamplesMessage], None]
+
+
+class RtdeSubscriptionManager:
+    """
+    Keeps the RTDE subscription of every web client and sends each client its decimated samples.
+
+    Clients are identified by any hashable key, the websocket proxy uses the websocket connection itself.
+    """
+
+    def __init__(self):
+        self._layout: RtdeRecipeLayout | None = None
+        self._subscriptions: dict[Hashable, tuple[RtdeSubscription, SendFunction]] = dict()
+
+    def configure(self, layout: RtdeRecipeLayout):
+        self._layout = layout
+
+    def subscribe(self, client: Hashable, fields: list[str], max_rate: float, mode: SubscriptionMode,
+                  send: SendFunction):
+        """Replaces any earlier subscription of the client. Raises a ValueError if the subscription is invalid."""
+        if self._layout is None:
+            raise ValueError("The RTDE stream is not running")
+        subscription = RtdeSubscription(self._layout, fields, max_rate, mode)
+        self._subscriptions[client] = (subscription, send)
+        non_recurring_logger.debug(f"Client subscribed to {subscription.fields} at {subscription.max_rate} Hz")
+
+    def unsubscribe(self, client: Hashable):
+        if self._subscriptions.pop(client, None) is not None:
+            non_recurring_logger.debug("Client unsubscribed from RTDE samples")
+
+    def on_block(self, block: RtdeSampleBlock):
+        """Block listener that sends every subscribed client the samples it is due."""
+        for client, (subscription, send) in list(self._subscriptions.items()):
+            message = subscription.consume(block)
+            if message is not None:
+                send(message)
+
+
+rtde_subscriptions = RtdeSubscriptionManager()
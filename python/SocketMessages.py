@@ -1,9 +1,12 @@
 import json
+import math
 from builtins import list
 from enum import Enum, auto
 
+import numpy as np
 from rtde.serialize import DataObject
 
+from BinaryWireFormat import BinaryWriter, BinaryTag
 from custom_logging import LogConfig
 from variables.VariableDefinition import CodeVariableDefinition
 
@@ -19,6 +22,13 @@ class MessageType(Enum):
     Robot_state = auto()
     Debug = auto()
     StopCommand = auto()
+    Rtde_history_request = auto()
+    Rtde_history = auto()
+    Rtde_subscription = auto()
+    Rtde_samples = auto()
+    Proxy_state = auto()
+    Rtde_connection = auto()
+    Protective_stop_recovery = auto()
 
 
 class Status(Enum):
@@ -167,15 +177,7 @@ class InspectionPointMessage:
         for globalVariable in globalVariables:
             parsed = InspectionVariable(globalVariable["name"], globalVariable["readCommand"], globalVariable=True)
             self.globalVariables.append(parsed)
-
-        #     Check that the commands in the inspection points match the line numbers received.
-        for point in self.inspectionPoints:
-            line_number = point.lineNumber
-            supposed_command = point.command
-            if line_number > len(script_text):
-                raise ValueError(f"Line number {line_number} is greater than the length of the script text.")
-            if supposed_command != script_text[line_number]:
-                raise ValueError(f"Command '{supposed_command}' does not match the script text ({script_text[line_number]}) at line {line_number}.")
+        # The inspection points are validated against the script text while they are injected, see InspectionInjector
 
     def __str__(self):
         return json.dumps({
@@ -206,6 +208,11 @@ class AckResponse:
             }
         })
 
+    def __bytes__(self):
+        status = 0 if self.data.status == Status.Ok else 1
+        return (BinaryWriter(BinaryTag.Ack_response).i64(self.data.id).u8(status)
+                .string(self.data.command).string(self.data.message).build())
+
 class FeedbackData:
     def __init__(self, id: int, message: str):
         self.id = id
@@ -302,6 +309,227 @@ class RtdeState:
             "data": self.data.dump()
         })
 
+    def __bytes__(self):
+        return (BinaryWriter(BinaryTag.Robot_state).i8(self.data.safety_status.value)
+                .i8(self.data.runtime_state.value).i8(self.data.robot_mode.value).build())
+
+
+class RtdeHistoryRequestData:
+    def __init__(self, id: int, fields: list[str], start: float, end: float, max_samples: int | None = None):
+        self.id = id
+        self.fields = fields
+        self.start = start
+        self.end = end
+        self.max_samples = max_samples
+
+
+class RtdeHistoryRequestMessage:
+    """
+    Asks for the RTDE samples of the given fields between start and end, in ms since the epoch.
+    max_samples is a positive integer, or None for all samples in the range.
+    """
+
+    def __init__(self, id: int, fields: list[str], start: float, end: float, max_samples: int | None = None):
+        self.type = MessageType.Rtde_history_request
+        if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+            raise ValueError(f"Fields is not a list of strings: {fields}")
+        if not all(math.isfinite(time) for time in (start, end)):
+            raise ValueError(f"Start and end must be finite: {start}, {end}")
+        if max_samples is not None and (isinstance(max_samples, bool) or not isinstance(max_samples, int)
+                                        or max_samples < 1):
+            raise ValueError(f"Max samples is not a positive integer: {max_samples}")
+        self.data: RtdeHistoryRequestData = RtdeHistoryRequestData(id, fields, start, end, max_samples)
+
+    def get_id(self):
+        return self.data.id
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "id": self.data.id,
+                "fields": self.data.fields,
+                "start": self.data.start,
+                "end": self.data.end,
+                "maxSamples": self.data.max_samples
+            }
+        })
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RtdeHistoryResponse:
+    """
+    The answer to a RtdeHistoryRequestMessage.
+    history is the dictionary returned by RtdeHistory.query with the timestamps and the values of every field.
+    """
+
+    def __init__(self, id: int, start: float, end: float, history: dict):
+        self.type = MessageType.Rtde_history
+        self.id = id
+        self.start = start
+        self.end = end
+        self.history = history
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "id": self.id,
+                "start": self.start,
+                "end": self.end,
+                "timestamps": _to_list(self.history["timestamps"]),
+                "fields": {name: _to_list(values) for name, values in self.history["fields"].items()}
+            }
+        })
+
+    def __bytes__(self):
+        return (BinaryWriter(BinaryTag.Rtde_history).i64(self.id).f64(self.start).f64(self.end)
+                .fields(self.history["timestamps"], self.history["fields"]).build())
+
+
+class RtdeSubscriptionData:
+    def __init__(self, id: int, fields: list[str], max_rate: float, mode: str):
+        self.id = id
+        self.fields = fields
+        self.max_rate = max_rate
+        self.mode = mode
+
+
+class RtdeSubscriptionMessage:
+    """
+    Subscribes the sending client to the given RTDE fields at a maximum rate in Hz.
+    mode is either "decimate" or "average". An empty list of fields ends the subscription.
+    """
+
+    def __init__(self, id: int, fields: list[str], max_rate: float, mode: str = "decimate"):
+        self.type = MessageType.Rtde_subscription
+        if isinstance(id, bool) or not isinstance(id, int):
+            raise ValueError(f"Id is not an integer: {id}")
+        if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+            raise ValueError(f"Fields is not a list of strings: {fields}")
+        if isinstance(max_rate, bool) or not isinstance(max_rate, int | float) or not math.isfinite(max_rate):
+            raise ValueError(f"Max rate is not a finite number: {max_rate}")
+        self.data: RtdeSubscriptionData = RtdeSubscriptionData(id, fields, max_rate, mode)
+
+    def get_id(self):
+        return self.data.id
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "id": self.data.id,
+                "fields": self.data.fields,
+                "maxRate": self.data.max_rate,
+                "mode": self.data.mode
+            }
+        })
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RtdeSamplesMessage:
+    """RTDE samples sent to a subscribed client. The timestamps are in ms since the epoch."""
+
+    def __init__(self, timestamps: np.ndarray, fields: dict[str, np.ndarray]):
+        self.type = MessageType.Rtde_samples
+        self.timestamps = timestamps
+        self.fields = fields
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "timestamps": _to_list(self.timestamps),
+                "fields": {name: _to_list(values) for name, values in self.fields.items()}
+            }
+        })
+
+    def __bytes__(self):
+        return BinaryWriter(BinaryTag.Rtde_samples).fields(self.timestamps, self.fields).build()
+
+
+class ProxyStateMessage:
+    """
+    Tells the clients whether the proxy is connected to the robot yet.
+    The state is one of starting, connecting, ready and failed, the message describes it for the user.
+    """
+
+    def __init__(self, state: str, message: str):
+        self.type = MessageType.Proxy_state
+        self.state = state
+        self.message = message
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "state": self.state,
+                "message": self.message
+            }
+        })
+
+
+class RtdeConnectionMessage:
+    """
+    Tells the clients that the RTDE stream was lost or resumed, so plots can show the gap instead of joining across it.
+    lost_at is the time of the last sample before the gap, resumed_at the time of the first sample after it, or None
+    while the stream is still lost. Both are in ms since the epoch, like the timestamps of Rtde_samples messages.
+    """
+
+    def __init__(self, connected: bool, message: str, lost_at: float, resumed_at: float | None = None):
+        self.type = MessageType.Rtde_connection
+        self.connected = connected
+        self.message = message
+        self.lost_at = lost_at
+        self.resumed_at = resumed_at
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "connected": self.connected,
+                "message": self.message,
+                "lostAt": self.lost_at,
+                "resumedAt": self.resumed_at
+            }
+        })
+
+
+class ProtectiveStopRecoveryMessage:
+    """
+    The progress of the automatic recovery from a protective stop, sent whenever its state changes.
+    The clients show it in the popup of the protective stop instead of opening a new one for every state.
+    attempt is the number of unlock attempts so far, status is Error if the recovery gave up.
+    """
+
+    def __init__(self, state: str, message: str, attempt: int, status: Status = Status.Ok):
+        self.type = MessageType.Protective_stop_recovery
+        self.state = state
+        self.message = message
+        self.attempt = attempt
+        self.status = status
+
+    def __str__(self):
+        return json.dumps({
+            "type": self.type.name,
+            "data": {
+                "state": self.state,
+                "message": self.message,
+                "attempt": self.attempt,
+                "status": self.status.name
+            }
+        })
+
+
+def _to_list(values: np.ndarray | list) -> list:
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return values
+
 
 def ensure_type_of_status(status: any) -> SafetyStatusTypes:
     if not isinstance(status, int):
@@ -327,7 +555,8 @@ def ensure_type_of_robot_mode(robot_mode: any) -> RobotModeTypes:
     return lookup_robot_mode_types[robot_mode]
 
 
-def parse_message(message: str) -> CommandMessage | InspectionPointMessage:
+def parse_message(message: str) -> CommandMessage | InspectionPointMessage | StopProgramMessage | \
+                                   RtdeHistoryRequestMessage | RtdeSubscriptionMessage:
     parsed = json.loads(message)
 
     match parsed:
@@ -356,5 +585,24 @@ def parse_message(message: str) -> CommandMessage | InspectionPointMessage:
             }
         }:
             return StopProgramMessage(id, message)
+        case {
+            'type': MessageType.Rtde_history_request.name,
+            'data': {
+                'id': int() as id,
+                'fields': fields,
+                'start': int() | float() as start,
+                'end': int() | float() as end
+            } as data
+        }:
+            return RtdeHistoryRequestMessage(id, fields, start, end, data.get('maxSamples'))
+        case {
+            'type': MessageType.Rtde_subscription.name,
+            'data': {
+                'id': int() as id,
+                'fields': fields,
+                'maxRate': int() | float() as max_rate
+            } as data
+        }:
+            return RtdeSubscriptionMessage(id, fields, max_rate, data.get('mode', "decimate"))
         case _:
             raise ValueError(f"Unknown message structure: {parsed}")
@@ -98,3 +98,62 @@ def __create_socket_send_string(string_to_send: str) -> str:
 
 def __create_quote_send() -> str:
     return f" socket_send_byte(34, {SOCKET_NAME}) "
+
+
+COMPACT_REPORT_MARKER = "#"
+"""The first byte of a compact report. JSON reports always start with '{'"""
+URSCRIPT_MAX_STRING_LENGTH = 1023
+"""The controller cuts longer strings, a compact report must not be longer than this"""
+_REPORT_VARIABLE = "inspection_point_report"
+_VALUE_VARIABLE = "inspection_point_value"
+
+
+def _compact_field(text: str) -> str:
+    return f"{len(text.encode())}{COMPACT_REPORT_MARKER}{text}"
+
+
+def _compact_variable_fields(name: str, type_name: str, global_variable: bool) -> str:
+    return _compact_field(name) + _compact_field(type_name) + _compact_field("1" if global_variable else "0")
+
+
+def URIFY_compact_report(report_id: int, variables: list[tuple[str, str, bool, str]]) -> str:
+    """
+    This function returns URScript that builds a compact report on the robot and sends it with a single
+    socket_send_string, instead of sending every fragment and quote of a JSON report on its own.\n
+    The report is not JSON, because URScript string literals cannot hold the quotes JSON needs. It is a list of
+    fields, each prefixed with its length in bytes, so the values may contain any character:\n
+    # followed by the id and by the name, type, global flag and value of every variable, each as <length>#<text>\n
+    Only the values are computed on the robot, everything else is part of the string literals of the script.
+    The controller limits strings to 1023 bytes, see estimate_compact_report_length.
+
+    :param report_id: The id of the inspection point
+    :param variables: The name, type name, global flag and URScript expression returning the value of every variable
+
+    :return: The URScript that sends the report to the proxy, on a single line
+    """
+    out = f" {_REPORT_VARIABLE} = \"{COMPACT_REPORT_MARKER}{_compact_field(str(report_id))}\""
+    for name, type_name, global_variable, expression in variables:
+        out += f" {_VALUE_VARIABLE} = to_str({expression})"
+        out += (f" {_REPORT_VARIABLE} = str_cat(str_cat(str_cat({_REPORT_VARIABLE},"
+                f" \"{_compact_variable_fields(name, type_name, global_variable)}\"), str_len({_VALUE_VARIABLE})),"
+                f" \"{COMPACT_REPORT_MARKER}\")")
+        out += f" {_REPORT_VARIABLE} = str_cat({_REPORT_VARIABLE}, {_VALUE_VARIABLE})"
+
+    out += f" socket_send_byte(2, {SOCKET_NAME})"  # Start byte
+    out += f" socket_send_string({_REPORT_VARIABLE}, {SOCKET_NAME})"
+    out += f" socket_send_byte(3, {SOCKET_NAME}) "  # End byte
+    return out
+
+
+def estimate_compact_report_length(report_id: int, variables: list[tuple[str, str, bool, str]],
+                                   value_length: int) -> int:
+    """
+    Returns the length in bytes the compact report built by URIFY_compact_report would have on the robot.
+
+    Everything but the values is known in advance. The values are assumed to be value_length bytes long.
+    """
+    length = len(COMPACT_REPORT_MARKER) + len(_compact_field(str(report_id)).encode())
+    for name, type_name, global_variable, _ in variables:
+        length += len(_compact_variable_fields(name, type_name, global_variable).encode())
+        length += len(_compact_field("x" * value_length))
+    return length
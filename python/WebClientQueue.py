@@ -0,0 +1,192 @@
+import asyncio
+from collections import deque
+from enum import Enum
+from typing import Callable
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import WebSocketServerProtocol
+
+from BinaryWireFormat import WireFormat, encode
+from SocketMessages import RtdeState, RtdeSamplesMessage, ProtectiveStopRecoveryMessage
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class DeliveryPolicy(Enum):
+    """
+    What happens to a message when the queue of a slow client fills up.
+
+    reliable: The message is never dropped. Used for Ack_response and everything else the user asked for.
+    coalesce: Only the newest message of its kind is kept. Used for state snapshots where only the latest matters.
+    drop: The message may be dropped, oldest first. Used for the telemetry streams.
+    """
+    reliable = "reliable"
+    coalesce = "coalesce"
+    drop = "drop"
+
+
+def delivery_policy(message) -> DeliveryPolicy:
+    match message:
+        case RtdeState() | ProtectiveStopRecoveryMessage():
+            return DeliveryPolicy.coalesce
+        case RtdeSamplesMessage():
+            return DeliveryPolicy.drop
+        case _:
+            return DeliveryPolicy.reliable
+
+
+class OutgoingFrame:
+    """
+    A message on its way to one or more web clients.
+
+    The message is encoded at most once per wire format, and the encoded frame is shared by all clients using it.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self.policy: DeliveryPolicy = delivery_policy(message)
+        self.coalesce_key = type(message) if self.policy == DeliveryPolicy.coalesce else None
+        self._encoded: dict[WireFormat, str | bytes] = dict()
+
+    def encoded(self, wire_format: WireFormat) -> str | bytes:
+        if wire_format not in self._encoded:
+            self._encoded[wire_format] = encode(self.message, wire_format)
+        return self._encoded[wire_format]
+
+
+class WebClientStatistics:
+    """
+    Counters of the outbound queue of a single web client.
+
+    dropped counts telemetry that was thrown away because the queue was full.
+    coalesced counts state messages that were replaced by a newer one while they were still queued.
+    overflowed counts reliable messages that were queued even though the queue was already full.
+    failed counts messages that could not be encoded or sent, they are skipped.
+    """
+
+    def __init__(self):
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.overflowed: int = 0
+        self.failed: int = 0
+        self.max_queue_depth: int = 0
+
+    def dump(self):
+        """Dumps the counters to a dictionary that can be converted to JSON."""
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed,
+            "failed": self.failed,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+class WebClientQueue:
+    """
+    The bounded outbound queue of a single web client, drained by a single writer task.
+
+    A slow client only ever fills its own queue. Once the queue holds max_size frames, the oldest droppable telemetry
+    makes room for new frames. Reliable frames are never dropped, they are queued beyond max_size if needed.
+    on_first_sent is called once the first frame was written to the websocket.
+    """
+
+    def __init__(self, websocket: WebSocketServerProtocol, wire_format: WireFormat, max_size: int,
+                 on_first_sent: Callable[[], None] | None = None):
+        if max_size < 1:
+            raise ValueError(f"Queue size must be at least 1, got {max_size}")
+        self.websocket: WebSocketServerProtocol = websocket
+        self.wire_format: WireFormat = wire_format
+        self.max_size: int = max_size
+        self.statistics = WebClientStatistics()
+        self._on_first_sent: Callable[[], None] | None = on_first_sent
+
+        self._frames: deque[OutgoingFrame] = deque()
+        self._coalescing: dict[type, int] = dict()
+        self._frame_available = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_frames())
+
+    def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        self._frames.clear()
+        self._coalescing.clear()
+
+    def put(self, frame: OutgoingFrame):
+        if frame.coalesce_key is not None and frame.coalesce_key in self._coalescing:
+            # The queued state message has not been sent yet, so it is replaced in place by the newer one
+            self._frames[self._coalescing[frame.coalesce_key]] = frame
+            self.statistics.coalesced += 1
+            return
+
+        if len(self._frames) >= self.max_size and not self._make_room():
+            if frame.policy == DeliveryPolicy.drop:
+                self.statistics.dropped += 1
+                return
+            self.statistics.overflowed += 1
+            recurring_logger.warning(f"Queue of web client is full with {len(self._frames)} reliable messages")
+
+        if frame.coalesce_key is not None:
+            self._coalescing[frame.coalesce_key] = len(self._frames)
+        self._frames.append(frame)
+        self.statistics.max_queue_depth = max(self.statistics.max_queue_depth, len(self._frames))
+        self._frame_available.set()
+
+    def _make_room(self) -> bool:
+        """Drops the oldest droppable frame. Returns False if every queued frame must be delivered."""
+        for index, queued in enumerate(self._frames):
+            if queued.policy == DeliveryPolicy.drop:
+                del self._frames[index]
+                self._shift_coalescing(index)
+                self.statistics.dropped += 1
+                return True
+        return False
+
+    def _shift_coalescing(self, removed_index: int):
+        for key, index in self._coalescing.items():
+            if index > removed_index:
+                self._coalescing[key] = index - 1
+
+    def _pop(self) -> OutgoingFrame:
+        frame = self._frames.popleft()
+        if frame.coalesce_key is not None and self._coalescing.get(frame.coalesce_key) == 0:
+            del self._coalescing[frame.coalesce_key]
+        self._shift_coalescing(-1)
+        return frame
+
+    async def _write_frames(self):
+        try:
+            while True:
+                await self._frame_available.wait()
+                while self._frames:
+                    frame = self._pop()
+                    try:
+                        # Awaiting the send lets the websocket apply backpressure, a slow client only slows its writer
+                        await self.websocket.send(frame.encoded(self.wire_format))
+                        self.statistics.sent += 1
+                        if self.statistics.sent == 1 and self._on_first_sent is not None:
+                            self._on_first_sent()
+                    except ConnectionClosed:
+                        raise
+                    except Exception as e:
+                        # A single message that fails must not stop the writer, the client would never get another one
+                        self.statistics.failed += 1
+                        recurring_logger.error(f"Sending {type(frame.message).__name__} to web client failed: {e!r}")
+                        if self.websocket.closed:
+                            non_recurring_logger.warning("Web client connection is closed, stopping its writer")
+                            return
+                self._frame_available.clear()
+        except ConnectionClosed:
+            non_recurring_logger.debug("Web client closed the connection, stopping its writer")
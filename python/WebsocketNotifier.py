@@ -1,4 +1,5 @@
-from typing import Callable
+import asyncio
+from typing import Callable, Any
 
 from custom_logging import LogConfig
 
@@ -17,18 +18,35 @@ class WebsocketNotifier:
 
     def __init__(self):
         self._observers = []
+        self._loop: asyncio.AbstractEventLoop | None = None
 
-    def register_observer(self, observer: Callable[[str], None]):
+    def set_loop(self, loop: asyncio.AbstractEventLoop):
+        """Sets the event loop the observers run on. Messages from other threads are handed over to it."""
+        self._loop = loop
+
+    def register_observer(self, observer: Callable[[Any], None]):
         """ Register a function that listens for messages to the frontend client"""
         self._observers.append(observer)
 
-    def notify_observers(self, message: str):
+    def notify_observers(self, message):
         """Use this function to send a message through the websocket.
+        The message is a message object that is encoded in the wire format of each client.
         All registered functions will be called with the given message.
         The order is not guaranteed.
+        It is safe to call from any thread, the observers are always called on the event loop.
         """
+        if self._loop is not None and not self.__is_on_loop():
+            self._loop.call_soon_threadsafe(self.notify_observers, message)
+            return
+
         for observer in self._observers:
             observer(message)
 
+    def __is_on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
 
 websocket_notifier = WebsocketNotifier()
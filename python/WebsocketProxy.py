@@ -1,78 +1,170 @@
 import asyncio
 import json
-import re
 from asyncio import StreamReader, StreamWriter, Task
+from functools import lru_cache
 from socket import gethostbyname, gethostname
-from time import sleep
-from typing import Final
-
-from websockets.server import serve
-
-from RobotControl.Robot import Robot
-from RobotControl.RobotSocketMessages import parse_robot_message, ReportState, RobotSocketMessageTypes
-from RobotControl.RunningWithSSH import run_script_on_robot
-from SocketMessages import AckResponse
+from typing import Final, Coroutine
+
+from websockets.server import serve, WebSocketServerProtocol
+
+from BinaryWireFormat import WireFormat, BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL
+from ConnectionPool import connection_pool
+from FeedbackFramer import FeedbackFramer
+from ProxyStartup import proxy_readiness
+from RobotControl.RobotSocketMessages import parse_robot_message, ReportState, is_compact_report, parse_compact_report
+from RobotJobScheduler import robot_job_scheduler, RateLimitExceeded, JobCancelled
+from RtdeHistory import rtde_history
+from RtdeSubscriptions import rtde_subscriptions, SubscriptionMode
+from SocketMessages import AckResponse, Status, RtdeHistoryRequestMessage, RtdeHistoryResponse, RtdeSubscriptionMessage
 from SocketMessages import InspectionPointFormatFromFrontend, InspectionVariable
 from SocketMessages import parse_message, CommandMessage, InspectionPointMessage, StopProgramMessage
+from WebClientQueue import WebClientQueue, OutgoingFrame
 from WebsocketNotifier import websocket_notifier
-from constants import ROBOT_FEEDBACK_PORT, FRONTEND_WEBSOCKET_PORT
+from constants import ROBOT_FEEDBACK_PORT, FRONTEND_WEBSOCKET_PORT, WEB_CLIENT_QUEUE_SIZE, COMPACT_INSPECTION_REPORTS
+from constants import READ_POINT_CACHE_SIZE, COMPACT_REPORT_VALUE_LENGTH
 from custom_logging import LogConfig
 from variables.InspectionGenerator import InspectionGenerator
+from variables.InspectionInjector import inject_inspection_points, InspectionPointError
+from variables.VariableDefinition import CodeVariableDefinition
 
 recurring_logger = LogConfig.get_recurring_logger(__name__)
 non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
 clients = dict()
-_START_BYTE: Final = b'\x02'
-_END_BYTE: Final = b'\x03'
 _EMPTY_BYTE: Final = b''
 
-_connected_web_clients = set()
+_connected_web_clients: dict[WebSocketServerProtocol, WebClientQueue] = dict()
 _new_client = False
+_running_handlers: set[Task] = set()
+
+def __require_robot():
+    """
+    Returns the robot once the startup has connected it.
+    The robot classes are imported here, so importing this module does not load them and their dependencies.
+
+        Raises:
+            RuntimeError: If the robot is not connected yet.
+    """
+    if not proxy_readiness.is_ready:
+        raise RuntimeError(f"The robot is not connected yet ({proxy_readiness.message})")
+    from RobotControl.Robot import Robot
+    return Robot.get_instance()
 
-robot = Robot.get_instance()
 
-def handle_command_message(message: CommandMessage) -> str:
+async def __run_script(websocket: WebSocketServerProtocol, script: str, allow_interpreter: bool = False) -> str:
+    __require_robot()
+    from RobotControl.RunningWithSSH import run_script_on_robot_async
+    return await run_script_on_robot_async(websocket, script, allow_interpreter)
+
+
+async def handle_command_message(websocket: WebSocketServerProtocol, message: CommandMessage) -> AckResponse | None:
     command_string = message.data.command
     non_recurring_logger.debug(f"Command string: {command_string}")
 
-    result = run_script_on_robot(command_string)
+    try:
+        result = await __run_script(websocket, command_string, allow_interpreter=True)
+    except RateLimitExceeded as e:
+        recurring_logger.warning(f"Command rejected: {e}")
+        return AckResponse(message.data.id, command_string, str(e), Status.Error)
+    except JobCancelled as e:
+        non_recurring_logger.debug(f"Command was not run: {type(e).__name__}")
+        return None
     non_recurring_logger.debug(f"Result of command: {result}")
     if result == "":
-        return ""
+        return None
     response = AckResponse(message.data.id, command_string, result)
-    str_response = str(response)
-    non_recurring_logger.debug(f"Sending response: {str_response}")
-    return str_response
-
-def handle_stop_program_message(message: StopProgramMessage) -> str:
-    robot.controller.stop_program()
+    non_recurring_logger.debug(f"Sending response: {response}")
+    return response
+
+async def handle_stop_program_message(websocket: WebSocketServerProtocol, message: StopProgramMessage) -> None:
+    # Cancelling first keeps a job that is about to press play from starting the program after the stop
+    await robot_job_scheduler.cancel(websocket)
+    robot = __require_robot()
+    await asyncio.to_thread(robot.controller.stop_program)
+    robot.interpreter_mode.end_session()
     non_recurring_logger.debug("Stopping program because frontend requested it")
-    return ""
+    return None
+
+type ReadPointVariables = tuple[tuple[str, str, bool], ...]
+"""The name, read command and global flag of every variable of an inspection point, in order"""
+
 
 def generate_read_point(inspectionPoint: InspectionPointFormatFromFrontend, globalVariables: list[InspectionVariable])->str:
-    registry = InspectionGenerator([v.codeVariable for v in globalVariables])
-    for v in inspectionPoint.additionalVariables:
-        registry.register_code_variable(v.codeVariable)
+    variables = tuple((v.name, v.readCommand, v.codeVariable.socket_representation.global_variable)
+                      for v in globalVariables + inspectionPoint.additionalVariables)
+    return _generate_read_point_code(inspectionPoint.id, variables)
+
+
+@lru_cache(maxsize=READ_POINT_CACHE_SIZE)
+def _generate_read_point_code(point_id: int, variables: ReadPointVariables) -> str:
+    """The same debug script is run over and over, so unchanged inspection points reuse their generated code."""
+    registry = InspectionGenerator([CodeVariableDefinition(name, read_command, global_variable)
+                                    for name, read_command, global_variable in variables])
     read_commands = registry.generate_read_commands()
-    report_state = ReportState(inspectionPoint.id, read_commands)
+    report_state = ReportState(point_id, read_commands)
+    if COMPACT_INSPECTION_REPORTS:
+        if report_state.fits_compact_report(COMPACT_REPORT_VALUE_LENGTH):
+            return report_state.dump_string_compact()
+        # The controller would cut the report, the JSON report is sent in fragments and has no such limit
+        non_recurring_logger.info(f"Inspection point {point_id} has too many variables for a compact report")
     return report_state.dump_string_post_urify()
 
-def handle_inspection_point_message(message: InspectionPointMessage) -> str:
-    for i in reversed(message.inspectionPoints):
-        read_command = generate_read_point(i, message.globalVariables)
-        if message.scriptText[i.lineNumber] != i.command:
-            raise Exception(f"The insert is going wrong. linenumber-1: {message.scriptText[i.lineNumber-1]}, linenumber+1: {message.scriptText[i.lineNumber+1]}. Should be: {i.command}. Length of inspectionpints: {len(message.scriptText)}")
-        message.scriptText.insert(i.lineNumber, read_command)
 
-    final_script = "\n".join(message.scriptText)
-    response = run_script_on_robot(final_script)
+def get_read_point_cache_statistics() -> dict:
+    """Returns the hits, misses, maximum size and current size of the cache of generated inspection points."""
+    return _generate_read_point_code.cache_info()._asdict()
+
+async def handle_inspection_point_message(websocket: WebSocketServerProtocol,
+                                          message: InspectionPointMessage) -> AckResponse | None:
+    try:
+        final_script = inject_inspection_points(message.scriptText, message.inspectionPoints,
+                                                lambda point: generate_read_point(point, message.globalVariables))
+    except InspectionPointError as e:
+        recurring_logger.warning(f"Inspection points rejected: {e.errors}")
+        return AckResponse(0, message.type.name, str(e), Status.Error)
+
+    try:
+        response = await __run_script(websocket, final_script)
+    except RateLimitExceeded as e:
+        recurring_logger.warning(f"Inspection points rejected: {e}")
+        return AckResponse(0, message.type.name, str(e), Status.Error)
+    except JobCancelled as e:
+        non_recurring_logger.debug(f"Script with inspection points was not run: {type(e).__name__}")
+        return None
     if not response:
-        return ""
+        return None
     
     non_recurring_logger.debug(f"Result of command: {response}")
-    ack_response = AckResponse(0, final_script, response) # 0, because we don't have an id for the script
-    return str(ack_response)
+    return AckResponse(0, final_script, response) # 0, because we don't have an id for the script
+
+def handle_rtde_history_request(message: RtdeHistoryRequestMessage) -> RtdeHistoryResponse | AckResponse:
+    data = message.data
+    try:
+        history = rtde_history.query(data.fields, data.start, data.end, data.max_samples)
+    except (ValueError, TypeError) as e:
+        recurring_logger.warning(f"Invalid RTDE history request: {e}")
+        return AckResponse(data.id, message.type.name, str(e), Status.Error)
+
+    recurring_logger.debug(f"Answering RTDE history request for {data.fields} with {len(history['timestamps'])} samples")
+    return RtdeHistoryResponse(data.id, data.start, data.end, history)
+
+
+def handle_rtde_subscription_message(websocket: WebSocketServerProtocol,
+                                     message: RtdeSubscriptionMessage) -> AckResponse | None:
+    data = message.data
+    if not data.fields:
+        rtde_subscriptions.unsubscribe(websocket)
+        return None
+
+    try:
+        mode = SubscriptionMode(data.mode)
+        rtde_subscriptions.subscribe(websocket, data.fields, data.max_rate, mode,
+                                     lambda samples: send_to_web_client(websocket, samples))
+    except ValueError as e:
+        recurring_logger.warning(f"Invalid RTDE subscription: {e}")
+        return AckResponse(data.id, message.type.name, str(e), Status.Error)
+    return None
+
 
 def handle_new_client():
     global _new_client
@@ -89,46 +181,114 @@ def has_new_client() -> bool:
 
 
 def __get_handler() -> callable:
-    async def echo(websocket):
+    async def echo(websocket: WebSocketServerProtocol):
+        # The time to the first byte is taken when the writer has sent the frame, not when it was queued
+        queue = WebClientQueue(websocket, WireFormat.from_subprotocol(websocket.subprotocol), WEB_CLIENT_QUEUE_SIZE,
+                               on_first_sent=proxy_readiness.mark_first_byte)
         try:
-            _connected_web_clients.add(websocket)
+            _connected_web_clients[websocket] = queue
+            queue.start()
+            non_recurring_logger.debug(f"Web client uses the {queue.wire_format.value} wire format")
+            # The client learns right away whether commands can be run yet
+            send_to_web_client(websocket, proxy_readiness.state_message())
             handle_new_client()
             async for message in websocket:
                 recurring_logger.debug(f"Received following command from frontend: {message}")
 
-                message = parse_message(message)
+                try:
+                    message = parse_message(message)
+                except ValueError as e:
+                    # A malformed message is answered, it does not end the connection
+                    recurring_logger.warning(f"Invalid message from web client: {e}")
+                    send_to_web_client(websocket, AckResponse(0, "Invalid_message", str(e), Status.Error))
+                    continue
 
                 match message:
                     case CommandMessage():
-                        str_response = handle_command_message(message)
+                        run_in_background(handle_command_message(websocket, message))
                     case InspectionPointMessage():
-                        str_response = handle_inspection_point_message(message)
+                        run_in_background(handle_inspection_point_message(websocket, message))
                     case StopProgramMessage():
-                        str_response = handle_stop_program_message(message)
+                        run_in_background(handle_stop_program_message(websocket, message))
+                    case RtdeHistoryRequestMessage():
+                        # The history is only interesting for the client that asked for it
+                        send_to_web_client(websocket, handle_rtde_history_request(message))
+                    case RtdeSubscriptionMessage():
+                        response = handle_rtde_subscription_message(websocket, message)
+                        if response is not None:
+                            send_to_web_client(websocket, response)
                     case _:
                         raise ValueError(f"Unknown message type: {message}")
-
-                if str_response != "":
-                    send_to_all_web_clients(str_response)
         except Exception as e:
             recurring_logger.error(f"Error in websocket handler: {e}")
             raise e
+        finally:
+            rtde_subscriptions.unsubscribe(websocket)
+            robot_job_scheduler.forget(websocket)
+            queue.stop()
+            _connected_web_clients.pop(websocket, None)
+            non_recurring_logger.debug(f"Web client disconnected, queue statistics: {queue.statistics.dump()}")
     return echo
 
 
-def send_to_all_web_clients(message: str):
-    removed_clients = []
+def run_in_background(handler: Coroutine[None, None, AckResponse | None]):
+    """
+    Runs a handler that talks to the robot as a task, so the websocket keeps receiving messages while it runs.
+    Once the handler is done, its response is sent to all web clients.
+    """
+    task = asyncio.create_task(__send_response_when_done(handler))
+    # The event loop only keeps weak references to tasks
+    _running_handlers.add(task)
+    task.add_done_callback(_running_handlers.discard)
 
-    for websocket in _connected_web_clients:
+
+async def __send_response_when_done(handler: Coroutine[None, None, AckResponse | None]):
+    try:
+        response = await handler
+    except Exception as e:
+        recurring_logger.error(f"Error in handler {handler.__name__}: {e}")
+        response = AckResponse(0, handler.__name__, str(e), Status.Error)
+    if response is not None:
+        send_to_all_web_clients(response)
+
+
+def get_robot_job_statistics() -> dict:
+    """Returns the queue length and the counters, wait times and execution times of the robot job scheduler."""
+    return {"queue_length": robot_job_scheduler.queue_length} | robot_job_scheduler.statistics.dump()
+
+
+def get_connection_statistics() -> dict:
+    """Returns the state and the reconnect counters of every connection to the robot's socket servers, by address."""
+    return connection_pool.dump()
+
+
+def get_web_client_statistics() -> list[dict]:
+    """Returns the current queue depth and the counters of the outbound queue of every connected web client."""
+    return [
+        {"address": str(websocket.remote_address), "queue_depth": queue.depth} | queue.statistics.dump()
+        for websocket, queue in _connected_web_clients.items()
+    ]
+
+
+def send_to_web_client(websocket: WebSocketServerProtocol, message):
+    """Queues a message object, or an already encoded JSON string, for a single client."""
+    queue = _connected_web_clients.get(websocket)
+    if queue is None or websocket.closed:
+        return
+    recurring_logger.debug(f"{type(message).__name__} queued for webclient")
+    queue.put(OutgoingFrame(message))
+
+
+def send_to_all_web_clients(message):
+    """Queues a message object, or an already encoded JSON string, for every connected client."""
+    # The frame is shared, so every wire format is only encoded once, no matter how many clients use it
+    frame = OutgoingFrame(message)
+    for websocket, queue in _connected_web_clients.items():
         if websocket.closed:
-            removed_clients.append(websocket)
             continue
-        recurring_logger.debug(f"Sending message to webclient: {message}")
-        asyncio.create_task(websocket.send(message))
-        recurring_logger.debug(f"Message sent to webclient: {message}")
-
-    for websocket in removed_clients:
-        _connected_web_clients.remove(websocket)
+        queue.put(frame)
+    # Only the type is logged, formatting the message itself would encode it once more
+    recurring_logger.debug(f"{type(message).__name__} queued for {len(_connected_web_clients)} webclients")
 
 
 # To prevent circular dependencies
@@ -172,83 +332,18 @@ def client_connected_cb(client_reader: StreamReader, client_writer: StreamWriter
 async def client_task(reader: StreamReader, writer: StreamWriter):
     client_addr = writer.get_extra_info('peername')
     non_recurring_logger.info(f'Start echoing back to {client_addr}')
-    extra_data = []
+    framer = FeedbackFramer()
 
     while True:
         data = await reader.read(4096)
 
         if data == _EMPTY_BYTE:
-            non_recurring_logger.debug("Empty data received. Closing connection")
+            non_recurring_logger.debug(f"Empty data received. Closing connection, framer statistics: "
+                                       f"{framer.statistics.dump()}")
             return
 
-        # When using _START_BYTE[0] we return the integer value of the byte in the ascii table, so here it returns 2
-        if data[0] == _START_BYTE[0] and extra_data:
-            # We have extra data that needs to be recovered and processed
-            await recover_mangled_data(extra_data)
-
-            # Clean extra data, since the extra data was mangled
-            extra_data = []
-
-            continue
-
-        if extra_data:
-            data = extra_data + data
-            extra_data = []
-
-        # Check if the data received starts with the start byte
-        # When using _START_BYTE[0] we return the integer value of the byte in the ascii table, so here it returns 2
-        if data[0] != _START_BYTE[0]:
-            recurring_logger.error(f"Something is WRONG. Data not started with start byte: {data}")
-
-        if _END_BYTE not in data:
-            recurring_logger.debug(f"End byte not in data, extra_data is set to data: {data}")
-            extra_data = data
-        else:
-            # Split the data into messages within the data
-            list_of_data = data.split(_END_BYTE)
-
-            # If the last element is not empty, then it's not the end of the message
-            if list_of_data[len(list_of_data) - 1] != _EMPTY_BYTE:
-                extra_data = list_of_data.pop()
-
-            for message in list_of_data:
-                # If message contains multiple start bytes, discard message
-                if message.count(_START_BYTE) > 1:
-                    recurring_logger.warning(f"Trying to recover messages because of multiple start bytes: {message}")
-                    messages = message.split(_START_BYTE)
-                    for sub_message in messages:
-                        await recover_mangled_data(sub_message)
-
-                if message:
-                    message = message[1:]  # remove the start byte
-                    message_from_robot_received(message)
-
-
-async def recover_mangled_data(extra_data: bytes) -> None:
-    recurring_logger.debug(f"Mangled data: {extra_data}")
-    # We have extra data and the rest was lost
-    mangled_data = extra_data.decode()
-
-    if await search_for_report_state(mangled_data):
-        return
-
-    recurring_logger.error("Pattern not found in the message.")
-
-
-async def search_for_report_state(mangled_data: str) -> bool:
-    pattern = r'"type":\s*"([^"]+)"'
-    # Use re.search to find the pattern in the string
-    match = re.search(pattern, mangled_data)
-    # If match is found, extract the values
-    if match:
-        message_type = match.group(1)
-        # data_value = int(match.group(2))
-        match message_type:
-            case RobotSocketMessageTypes.Report_state.name:
-                recurring_logger.warning("Found a match for report state in mangled data")
-                # WE SHOULD PROLLY DO SOMETHING IF WE FIND A MATCH, BEFORE WE STARTED A NEW READ REPORT STATE
-                return True
-    return False
+        for message in framer.feed(data):
+            message_from_robot_received(message)
 
 
 def is_json(myjson):
@@ -260,6 +355,13 @@ def is_json(myjson):
 
 
 def message_from_robot_received(message: bytes):
+    if is_compact_report(message):
+        try:
+            send_to_all_web_clients(parse_compact_report(message))
+        except ValueError as e:
+            recurring_logger.error(f"Invalid compact report: {e}")
+        return
+
     decoded_message = message.decode()
     recurring_logger.debug(f"Decoded message before parsing: {decoded_message}")
 
@@ -270,21 +372,20 @@ def message_from_robot_received(message: bytes):
     robot_message = parse_robot_message(decoded_message)
     match robot_message:
         case ReportState():
-            send_to_all_web_clients(str(robot_message))
+            send_to_all_web_clients(robot_message)
         case _:
             raise ValueError(f"Unknown RobotSocketMessage message: {robot_message}")
 
 
 async def start_webserver():
-    robot = Robot.get_instance()
-
-    while not robot.controller.is_polyscope_ready:
-        recurring_logger.debug("Waiting for polyscope to be ready")
-        sleep(0.1)
+    websocket_notifier.set_loop(asyncio.get_running_loop())
 
+    # The server is started right away, the robot is connected in the background by start_robot_connections
     try:
         non_recurring_logger.debug("Starting websocket server")
-        async with serve(__get_handler(), "0.0.0.0", FRONTEND_WEBSOCKET_PORT):
+        async with serve(__get_handler(), "0.0.0.0", FRONTEND_WEBSOCKET_PORT,
+                         subprotocols=[JSON_SUBPROTOCOL, BINARY_SUBPROTOCOL]):
+            proxy_readiness.mark_listening()
             await asyncio.Future()  # run forever
     except Exception as e:
         recurring_logger.error(f"Error starting websocket server: {e}")
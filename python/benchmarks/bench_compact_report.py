@@ -0,0 +1,66 @@
+"""
+Size of the generated URScript and cost on the proxy of compact inspection reports compared with JSON reports.
+
+No controller is available here, so the robot-side cycle time is not measured. The number of socket calls and string
+functions the controller runs per inspection point hit is counted instead, since every socket call is a system call.
+Every value is assumed to be 20 characters long for the bytes on the wire and for parsing.
+"""
+import json
+
+import benchmark_setup
+from RobotControl.RobotSocketMessages import ReportState, VariableObject, parse_robot_message, parse_compact_report
+from RobotControl.RobotSocketVariableTypes import VariableTypes
+from URIFY import estimate_compact_report_length, COMPACT_REPORT_MARKER
+
+VALUE = "v" * 20
+
+
+def make_report(variable_count: int) -> ReportState:
+    return ReportState(42, [VariableObject(f"variable_{index}", VariableTypes.String, f"read_variable_{index}()")
+                            for index in range(variable_count)])
+
+
+def compact_message(report: ReportState) -> bytes:
+    """The message the robot sends for the compact report if every value is VALUE."""
+    fields = [str(report.id)]
+    for variable in report.variables:
+        fields += [variable.name, variable.variable_type.name, "1" if variable.global_variable else "0", VALUE]
+    return (COMPACT_REPORT_MARKER + "".join(f"{len(field.encode())}{COMPACT_REPORT_MARKER}{field}"
+                                            for field in fields)).encode()
+
+
+def json_message(report: ReportState) -> bytes:
+    """The message the robot sends for the JSON report if every value is VALUE."""
+    valued = ReportState(report.id, [VariableObject(variable.name, variable.variable_type, VALUE,
+                                                    variable.global_variable) for variable in report.variables])
+    return json.dumps(valued.dump(raw_values=True)).encode()
+
+
+def robot_calls(script: str) -> tuple[int, int]:
+    socket_calls = script.count("socket_send_")
+    string_calls = script.count("str_cat(") + script.count("str_len(") + script.count("to_str(")
+    return socket_calls, string_calls
+
+
+def main():
+    print(f"{'variables':>9} | {'script chars':>12} {'socket calls':>12} {'string calls':>12} {'wire bytes':>10}"
+          f" {'parse us':>8}")
+    for variable_count in (1, 4, 8, 16, 32):
+        report = make_report(variable_count)
+        modes = [("json", report.dump_string_post_urify(), json_message(report),
+                  lambda message: parse_robot_message(message.decode()))]
+        if report.fits_compact_report(len(VALUE)):
+            modes.append(("compact", report.dump_string_compact(), compact_message(report), parse_compact_report))
+            assert estimate_compact_report_length(report.id, report._compact_variables(),
+                                                  len(VALUE)) == len(compact_message(report))
+
+        for mode, script, message, parse in modes:
+            assert len(parse(message).variables) == variable_count
+            socket_calls, string_calls = robot_calls(script)
+            parse_time = benchmark_setup.best_time(lambda: [parse(message) for _ in range(1000)]) * 1000
+            print(f"{variable_count:>9} | {len(script):>12} {socket_calls:>12} {string_calls:>12} {len(message):>10}"
+                  f" {parse_time:>8.1f}  {mode}")
+
+
+if __name__ == "__main__":
+    main()
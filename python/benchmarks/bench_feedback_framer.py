@@ -0,0 +1,82 @@
+"""
+Throughput of FeedbackFramer compared with the framing loops it replaced.
+
+The old loop is the one client_task used before FeedbackFramer: it concatenated the unfinished rest with every read
+and split the data on the end byte. The per-byte loop is the naive state machine that looks at every byte in Python.
+All three get the same stream of feedback messages, cut into reads of the given size.
+"""
+import random
+
+import benchmark_setup
+from FeedbackFramer import FeedbackFramer
+
+_START = b"\x02"
+_END = b"\x03"
+_EMPTY = b""
+
+
+def old_loop(chunks: list[bytes]) -> list[bytes]:
+    frames = []
+    extra_data = _EMPTY
+    for data in chunks:
+        if extra_data:
+            data = extra_data + data
+            extra_data = _EMPTY
+        if _END not in data:
+            extra_data = data
+            continue
+        list_of_data = data.split(_END)
+        if list_of_data[-1] != _EMPTY:
+            extra_data = list_of_data.pop()
+        for message in list_of_data:
+            if message:
+                frames.append(message[1:])
+    return frames
+
+
+def per_byte_loop(chunks: list[bytes]) -> list[bytes]:
+    frames = []
+    current: bytearray | None = None
+    for data in chunks:
+        for byte in data:
+            if byte == 0x02:
+                current = bytearray()
+            elif byte == 0x03:
+                if current is not None:
+                    frames.append(bytes(current))
+                current = None
+            elif current is not None:
+                current.append(byte)
+    return frames
+
+
+def framer(chunks: list[bytes]) -> list[bytes]:
+    feedback_framer = FeedbackFramer()
+    frames = []
+    for data in chunks:
+        frames += feedback_framer.feed(data)
+    return frames
+
+
+def make_chunks(message_count: int, read_size: int) -> tuple[list[bytes], list[bytes]]:
+    rng = random.Random(1)
+    alphabet = b'abcdefghijklmnopqrstuvwxyz0123456789{}":,[] '
+    messages = [bytes(rng.choices(alphabet, k=rng.randint(20, 400))) for _ in range(message_count)]
+    stream = b"".join(_START + message + _END for message in messages)
+    return messages, [stream[offset:offset + read_size] for offset in range(0, len(stream), read_size)]
+
+
+def main():
+    print(f"{'read size':>10} {'MB':>6} | {'framer MB/s':>12} {'old loop MB/s':>14} {'per-byte MB/s':>14}")
+    for read_size in (64, 512, 4096, 65536):
+        messages, chunks = make_chunks(20000, read_size)
+        megabytes = sum(len(chunk) for chunk in chunks) / 1e6
+        for implementation in (framer, old_loop, per_byte_loop):
+            assert implementation(chunks) == messages, implementation.__name__
+        rates = [megabytes / benchmark_setup.best_time(lambda: implementation(chunks), repeat=3)
+                 for implementation in (framer, old_loop, per_byte_loop)]
+        print(f"{read_size:>10} {megabytes:>6.1f} | {rates[0]:>12.1f} {rates[1]:>14.1f} {rates[2]:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Scaling of inject_inspection_points with the length of the script, compared with the list.insert loop it replaced.
+
+Every 20th line has an inspection point, so the number of points grows with the script. The merge pass should take
+the same time per line at every size, while every insert moves all the lines after it.
+"""
+import benchmark_setup
+from SocketMessages import InspectionPointFormatFromFrontend
+from variables.InspectionInjector import inject_inspection_points
+
+POINT_EVERY = 20
+
+
+def read_command(point: InspectionPointFormatFromFrontend) -> str:
+    return f" socket_send_string(\"point {point.id}\", \"abcd\") "
+
+
+def insert_loop(script: list[str], points: list[InspectionPointFormatFromFrontend]) -> str:
+    lines = list(script)
+    for point in reversed(points):
+        lines.insert(point.lineNumber, read_command(point))
+    return "\n".join(lines)
+
+
+def main():
+    print(f"{'lines':>7} {'points':>6} | {'merge ms':>9} {'ns/line':>8} | {'insert ms':>9} {'ns/line':>8}")
+    for line_count in (1_000, 10_000, 100_000):
+        script = [f"  movej([0, 0, 0, 0, 0, {index}])" for index in range(line_count)]
+        points = [InspectionPointFormatFromFrontend(index, line_number, script[line_number], [])
+                  for index, line_number in enumerate(range(0, line_count, POINT_EVERY))]
+        assert inject_inspection_points(script, points, read_command) == insert_loop(script, points)
+
+        merge = benchmark_setup.best_time(lambda: inject_inspection_points(script, points, read_command))
+        insert = benchmark_setup.best_time(lambda: insert_loop(script, points))
+        print(f"{line_count:>7} {len(points):>6} | {merge * 1e3:>9.2f} {merge * 1e9 / line_count:>8.0f} |"
+              f" {insert * 1e3:>9.2f} {insert * 1e9 / line_count:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Reading the robot's log from the end, on a log of several MB, compared with the byte by byte loop it replaced.
+
+The log is a local file, read like a locally mounted URControl.log. Over SFTP every seek and read of the old loop was
+a round trip to the robot as well, which is not measured here.
+"""
+import os
+import random
+
+import benchmark_setup
+from RobotControl.RobotClasses.SSH import SSH
+
+LINE_COUNT = 200_000
+
+
+def byte_loop_last_lines(path: str, lines: int) -> str:
+    """The loop read_lines_from_log used before, reading a single byte per seek."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        lines_read = 0
+        line = b""
+        while position >= 0 and lines_read < lines:
+            f.seek(position)
+            char = f.read(1)
+            if char == b'\n' and line:
+                lines_read += 1
+                if lines_read == lines:
+                    break
+            line = char + line
+            position -= 1
+        return line.decode("utf-8")
+
+
+def write_log(path: str) -> int:
+    """Writes a log that looks like URControl.log and returns the offset of the last program start."""
+    rng = random.Random(1)
+    program_start = 0
+    with open(path, 'wb') as f:
+        for index in range(LINE_COUNT):
+            if index == LINE_COUNT - LINE_COUNT // 10:
+                program_start = f.tell()
+                f.write(b"1700000000.000 INFO Starting program test\n")
+            f.write(f"{1700000000 + index}.{rng.randrange(1000):03} INFO Controller: message {index} "
+                    f"{'x' * rng.randrange(20, 80)}\n".encode())
+    return program_start
+
+
+def main():
+    path = os.path.abspath("URControl.log")
+    program_start = write_log(path)
+    ssh = object.__new__(SSH)
+    ssh.local_error_log = path
+    print(f"log of {os.path.getsize(path) / 1e6:.1f} MB and {LINE_COUNT} lines")
+
+    assert ssh.read_lines_from_log(100) == byte_loop_last_lines(path, 100).strip()
+    last_lines = benchmark_setup.best_time(lambda: ssh.read_lines_from_log(100))
+    byte_loop = benchmark_setup.best_time(lambda: byte_loop_last_lines(path, 100), repeat=1)
+    print(f"last 100 lines:                {last_lines * 1e3:>8.2f} ms, byte by byte loop {byte_loop * 1e3:.1f} ms")
+
+    ssh.program_start_offset = program_start
+    logs = ssh.get_logs_from_last_program_run()
+    assert len(logs) == LINE_COUNT // 10
+    marked = benchmark_setup.best_time(ssh.get_logs_from_last_program_run)
+    print(f"last run, start offset known:  {marked * 1e3:>8.2f} ms for {len(logs)} lines")
+
+    ssh.program_start_offset = None
+    unmarked = benchmark_setup.best_time(ssh.get_logs_from_last_program_run)
+    print(f"last run, searched from end:   {unmarked * 1e3:>8.2f} ms")
+
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        whole = benchmark_setup.best_time(lambda: sum(1 for _ in SSH._SSH__read_lines_backwards(f, size)))
+    print(f"whole log from a file object:  {whole * 1e3:>8.2f} ms, {size / 1e6 / whole:.0f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Imported first by every benchmark. Run a benchmark from the python directory, e.g.
+`python benchmarks/bench_feedback_framer.py`.
+
+The modules are imported like main.py imports them, from the python directory. They log to logs/ relative to the
+working directory, so the benchmarks run in a temporary directory that has one.
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import Callable
+
+PYTHON_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, PYTHON_DIRECTORY)
+os.environ.setdefault("RTDE_CONFIG_FILE", os.path.join(PYTHON_DIRECTORY, "rtde_configuration.xml"))
+os.chdir(tempfile.mkdtemp(prefix="proxy-benchmarks-"))
+os.makedirs("logs", exist_ok=True)
+
+
+def best_time(function: Callable[[], object], repeat: int = 5) -> float:
+    """Runs the function repeat times and returns the fastest run in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
@@ -8,6 +8,8 @@ ROBOT_FEEDBACK_HOST: str = config("ROBOT_FEEDBACK_HOST", default=gethostbyname(g
 ROBOT_IP: str = config("ROBOT_IP", default="polyscope")
 
 FRONTEND_WEBSOCKET_PORT: int = config("FRONTEND_WEBSOCKET_PORT", default=8767)
+WEB_CLIENT_QUEUE_SIZE: int = config("WEB_CLIENT_QUEUE_SIZE", default=256, cast=int)
+"""The number of outbound messages queued for a single web client before telemetry for it is dropped"""
 
 DASHBOARD_PORT = 29999
 PRIMARY_PORT = 30001
@@ -17,8 +19,57 @@ INTERPRETER_PORT = 30020
 
 SSH_USERNAME: str = config("SSH_USERNAME", default="robot")
 SSH_PASSWORD: str = config("SSH_PASSWORD", default=None)
+SSH_KEEPALIVE_INTERVAL: int = config("SSH_KEEPALIVE_INTERVAL", default=15, cast=int)
+"""Seconds between keepalive packets on the SSH connection, so a dead connection is noticed and idle ones stay open"""
+SFTP_IDLE_SESSIONS: int = config("SFTP_IDLE_SESSIONS", default=2, cast=int)
+"""The number of unused SFTP sessions kept open for the next file operation"""
+LOG_READ_BLOCK_SIZE: int = config("LOG_READ_BLOCK_SIZE", default=65536, cast=int)
+"""The number of bytes fetched at once when the robot's log is read from the end"""
+SFTP_HEALTH_CHECK_AFTER: float = config("SFTP_HEALTH_CHECK_AFTER", default=30, cast=float)
+"""Seconds an SFTP session may be unused before it is checked with a round trip before reuse"""
+LOCAL_PROGRAMS_DIR: str = config("LOCAL_PROGRAMS_DIR", default="")
+"""A local directory bind-mounted to URSim's programs directory. Scripts are then written there instead of over SFTP"""
+LOCAL_LOG_DIR: str = config("LOCAL_LOG_DIR", default="")
+"""A local directory bind-mounted to the directory of URSim's URControl.log. The log is then read there"""
+LOCAL_LOG_POLL_INTERVAL: float = config("LOCAL_LOG_POLL_INTERVAL", default=0.02, cast=float)
+"""Seconds between checks for new lines when the local log is followed"""
 
 RTDE_CONFIG_FILE: str = config("RTDE_CONFIG_FILE", default="rtde_configuration.xml")
+RTDE_FREQUENCY: float = config("RTDE_FREQUENCY", default=125, cast=float)
+"""The frequency in Hz the controller streams the RTDE recipe with. At most 500 Hz"""
+RTDE_BLOCK_SIZE: int = config("RTDE_BLOCK_SIZE", default=50, cast=int)
+"""The number of RTDE samples that are gathered into a single block before it is handed to the consumers"""
+RTDE_BLOCK_MAX_AGE: float = config("RTDE_BLOCK_MAX_AGE", default=0.02, cast=float)
+"""The maximum time in seconds a sample waits in a block that is not full yet"""
+RTDE_HISTORY_SECONDS: float = config("RTDE_HISTORY_SECONDS", default=300, cast=float)
+"""How many seconds of RTDE samples are kept in memory for history queries"""
+
+READ_POINT_CACHE_SIZE: int = config("READ_POINT_CACHE_SIZE", default=1024, cast=int)
+"""The number of generated inspection point snippets that are kept for reuse in the next runs"""
+COMPACT_INSPECTION_REPORTS: bool = config("COMPACT_INSPECTION_REPORTS", default=False, cast=bool)
+"""Inspection points build their report on the robot and send it at once, instead of sending every JSON fragment"""
+COMPACT_REPORT_VALUE_LENGTH: int = config("COMPACT_REPORT_VALUE_LENGTH", default=100, cast=int)
+"""The assumed length of a value in a compact report. Reports that could exceed 1023 bytes are sent as JSON"""
+
+ROBOT_JOB_RATE: float = config("ROBOT_JOB_RATE", default=2, cast=float)
+"""The number of scripts per second a single web client may send on average"""
+ROBOT_JOB_BURST: int = config("ROBOT_JOB_BURST", default=5, cast=int)
+"""The number of scripts a single web client may send at once before its rate limit applies"""
+INTERPRETER_FAST_PATH: bool = config("INTERPRETER_FAST_PATH", default=True, cast=bool)
+"""Short single-line commands are sent to the interpreter mode instead of being uploaded and played as a program"""
+INTERPRETER_MAX_COMMAND_LENGTH: int = config("INTERPRETER_MAX_COMMAND_LENGTH", default=256, cast=int)
+"""Commands longer than this many characters always run as a program"""
+INTERPRETER_CLEAR_AFTER: int = config("INTERPRETER_CLEAR_AFTER", default=200, cast=int)
+"""The number of interpreted statements after which the interpreter is cleared, so the controller does not run full"""
+
+CONNECT_TIMEOUT: float = config("CONNECT_TIMEOUT", default=5, cast=float)
+"""Seconds to wait for the robot to accept a connection to one of its socket servers"""
+CONNECT_FIRST_RETRY_DELAY: float = config("CONNECT_FIRST_RETRY_DELAY", default=0.1, cast=float)
+"""Seconds before the first retry of a failed connection. Every further retry waits about twice as long"""
+CONNECT_MAX_RETRY_DELAY: float = config("CONNECT_MAX_RETRY_DELAY", default=5, cast=float)
+"""The longest wait between two connection attempts"""
+CONNECT_ATTEMPTS: int = config("CONNECT_ATTEMPTS", default=6, cast=int)
+"""Connection attempts before a call that needs the connection fails. The next call starts over"""
 
 IS_PHYSICAL_ROBOT: bool = config("IS_PHYSICAL_ROBOT", default=False, cast=bool)
 
@@ -1,6 +1,6 @@
 import asyncio
 
-from RtdeConnection import start_rtde_loop
+from ProxyStartup import start_robot_connections
 from WebsocketProxy import open_robot_server, start_webserver
 from custom_logging import LogConfig
 
@@ -9,11 +9,12 @@ non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
 
 async def main():
     non_recurring_logger.warning("Starting WebsocketProxy.py")
+    # Not part of the servers' task group, a failing robot connection must not stop the servers
+    robot_connections = asyncio.create_task(start_robot_connections())
     try:
         async with asyncio.TaskGroup() as tg:
             t1 = tg.create_task(open_robot_server())
             t2 = tg.create_task(start_webserver())
-            t3 = tg.create_task(start_rtde_loop())
     except Exception as e:
         non_recurring_logger.error(f"Error in main: {e}")
         raise e
@@ -0,0 +1,16 @@
+"""
+Run the tests from the python directory with `python -m pytest tests`, after `pip install -r requirements-dev.txt`.
+
+The modules are imported like main.py imports them, from the python directory. They log to logs/ relative to the
+working directory, so the tests run in a temporary directory that has one.
+"""
+import os
+import sys
+import tempfile
+
+PYTHON_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, PYTHON_DIRECTORY)
+os.environ.setdefault("RTDE_CONFIG_FILE", os.path.join(PYTHON_DIRECTORY, "rtde_configuration.xml"))
+os.chdir(tempfile.mkdtemp(prefix="proxy-tests-"))
+os.makedirs("logs", exist_ok=True)
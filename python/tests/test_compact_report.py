@@ -0,0 +1,114 @@
+import re
+
+import pytest
+
+import WebsocketProxy
+from FeedbackFramer import FeedbackFramer
+from RobotControl.RobotSocketMessages import ReportState, VariableObject, parse_compact_report, is_compact_report
+from RobotControl.RobotSocketVariableTypes import VariableTypes
+from URIFY import estimate_compact_report_length
+
+
+def _run_on_robot(script: str, robot_variables: dict) -> bytes:
+    """Runs the URScript generated for a compact report like the controller would and returns the bytes it sent."""
+    sent = bytearray()
+    functions = {
+        "to_str": str,
+        "str_cat": lambda first, second: f"{first}{second}",
+        "str_len": lambda text: len(text.encode()),
+        "socket_send_byte": lambda value, socket_name: sent.append(value),
+        "socket_send_string": lambda text, socket_name: sent.extend(text.encode()),
+    }
+    variables = dict(robot_variables)
+    for statement in re.split(r" (?=inspection_point_\w+ = |socket_send_)", script.strip()):
+        assignment = re.fullmatch(r"(inspection_point_\w+) = (.*)", statement.strip())
+        if assignment:
+            variables[assignment[1]] = eval(assignment[2], functions, variables)
+        else:
+            eval(statement, functions, variables)
+    return bytes(sent)
+
+
+def _receive(sent: bytes) -> bytes:
+    [message] = FeedbackFramer().feed(sent)
+    return message
+
+
+ROBOT_VARIABLES = {"count": 3, "label": 'say "hi" #1', "pose": "p[0.1, 0.2, 0.3, 0, 0, 0]", "done": True, "name": "äö"}
+
+
+def test_report_round_trip():
+    report = ReportState(7, [VariableObject("count", VariableTypes.String, "count"),
+                             VariableObject("label", VariableTypes.String, "label", True),
+                             VariableObject("pose", VariableTypes.String, "pose"),
+                             VariableObject("done", VariableTypes.String, "done"),
+                             VariableObject("näme", VariableTypes.String, "name", True)])
+
+    message = _receive(_run_on_robot(report.dump_string_compact(), ROBOT_VARIABLES))
+    parsed = parse_compact_report(message)
+
+    assert is_compact_report(message)
+    assert parsed.id == 7
+    assert [(variable.name, variable.variable_type, variable.value, variable.global_variable)
+            for variable in parsed.variables] == [("count", VariableTypes.String, "3", False),
+                                                  ("label", VariableTypes.String, 'say "hi" #1', True),
+                                                  ("pose", VariableTypes.String, "p[0.1, 0.2, 0.3, 0, 0, 0]", False),
+                                                  ("done", VariableTypes.String, "True", False),
+                                                  ("näme", VariableTypes.String, "äö", True)]
+
+
+def test_typed_values_are_parsed_like_json_reports():
+    report = ReportState(1, [VariableObject("count", VariableTypes.Integer, "count")])
+
+    parsed = parse_compact_report(_receive(_run_on_robot(report.dump_string_compact(), ROBOT_VARIABLES)))
+
+    assert parsed.variables[0].value == 3
+
+
+def test_report_without_variables():
+    parsed = parse_compact_report(_receive(_run_on_robot(ReportState(4, []).dump_string_compact(), {})))
+
+    assert parsed.id == 4
+    assert parsed.variables == []
+
+
+def test_truncated_report_is_rejected():
+    report = ReportState(7, [VariableObject("label", VariableTypes.String, "label")])
+    message = _receive(_run_on_robot(report.dump_string_compact(), ROBOT_VARIABLES))
+
+    with pytest.raises(ValueError):
+        parse_compact_report(message[:-3])
+
+
+def test_estimate_matches_values_of_the_assumed_length():
+    report = ReportState(12, [VariableObject(f"variable_{index}", VariableTypes.String, f"value_{index}", index % 2 == 1)
+                              for index in range(10)])
+    robot_variables = {f"value_{index}": "x" * 40 for index in range(10)}
+
+    message = _receive(_run_on_robot(report.dump_string_compact(), robot_variables))
+
+    assert estimate_compact_report_length(12, report._compact_variables(), 40) == len(message)
+    assert report.fits_compact_report(40)
+    assert not report.fits_compact_report(100)
+
+
+@pytest.fixture
+def compact_reports(monkeypatch):
+    monkeypatch.setattr(WebsocketProxy, "COMPACT_INSPECTION_REPORTS", True)
+    WebsocketProxy._generate_read_point_code.cache_clear()
+    yield
+    WebsocketProxy._generate_read_point_code.cache_clear()
+
+
+def test_inspection_point_uses_compact_report(compact_reports):
+    script = WebsocketProxy._generate_read_point_code(3, (("count", "count", False),))
+
+    assert "inspection_point_report" in script
+
+
+def test_too_large_inspection_point_falls_back_to_json_report(compact_reports):
+    variables = tuple((f"variable_{index}", f"value_{index}", False) for index in range(20))
+    script = WebsocketProxy._generate_read_point_code(3, variables)
+
+    assert "inspection_point_report" not in script
+    assert "socket_send_byte(34" in script
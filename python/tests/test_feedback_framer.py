@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from FeedbackFramer import FeedbackFramer, START_BYTE, END_BYTE
+
+_PAYLOAD_BYTES = bytes(value for value in range(256) if value not in (START_BYTE, END_BYTE))
+_GARBAGE_BYTES = bytes(value for value in range(256) if value != START_BYTE)
+
+
+def _payloads(rng: random.Random, count: int) -> list[bytes]:
+    return [bytes(rng.choices(_PAYLOAD_BYTES, k=rng.randint(0, 300))) for _ in range(count)]
+
+
+def _stream(payloads: list[bytes], garbage: list[bytes] | None = None) -> bytes:
+    garbage = garbage or [b""] * (len(payloads) + 1)
+    parts = [garbage[0]]
+    for payload, after in zip(payloads, garbage[1:]):
+        parts += [bytes([START_BYTE]), payload, bytes([END_BYTE]), after]
+    return b"".join(parts)
+
+
+def _feed_in_chunks(stream: bytes, cuts: list[int]) -> tuple[list[bytes], FeedbackFramer]:
+    framer = FeedbackFramer()
+    frames = []
+    for start, end in zip([0] + cuts, cuts + [len(stream)]):
+        frames += framer.feed(stream[start:end])
+    return frames, framer
+
+
+def test_single_chunk():
+    frames, framer = _feed_in_chunks(_stream([b"a", b"bc", b""]), [])
+
+    assert frames == [b"a", b"bc", b""]
+    assert framer.pending == 0
+    assert framer.statistics.frames == 3
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_split_at_every_boundary(seed: int):
+    rng = random.Random(seed)
+    payloads = _payloads(rng, 3)
+    stream = _stream(payloads)
+
+    for cut in range(len(stream) + 1):
+        frames, framer = _feed_in_chunks(stream, [cut])
+        assert frames == payloads, f"split at {cut}"
+        assert framer.pending == 0
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_fragmentation(seed: int):
+    rng = random.Random(seed)
+    payloads = _payloads(rng, rng.randint(1, 40))
+    stream = _stream(payloads)
+    cuts = sorted(rng.sample(range(1, len(stream)), k=min(len(stream) - 1, rng.randint(0, 60))))
+
+    frames, framer = _feed_in_chunks(stream, cuts)
+
+    assert frames == payloads
+    assert framer.statistics.discarded_bytes == 0
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_garbage_outside_frames_is_discarded(seed: int):
+    rng = random.Random(seed)
+    payloads = _payloads(rng, rng.randint(1, 20))
+    garbage = [bytes(rng.choices(_GARBAGE_BYTES, k=rng.randint(0, 20))) for _ in range(len(payloads) + 1)]
+    stream = _stream(payloads, garbage)
+    cuts = sorted(rng.sample(range(1, len(stream)), k=min(len(stream) - 1, rng.randint(0, 30))))
+
+    frames, framer = _feed_in_chunks(stream, cuts)
+
+    assert frames == payloads
+    assert framer.statistics.discarded_bytes == sum(len(part) for part in garbage)
+    assert framer.statistics.truncated_frames == 0
+
+
+def test_garbage_at_every_boundary():
+    stream = b"xx\x03" + _stream([b"first"]) + b"\x03yy" + _stream([b"second"]) + b"z"
+
+    for cut in range(len(stream) + 1):
+        frames, framer = _feed_in_chunks(stream, [cut])
+        assert frames == [b"first", b"second"], f"split at {cut}"
+        assert framer.statistics.discarded_bytes == 7
+
+
+def test_frame_cut_off_by_a_new_start_byte():
+    stream = bytes([START_BYTE]) + b"lost" + _stream([b"kept"])
+
+    for cut in range(len(stream) + 1):
+        frames, framer = _feed_in_chunks(stream, [cut])
+        assert frames == [b"kept"], f"split at {cut}"
+        assert framer.statistics.truncated_frames == 1
+        assert framer.statistics.discarded_bytes == 5
+
+
+def test_unfinished_frame_stays_pending():
+    framer = FeedbackFramer()
+
+    assert framer.feed(bytes([START_BYTE]) + b"part") == []
+    assert framer.pending == 5
+    assert framer.feed(b"ial" + bytes([END_BYTE])) == [b"partial"]
+    assert framer.pending == 0
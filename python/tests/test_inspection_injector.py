@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from SocketMessages import InspectionPointFormatFromFrontend
+from variables.InspectionInjector import inject_inspection_points, InspectionPointError
+
+
+def _read_command(point: InspectionPointFormatFromFrontend) -> str:
+    return f"read_point({point.id})"
+
+
+def _points(script: list[str], *line_numbers: int) -> list[InspectionPointFormatFromFrontend]:
+    return [InspectionPointFormatFromFrontend(index, line_number, script[line_number], [])
+            for index, line_number in enumerate(line_numbers)]
+
+
+def _inserted_one_by_one(script: list[str], points: list[InspectionPointFormatFromFrontend]) -> str:
+    """The list.insert loop the proxy used before the merge pass."""
+    lines = list(script)
+    for point in reversed(points):
+        lines.insert(point.lineNumber, _read_command(point))
+    return "\n".join(lines)
+
+
+SCRIPT = ["def program():", "  movej(a)", "  movej(b)", "  movej(a)", "end"]
+
+
+def test_point_on_first_line():
+    result = inject_inspection_points(SCRIPT, _points(SCRIPT, 0), _read_command)
+
+    assert result.split("\n") == ["read_point(0)"] + SCRIPT
+
+
+def test_point_on_last_line():
+    result = inject_inspection_points(SCRIPT, _points(SCRIPT, 4), _read_command)
+
+    assert result.split("\n") == SCRIPT[:4] + ["read_point(0)", "end"]
+
+
+def test_points_sharing_a_line_keep_their_order():
+    result = inject_inspection_points(SCRIPT, _points(SCRIPT, 1, 1, 1), _read_command)
+
+    assert result.split("\n") == SCRIPT[:1] + ["read_point(0)", "read_point(1)", "read_point(2)"] + SCRIPT[1:]
+
+
+def test_duplicate_script_lines_are_told_apart_by_line_number():
+    result = inject_inspection_points(SCRIPT, _points(SCRIPT, 3), _read_command)
+
+    assert result.split("\n") == SCRIPT[:3] + ["read_point(0)"] + SCRIPT[3:]
+
+
+def test_no_points_returns_the_script():
+    assert inject_inspection_points(SCRIPT, [], _read_command) == "\n".join(SCRIPT)
+
+
+def test_unsorted_points_are_rejected():
+    with pytest.raises(InspectionPointError) as raised:
+        inject_inspection_points(SCRIPT, _points(SCRIPT, 3, 1), _read_command)
+
+    assert len(raised.value.errors) == 1
+    assert "not sorted" in raised.value.errors[0]
+
+
+def test_every_mismatch_is_reported():
+    points = [InspectionPointFormatFromFrontend(0, 1, "movel(a)", []),
+              InspectionPointFormatFromFrontend(1, 2, "  movej(b)", []),
+              InspectionPointFormatFromFrontend(2, 5, "end", []),
+              InspectionPointFormatFromFrontend(3, -1, "end", [])]
+
+    with pytest.raises(InspectionPointError) as raised:
+        inject_inspection_points(SCRIPT, points, _read_command)
+
+    assert len(raised.value.errors) == 3
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_result_as_inserting_one_by_one(seed: int):
+    rng = random.Random(seed)
+    script = [f"line {rng.randint(0, 5)}" for _ in range(rng.randint(1, 200))]
+    line_numbers = sorted(rng.randrange(len(script)) for _ in range(rng.randint(0, 40)))
+
+    points = _points(script, *line_numbers)
+
+    assert inject_inspection_points(script, points, _read_command) == _inserted_one_by_one(script, points)
@@ -0,0 +1,82 @@
+import time
+from collections import deque
+
+import pytest
+
+from RobotControl.RobotClasses import InterpreterMode as interpreter_module
+from RobotControl.RobotClasses.InterpreterMode import InterpreterMode, InterpreterReply
+
+
+class FakeInterpreterSocket:
+    """Hands out the chunks the interpreter sent, one per read, after the statement they follow was sent."""
+
+    def __init__(self):
+        self.sent: list[str] = []
+        self._replies: dict[int, list[str]] = dict()
+        self._chunks: deque[str] = deque()
+
+    def reply_after(self, statement_count: int, *chunks: str):
+        self._replies[statement_count] = list(chunks)
+
+    def send(self, data: bytes):
+        self.sent.append(data.decode())
+        self._chunks.extend(self._replies.pop(len(self.sent), []))
+
+    def read(self, connection, timeout: float) -> str:
+        if self._chunks:
+            return self._chunks.popleft()
+        time.sleep(max(timeout, 0))
+        return "nothing"
+
+
+@pytest.fixture
+def interpreter(monkeypatch):
+    monkeypatch.setattr(interpreter_module, "REPLY_TIMEOUT", 0.05)
+    fake_socket = FakeInterpreterSocket()
+    mode = object.__new__(InterpreterMode)
+    mode.controller = type("FakeController", (), {
+        "sanitize_command": staticmethod(lambda command: command.replace("\n", " ") + "\n"),
+        "read_from_socket": staticmethod(fake_socket.read),
+    })()
+    mode.interpreter_connection = fake_socket
+    mode._session_active = True
+    mode._received = ""
+    return mode, fake_socket
+
+
+def test_reply_is_matched_to_its_statement(interpreter):
+    mode, fake_socket = interpreter
+    fake_socket.reply_after(1, "ack: 4: ", "textmsg(1)\n")
+
+    reply = mode._send_statement("textmsg(1)")
+
+    assert reply.accepted
+    assert reply.message == "4"
+
+
+def test_late_reply_is_not_taken_for_the_next_statement(interpreter):
+    mode, fake_socket = interpreter
+    # The first statement is answered only after its timeout, together with the reply to the second one
+    fake_socket.reply_after(2, "ack: 1: slow()\n", "discard: Compile error: name 'b' is not defined: b\n")
+
+    assert mode._send_statement("slow()") is None
+    reply = mode._send_statement("b")
+
+    assert not reply.accepted
+    assert "Compile error" in reply.message
+
+
+def test_unread_lines_are_dropped_before_a_statement(interpreter):
+    mode, fake_socket = interpreter
+    mode._received = "ack: 7: old()\n"
+    fake_socket.reply_after(1, "ack: 8: new()\n")
+
+    reply = mode._send_statement("new()")
+
+    assert reply.message == "8"
+    assert mode._received == ""
+
+
+def test_reply_parsing():
+    assert str(InterpreterReply("ack: 12: movej(p[0, 0, 0, 0, 0, 0])")) == "ack: 12"
+    assert not InterpreterReply("discard: Compile error: x: y").accepted
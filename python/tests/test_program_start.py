@@ -0,0 +1,58 @@
+import threading
+import time
+import types
+
+import pytest
+
+import RobotControl.RunningWithSSH as running
+from RobotStatus import RobotStatus
+from SocketMessages import RuntimeStateTypes
+
+wait_for_program_start = getattr(running, "__wait_for_program_start")
+
+COMPILE_ERROR = "1700000000.000 ERROR - Compile error: name 'foo' is not defined"
+
+
+class FakeLog:
+    """The lines the robot logged since the program start, the compile error appears after a delay."""
+
+    def __init__(self, error_after: float | None):
+        self.error_at = None if error_after is None else time.monotonic() + error_after
+        self.reads = 0
+
+    def get_logs_from_last_program_run(self) -> list[str]:
+        self.reads += 1
+        if self.error_at is not None and time.monotonic() >= self.error_at:
+            return [COMPILE_ERROR, "1700000000.000 INFO Starting program"]
+        return []
+
+
+@pytest.fixture
+def robot(monkeypatch):
+    status = RobotStatus()
+    status.update(0, RuntimeStateTypes.stopped.value, 7)
+    fake = types.SimpleNamespace(status=status, ssh=None)
+    monkeypatch.setattr(running, "robot_status", status)
+    monkeypatch.setattr(running, "_log_stream", None)
+    monkeypatch.setattr(running.Robot, "get_instance", classmethod(lambda cls: fake))
+    return fake
+
+
+def test_compile_error_is_found_without_waiting_for_the_timeout(robot):
+    robot.ssh = FakeLog(error_after=0.15)
+    started_at = time.monotonic()
+
+    error = wait_for_program_start(started_at)
+
+    assert error == " Compile error: name 'foo' is not defined"
+    assert time.monotonic() - started_at < running.PROGRAM_START_TIMEOUT / 2
+
+
+def test_program_that_plays_returns_without_error(robot):
+    robot.ssh = FakeLog(error_after=None)
+    started_at = time.monotonic()
+    threading.Timer(0.15, robot.status.update, (0, RuntimeStateTypes.playing.value, 7)).start()
+
+    assert wait_for_program_start(started_at) == ""
+    assert time.monotonic() - started_at < running.PROGRAM_START_TIMEOUT / 2
+    assert robot.ssh.reads >= 1
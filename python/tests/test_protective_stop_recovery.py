@@ -0,0 +1,102 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from RobotControl import ProtectiveStopRecovery as recovery_module
+from RobotControl.ProtectiveStopRecovery import ProtectiveStopRecovery, RecoveryState
+from SocketMessages import ProtectiveStopRecoveryMessage, SafetyStatusTypes, Status
+from WebClientQueue import delivery_policy, DeliveryPolicy
+
+
+def test_states_are_sent_as_recovery_messages(monkeypatch):
+    sent = []
+    monkeypatch.setattr(recovery_module.websocket_notifier, "notify_observers", sent.append)
+    recovery = ProtectiveStopRecovery()
+    recovery.attempts = 2
+
+    recovery._set_state(RecoveryState.unlocking, "Unlocking protective stop, attempt 2")
+    recovery._set_state(RecoveryState.failed, "Unlock it on the teach pendant", Status.Error)
+
+    assert all(isinstance(message, ProtectiveStopRecoveryMessage) for message in sent)
+    assert json.loads(str(sent[0])) == {"type": "Protective_stop_recovery",
+                                        "data": {"state": "unlocking", "message": "Unlocking protective stop, attempt 2",
+                                                 "attempt": 2, "status": "Ok"}}
+    assert json.loads(str(sent[1]))["data"]["status"] == "Error"
+
+
+def test_only_the_newest_recovery_state_is_queued_for_a_slow_client():
+    assert delivery_policy(ProtectiveStopRecoveryMessage("idle", "released", 1)) == DeliveryPolicy.coalesce
+
+
+@pytest.fixture
+def refused_recovery(monkeypatch):
+    """A recovery without delays, whose every unlock is refused by the dashboard."""
+    for name in ("LOCKOUT_TIME", "POPUP_DELAY", "FIRST_RETRY_DELAY", "MAX_RETRY_DELAY"):
+        monkeypatch.setattr(recovery_module, name, 0)
+    sent = []
+    monkeypatch.setattr(recovery_module.websocket_notifier, "notify_observers", sent.append)
+    commands = []
+    recovery = ProtectiveStopRecovery()
+
+    async def refuse(command: str) -> str:
+        commands.append(command)
+        return "Cannot unlock protective stop until 5s after occurrence"
+
+    recovery._send_dashboard_command = refuse
+    return recovery, commands, sent
+
+
+def _status(safety_status: SafetyStatusTypes):
+    return types.SimpleNamespace(safety_status=safety_status, updated_at=0.0)
+
+
+async def _settle():
+    for _ in range(100):
+        await asyncio.sleep(0)
+
+
+def test_recovery_fails_after_max_attempts(refused_recovery):
+    recovery, commands, sent = refused_recovery
+
+    async def run():
+        recovery._loop = asyncio.get_running_loop()
+        recovery._on_status_changed(_status(SafetyStatusTypes.protective_stop))
+        await _settle()
+
+    asyncio.run(run())
+
+    assert recovery.state == RecoveryState.failed
+    assert recovery.attempts == recovery_module.MAX_ATTEMPTS
+    assert commands.count("unlock protective stop") == recovery_module.MAX_ATTEMPTS
+    assert json.loads(str(sent[-1]))["data"]["status"] == "Error"
+
+
+def test_failed_recovery_is_not_triggered_again_until_the_stop_is_left(refused_recovery):
+    recovery, commands, sent = refused_recovery
+
+    async def run():
+        recovery._loop = asyncio.get_running_loop()
+        recovery._on_status_changed(_status(SafetyStatusTypes.protective_stop))
+        await _settle()
+        unlocks_after_failure = commands.count("unlock protective stop")
+
+        # Robot mode or runtime state changes while the robot is still in protective stop
+        recovery._on_status_changed(_status(SafetyStatusTypes.protective_stop))
+        recovery.trigger()
+        await _settle()
+        assert commands.count("unlock protective stop") == unlocks_after_failure
+        assert recovery.state == RecoveryState.failed
+
+        # The operator unlocked the robot, the next protective stop is recovered again
+        recovery._on_status_changed(_status(SafetyStatusTypes.normal_mode))
+        await _settle()
+        assert recovery.state == RecoveryState.idle
+        assert json.loads(str(sent[-1]))["data"]["state"] == "idle"
+
+        recovery._on_status_changed(_status(SafetyStatusTypes.protective_stop))
+        await _settle()
+        assert commands.count("unlock protective stop") == 2 * unlocks_after_failure
+
+    asyncio.run(run())
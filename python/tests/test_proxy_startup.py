@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+
+import ProxyStartup
+import RtdeConnection
+from ProxyStartup import supervise, start_robot_connections, ProxyReadiness
+
+
+@pytest.fixture(autouse=True)
+def no_restart_delay(monkeypatch):
+    monkeypatch.setattr(ProxyStartup, "RESTART_DELAY", 0)
+
+
+def test_failing_robot_task_is_restarted_while_the_servers_keep_running():
+    async def run():
+        starts = []
+        server_ticks = []
+
+        async def robot_loop():
+            starts.append(len(starts))
+            if len(starts) < 3:
+                raise RuntimeError("RTDE sample could not be read")
+            await asyncio.sleep(3600)
+
+        async def server():
+            while True:
+                server_ticks.append(len(starts))
+                await asyncio.sleep(0.001)
+
+        async with asyncio.TaskGroup() as tg:
+            server_task = tg.create_task(server())
+            supervised = supervise("RTDE loop", robot_loop)
+            await asyncio.sleep(0.05)
+            assert not server_task.done()
+            assert not supervised.done()
+            supervised.cancel()
+            server_task.cancel()
+        return starts, server_ticks, supervised
+
+    starts, server_ticks, supervised = asyncio.run(run())
+
+    assert starts == [0, 1, 2]
+    assert server_ticks[-1] == 3
+    assert supervised.cancelled()
+
+
+def test_task_that_returns_is_not_restarted():
+    async def run():
+        starts = []
+
+        async def connect():
+            starts.append(True)
+
+        await supervise("Robot connection", connect)
+        return starts
+
+    assert asyncio.run(run()) == [True]
+
+
+class FakeRtdeReader:
+    """Fails reading the first sample, like a package that cannot be unpacked, and then waits for samples forever."""
+
+    created = 0
+
+    def __init__(self, loop):
+        FakeRtdeReader.created += 1
+        self.frequency = 500
+        self.samples_read = 0
+
+    def start(self):
+        pass
+
+    async def next_sample(self):
+        self.samples_read += 1
+        if self.samples_read == 1:
+            raise ValueError("Unexpected package size")
+        await asyncio.sleep(3600)
+
+
+def test_restarted_rtde_loop_keeps_its_reader_and_listeners(monkeypatch):
+    FakeRtdeReader.created = 0
+    monkeypatch.setattr(RtdeConnection, "RtdeReader", FakeRtdeReader)
+    monkeypatch.setattr(RtdeConnection, "_rtde_reader", None)
+    monkeypatch.setattr(RtdeConnection, "listeners", [])
+    monkeypatch.setattr(RtdeConnection, "block_listeners", [])
+    monkeypatch.setattr(RtdeConnection.rtde_history, "configure", lambda layout, size: None)
+    monkeypatch.setattr(RtdeConnection.rtde_subscriptions, "configure", lambda layout: None)
+
+    async def run():
+        supervised = supervise("RTDE loop", RtdeConnection.start_rtde_loop)
+        await asyncio.sleep(0.05)
+        supervised.cancel()
+
+    asyncio.run(run())
+
+    assert FakeRtdeReader.created == 1
+    assert RtdeConnection._rtde_reader.samples_read == 2
+    assert len(RtdeConnection.listeners) == 1
+    assert len(RtdeConnection.block_listeners) == 3
+
+
+class FakeRobotModules:
+    """Stands in for the robot modules start_robot_connections imports, connecting fails connect_failures times."""
+
+    def __init__(self, connect_failures: int = 0, recovery_error: Exception | None = None):
+        self.connect_failures = connect_failures
+        self.recovery_error = recovery_error
+        self.rtde_loop_started = False
+        self.log_stream_started = False
+
+    def get_instance(self):
+        if self.connect_failures > 0:
+            self.connect_failures -= 1
+            raise ConnectionRefusedError("Dashboard is not reachable")
+
+    async def start_rtde_loop(self):
+        self.rtde_loop_started = True
+        await asyncio.sleep(3600)
+
+    async def start_robot_log_stream(self):
+        self.log_stream_started = True
+
+    async def start_protective_stop_recovery(self):
+        if self.recovery_error is not None:
+            raise self.recovery_error
+
+    def import_modules(self):
+        robot_class = type("FakeRobot", (), {"get_instance": staticmethod(self.get_instance)})
+        return robot_class, self.start_rtde_loop, self.start_robot_log_stream, self.start_protective_stop_recovery
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    """Records the readiness states sent to the web clients."""
+    monkeypatch.setattr(ProxyStartup, "CONNECT_RETRY_DELAY", 0)
+    monkeypatch.setattr(ProxyStartup, "proxy_readiness", ProxyReadiness())
+    states: list[str] = []
+    monkeypatch.setattr(ProxyStartup.websocket_notifier, "notify_observers",
+                        lambda message: states.append(json.loads(str(message))["data"]["state"]))
+    return states
+
+
+def _start(monkeypatch, modules: FakeRobotModules):
+    monkeypatch.setattr(ProxyStartup, "__import_robot_modules", modules.import_modules)
+
+    async def run():
+        await start_robot_connections()
+        await asyncio.sleep(0.05)
+        for task in list(ProxyStartup._supervised_tasks):
+            task.cancel()
+
+    asyncio.run(run())
+
+
+def test_readiness_goes_from_connecting_to_ready(monkeypatch, readiness):
+    modules = FakeRobotModules()
+
+    _start(monkeypatch, modules)
+
+    assert readiness == ["connecting", "ready"]
+    assert ProxyStartup.proxy_readiness.ready_after is not None
+    assert modules.rtde_loop_started and modules.log_stream_started
+
+
+def test_failed_connection_is_reported_and_retried(monkeypatch, readiness):
+    _start(monkeypatch, FakeRobotModules(connect_failures=2))
+
+    assert readiness == ["connecting", "failed", "connecting", "failed", "connecting", "ready"]
+
+
+def test_failed_recovery_start_is_reported(monkeypatch, readiness):
+    modules = FakeRobotModules(recovery_error=RuntimeError("Robot status is not available"))
+
+    _start(monkeypatch, modules)
+
+    assert readiness == ["connecting", "failed"]
+    assert "Robot status is not available" in ProxyStartup.proxy_readiness.message
+    assert not modules.rtde_loop_started
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+from RobotJobScheduler import RobotJobScheduler
+
+
+def test_scheduler_keeps_running_after_a_submitter_stopped_waiting():
+    async def run():
+        scheduler = RobotJobScheduler(rate=10, burst=10)
+        release = threading.Event()
+
+        def blocking_job(cancellation) -> str:
+            release.wait(2)
+            return "first"
+
+        waiting = asyncio.create_task(scheduler.submit("a", blocking_job))
+        await asyncio.sleep(0.05)
+        # Like a web client that disconnects while its script is running
+        waiting.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        second = await asyncio.wait_for(scheduler.submit("b", lambda cancellation: "second"), 2)
+        return second, scheduler.statistics
+
+    second, statistics = asyncio.run(run())
+
+    assert second == "second"
+    assert statistics.completed == 2
+    assert statistics.failed == 0
+
+
+def test_superseding_a_job_whose_submitter_stopped_waiting():
+    async def run():
+        scheduler = RobotJobScheduler(rate=10, burst=10)
+        release = threading.Event()
+        running = asyncio.create_task(scheduler.submit("a", lambda cancellation: str(release.wait(2))))
+        await asyncio.sleep(0.05)
+
+        queued = asyncio.create_task(scheduler.submit("b", lambda cancellation: "old"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0)
+        newer = asyncio.create_task(scheduler.submit("b", lambda cancellation: "new"))
+        await asyncio.sleep(0)
+        release.set()
+        return await running, await newer
+
+    assert asyncio.run(run()) == ("True", "new")
+
+
+def test_queued_job_of_a_disconnected_client_is_counted_as_cancelled():
+    async def run():
+        scheduler = RobotJobScheduler(rate=10, burst=10)
+        release = threading.Event()
+        running = asyncio.create_task(scheduler.submit("a", lambda cancellation: str(release.wait(2))))
+        await asyncio.sleep(0.05)
+
+        queued = asyncio.create_task(scheduler.submit("b", lambda cancellation: "never run"))
+        await asyncio.sleep(0)
+        scheduler.forget("b")
+        await asyncio.sleep(0)
+        release.set()
+        await running
+        return queued, scheduler.statistics
+
+    queued, statistics = asyncio.run(run())
+
+    assert queued.cancelled()
+    assert statistics.cancelled == 1
+    assert statistics.completed == 1
+    assert statistics.dump()["cancelled"] == 1
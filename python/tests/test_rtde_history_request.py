@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from SocketMessages import parse_message, RtdeHistoryRequestMessage, AckResponse, Status
+from WebsocketProxy import handle_rtde_history_request
+
+
+def _request(**data) -> str:
+    return json.dumps({"type": "Rtde_history_request", "data": {"id": 1, "fields": ["actual_q"], "start": 0,
+                                                                 "end": 1000} | data})
+
+
+def test_valid_request_is_parsed():
+    message = parse_message(_request(maxSamples=100))
+
+    assert isinstance(message, RtdeHistoryRequestMessage)
+    assert message.data.max_samples == 100
+
+
+def test_max_samples_is_optional():
+    assert parse_message(_request()).data.max_samples is None
+
+
+@pytest.mark.parametrize("max_samples", ["100", 10.5, 0, -3, True, [1]])
+def test_invalid_max_samples_is_rejected(max_samples):
+    with pytest.raises(ValueError):
+        parse_message(_request(maxSamples=max_samples))
+
+
+@pytest.mark.parametrize("id", ["1", None, 1.5])
+def test_id_must_be_an_integer(id):
+    with pytest.raises(ValueError):
+        parse_message(_request(id=id))
+
+
+def test_infinite_range_is_rejected():
+    with pytest.raises(ValueError):
+        parse_message(_request(end=float("inf")))
+
+
+def test_unknown_field_is_answered_with_an_error():
+    response = handle_rtde_history_request(parse_message(_request(fields=["no_such_field"])))
+
+    assert isinstance(response, AckResponse)
+    assert response.data.status == Status.Error
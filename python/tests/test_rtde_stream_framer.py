@@ -0,0 +1,101 @@
+import asyncio
+import random
+import socket
+import struct
+import types
+
+import pytest
+
+import RtdeConnection
+from RtdeSampleBlock import RtdeStreamFramer, RTDE_HEADER, RTDE_DATA_PACKAGE, RTDE_TEXT_MESSAGE
+
+
+def _package(command: int, payload: bytes) -> bytes:
+    return RTDE_HEADER.pack(RTDE_HEADER.size + len(payload), command) + payload
+
+
+def _sample(index: int) -> bytes:
+    # The timestamp is the first field of the recipe, the other fields stay zero
+    layout = RtdeConnection.recipe_layout
+    packed = struct.pack(">d", index * 0.002) + bytes(layout.package_size - 8)
+    assert len(packed) == layout.package_size
+    return packed
+
+
+def _data_package(index: int) -> bytes:
+    # The recipe id comes first
+    return _package(RTDE_DATA_PACKAGE, b"\x01" + _sample(index))
+
+
+def test_split_returns_payloads_without_header_and_recipe_id():
+    framer = RtdeStreamFramer()
+    framer.feed(_data_package(0) + _data_package(1))
+
+    packages = framer.split()
+
+    assert [bytes(package) for package in packages] == [_sample(0), _sample(1)]
+    assert framer.pending == 0
+
+
+def test_other_packages_are_skipped():
+    framer = RtdeStreamFramer()
+    framer.feed(_package(RTDE_TEXT_MESSAGE, b"\x03hello") + _data_package(0))
+
+    assert [bytes(package) for package in framer.split()] == [_sample(0)]
+    assert framer.skipped_packages == 1
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_stream_split_at_random_boundaries(seed: int):
+    rng = random.Random(seed)
+    stream = b"".join(_data_package(index) for index in range(200))
+    framer = RtdeStreamFramer()
+    received = []
+
+    position = 0
+    while position < len(stream):
+        length = rng.randint(1, 700)
+        framer.feed(stream[position:position + length])
+        position += length
+        # The views are only valid until the next feed
+        received.extend(bytes(package) for package in framer.split())
+
+    assert received == [_sample(index) for index in range(200)]
+    assert framer.pending == 0
+
+
+def test_every_single_split_point_of_a_package():
+    package = _data_package(7)
+    for split_at in range(len(package) + 1):
+        framer = RtdeStreamFramer()
+        framer.feed(package[:split_at])
+        first = [bytes(view) for view in framer.split()]
+        framer.feed(package[split_at:])
+        assert first + [bytes(view) for view in framer.split()] == [_sample(7)]
+
+
+def test_invalid_size_is_reported():
+    framer = RtdeStreamFramer()
+    framer.feed(RTDE_HEADER.pack(1, RTDE_DATA_PACKAGE))
+
+    with pytest.raises(ValueError):
+        framer.split()
+
+
+def test_reader_streams_samples_from_the_socket_until_it_is_closed():
+    loop = asyncio.new_event_loop()
+    reader = RtdeConnection.RtdeReader(loop)
+    robot, proxy = socket.socketpair()
+    # The setup left the first package in the library's buffer
+    session = types.SimpleNamespace(_RTDE__sock=proxy, _RTDE__buf=_data_package(0))
+    robot.sendall(b"".join(_data_package(index) for index in range(1, 120)))
+    robot.close()
+
+    reason = reader._read_session(session)
+
+    assert "closed" in reason
+    assert reader.statistics.samples_received == 120
+    staged = sum(len(block) for block in reader._pending_blocks) + reader._block_builder._count
+    assert staged == 120
+    proxy.close()
+    loop.close()
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from RtdeConnection import recipe_layout
+from RtdeSubscriptions import RtdeSubscription
+from SocketMessages import parse_message, RtdeSubscriptionMessage
+
+
+def _subscription(**data) -> str:
+    return json.dumps({"type": "Rtde_subscription", "data": {"id": 1, "fields": ["actual_q"], "maxRate": 50} | data})
+
+
+def test_valid_subscription_is_parsed():
+    message = parse_message(_subscription(mode="average"))
+
+    assert isinstance(message, RtdeSubscriptionMessage)
+    assert message.data.max_rate == 50
+    assert message.data.mode == "average"
+
+
+def test_unsubscription_without_a_rate_is_parsed():
+    assert parse_message(_subscription(fields=[], maxRate=0)).data.fields == []
+
+
+@pytest.mark.parametrize("max_rate", [float("nan"), float("inf"), float("-inf"), True, "50", None])
+def test_invalid_max_rate_is_rejected(max_rate):
+    with pytest.raises(ValueError):
+        parse_message(_subscription(maxRate=max_rate))
+
+
+def test_non_finite_json_numbers_are_rejected():
+    # json.loads accepts these, though they are not valid JSON
+    for text in ("NaN", "Infinity", "-Infinity"):
+        with pytest.raises(ValueError):
+            parse_message('{"type": "Rtde_subscription", "data": {"id": 1, "fields": ["actual_q"], '
+                          f'"maxRate": {text}}}')
+
+
+@pytest.mark.parametrize("id", ["1", None, 1.5, True])
+def test_id_must_be_an_integer(id):
+    with pytest.raises(ValueError):
+        parse_message(_subscription(id=id))
+
+
+@pytest.mark.parametrize("max_rate", [float("nan"), float("inf"), 0, -5])
+def test_subscription_needs_a_positive_finite_rate(max_rate):
+    with pytest.raises(ValueError):
+        RtdeSubscription(recipe_layout, ["actual_q"], max_rate)
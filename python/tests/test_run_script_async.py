@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+import types
+
+import pytest
+
+import RtdeConnection
+import RobotControl.RunningWithSSH as running
+from RobotJobScheduler import RobotJobScheduler
+from RobotStatus import RobotStatus
+from RtdeSampleBlock import RTDE_HEADER, RTDE_DATA_PACKAGE
+from SocketMessages import RuntimeStateTypes
+
+SAMPLE_PERIOD = 0.002
+"""The fake controller streams at 500 Hz"""
+
+
+def _data_package(index: int) -> bytes:
+    sample = struct.pack(">d", index * SAMPLE_PERIOD) + bytes(RtdeConnection.recipe_layout.package_size - 8)
+    return RTDE_HEADER.pack(RTDE_HEADER.size + 1 + len(sample), RTDE_DATA_PACKAGE) + b"\x01" + sample
+
+
+class FakeController:
+    """Stands in for the robot's RTDE interface, streaming samples until it is stopped."""
+
+    def __init__(self):
+        self.robot_side, self.proxy_side = socket.socketpair()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._stream, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.robot_side.close()
+
+    def _stream(self):
+        index = 0
+        while not self._stopped.wait(SAMPLE_PERIOD):
+            self.robot_side.sendall(_data_package(index))
+            index += 1
+
+
+class FakeRobot:
+    """A robot whose SSH and dashboard calls block like the real ones, without a robot behind them."""
+
+    def __init__(self, status: RobotStatus, delay: float):
+        self.status = status
+        self.delay = delay
+        self.controller = types.SimpleNamespace(open_feedback_socket_string="", is_program_loaded=lambda: False,
+                                                load_program=self._load_program, start_program=self._start_program)
+        self.ssh = types.SimpleNamespace(write_script=self._write_script, forget_written_script=lambda: None,
+                                         mark_program_start=lambda: None, get_logs_from_last_program_run=lambda: [])
+        self.interpreter_mode = types.SimpleNamespace(end_session=lambda: None)
+
+    def _write_script(self, content: str) -> bool:
+        time.sleep(self.delay)
+        return True
+
+    def _load_program(self) -> str:
+        time.sleep(self.delay)
+        return "Loading program: /programs/script_code.script"
+
+    def _start_program(self) -> str:
+        time.sleep(self.delay)
+        self.status.update(0, RuntimeStateTypes.playing.value, 7)
+        return "Starting program"
+
+
+class FakeLogStream:
+    def __init__(self):
+        self.streaming = threading.Event()
+        self.streaming.set()
+
+    def wait_for_event(self, types, since, timeout):
+        time.sleep(timeout)
+        return None
+
+
+@pytest.fixture
+def robot(monkeypatch):
+    status = RobotStatus()
+    fake = FakeRobot(status, delay=0.15)
+    monkeypatch.setattr(running, "robot_status", status)
+    monkeypatch.setattr(running, "_log_stream", FakeLogStream())
+    monkeypatch.setattr(running, "robot_job_scheduler", RobotJobScheduler(rate=10, burst=10))
+    monkeypatch.setattr(running.Robot, "get_instance", classmethod(lambda cls: fake))
+    # The samples of the fake controller must not change the status the proxy uses
+    monkeypatch.setattr(RtdeConnection, "robot_status", RobotStatus())
+    return fake
+
+
+def test_rtde_samples_keep_flowing_while_a_script_runs(robot):
+    async def run():
+        reader = RtdeConnection.RtdeReader(asyncio.get_running_loop())
+        controller = FakeController()
+        session = types.SimpleNamespace(_RTDE__sock=controller.proxy_side, _RTDE__buf=b"")
+        reading = threading.Thread(target=reader._read_session, args=(session,), daemon=True)
+        reading.start()
+        controller.start()
+
+        consumed_at: list[float] = []
+
+        async def consume():
+            while True:
+                await reader.next_sample()
+                consumed_at.append(time.monotonic())
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        started_at = time.monotonic()
+        result = await running.run_script_on_robot_async("client", "textmsg(1)")
+        finished_at = time.monotonic()
+        consumer.cancel()
+        controller.stop()
+        reading.join(timeout=2)
+        controller.proxy_side.close()
+        return result, started_at, finished_at, consumed_at
+
+    result, started_at, finished_at, consumed_at = asyncio.run(run())
+
+    assert result == ""
+    # Writing, loading and starting the program each block for 0.15 s
+    assert finished_at - started_at >= 0.45
+    during_run = [at for at in consumed_at if started_at <= at <= finished_at]
+    assert len(during_run) >= 50
+    gaps = [later - earlier for earlier, later in zip([started_at] + during_run, during_run + [finished_at])]
+    assert max(gaps) < 0.1
+
+
+def test_failed_write_is_reported_without_playing_the_old_program(robot):
+    played = []
+
+    def failing_write(content: str) -> bool:
+        raise OSError("Socket is closed")
+
+    robot.ssh.write_script = failing_write
+    robot.controller.load_program = lambda: played.append("load")
+    robot.controller.start_program = lambda: played.append("play")
+
+    result = running.run_script_on_robot("textmsg(1)")
+
+    assert result == "Writing the script to the robot failed: Socket is closed"
+    assert played == []
@@ -0,0 +1,105 @@
+import io
+import random
+
+import pytest
+
+from RobotControl.RobotClasses import SSH as ssh_module
+from RobotControl.RobotClasses.SSH import SSH
+
+read_lines_backwards = SSH._SSH__read_lines_backwards
+
+
+def _expected(data: bytes) -> list[str]:
+    lines = [line.removesuffix(b"\r").decode() for line in data.split(b"\n")]
+    return [line for line in reversed(lines) if line]
+
+
+def _read(data: bytes, start: int = 0) -> list[str]:
+    return list(read_lines_backwards(io.BytesIO(data), len(data), start))
+
+
+LOG = b"first line\nsecond line\n\nthird line that is a bit longer\nfourth\n"
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 5, 8, 13, 64, 65536])
+def test_lines_straddling_block_boundaries(monkeypatch, block_size: int):
+    monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", block_size)
+
+    assert _read(LOG) == ["fourth", "third line that is a bit longer", "second line", "first line"]
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 7, 65536])
+def test_missing_trailing_newline(monkeypatch, block_size: int):
+    monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", block_size)
+
+    assert _read(b"first\nsecond\nunfinished") == ["unfinished", "second", "first"]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 6, 65536])
+def test_crlf_line_endings(monkeypatch, block_size: int):
+    monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", block_size)
+
+    assert _read(b"first\r\nsecond\r\n\r\nthird\r") == ["third", "second", "first"]
+
+
+def test_empty_file():
+    assert _read(b"") == []
+
+
+def test_only_lines_after_start_are_read(monkeypatch):
+    monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", 4)
+    start = LOG.index(b"third")
+
+    assert _read(LOG, start) == ["fourth", "third line that is a bit longer"]
+
+
+def test_multi_byte_characters_split_by_a_block():
+    data = "før\nstøp\n".encode()
+
+    for block_size in range(1, len(data) + 1):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", block_size)
+            assert _read(data) == ["støp", "før"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_logs(monkeypatch, seed: int):
+    rng = random.Random(seed)
+    data = b"".join(rng.choice([b"\n", b"\r\n", b"a", b"bc", b"Starting program", b"\r"])
+                    for _ in range(rng.randint(0, 300)))
+    monkeypatch.setattr(ssh_module, "LOG_READ_BLOCK_SIZE", rng.randint(1, 40))
+
+    assert _read(data) == _expected(data)
+
+
+@pytest.fixture
+def local_log(tmp_path):
+    ssh = object.__new__(SSH)
+    ssh.local_error_log = str(tmp_path / "URControl.log")
+    ssh.program_start_offset = None
+    return ssh
+
+
+def test_last_lines_of_a_local_log(local_log):
+    with open(local_log.local_error_log, "wb") as f:
+        f.write(LOG)
+
+    assert local_log.read_lines_from_log(2) == "third line that is a bit longer\nfourth"
+
+
+def test_empty_local_log(local_log):
+    open(local_log.local_error_log, "wb").close()
+
+    assert local_log.read_lines_from_log(5) == ""
+    assert local_log.get_logs_from_last_program_run() == []
+
+
+def test_logs_of_the_last_program_run(local_log):
+    with open(local_log.local_error_log, "wb") as f:
+        f.write(b"old\r\nStarting program a\r\nerror 1\r\n")
+        local_log.program_start_offset = f.tell()
+        f.write(b"Starting program b\r\nerror 2\r\nerror 3")
+
+    assert local_log.get_logs_from_last_program_run() == ["error 3", "error 2"]
+    local_log.program_start_offset = None
+    assert local_log.get_logs_from_last_program_run() == ["error 3", "error 2"]
@@ -0,0 +1,77 @@
+import io
+import types
+from contextlib import contextmanager
+
+import pytest
+
+from RobotControl.RobotClasses.SSH import SSH
+
+
+class FakeSftp:
+    """Keeps the written files in memory. The next write fails after fail_next_write bytes, like a dropped connection."""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = dict()
+        self.fail_next_write: int | None = None
+        self.mtime = 0
+
+    @contextmanager
+    def file(self, path: str, mode: str):
+        buffer = io.BytesIO()
+        yield buffer
+        if self.fail_next_write is not None:
+            self.files[path] = buffer.getvalue()[:self.fail_next_write]
+            self.fail_next_write = None
+            raise OSError("Socket is closed")
+        self.files[path] = buffer.getvalue()
+        self.mtime += 1
+
+    def stat(self, path: str):
+        return types.SimpleNamespace(st_size=len(self.files[path]), st_mtime=self.mtime)
+
+
+@pytest.fixture
+def ssh():
+    sftp = FakeSftp()
+
+    @contextmanager
+    def session():
+        yield sftp
+
+    instance = object.__new__(SSH)
+    instance.path_to_programs_dir = "/programs"
+    instance.local_programs_dir = None
+    instance._written_files = dict()
+    instance.sftp_pool = types.SimpleNamespace(session=session)
+    return instance, sftp
+
+
+def test_unchanged_script_is_not_written_again(ssh):
+    instance, sftp = ssh
+
+    assert instance.write_script("textmsg(1)") is True
+    assert instance.write_script("textmsg(1)") is False
+
+
+def test_failed_write_raises_and_is_not_taken_as_up_to_date(ssh):
+    instance, sftp = ssh
+    instance.write_script("textmsg(1)")
+    sftp.fail_next_write = 4
+
+    with pytest.raises(OSError):
+        instance.write_script("textmsg(2)")
+    assert "/programs/script_code.script" not in instance._written_files
+
+    # The same content again must be written, the file on the robot is cut off
+    assert instance.write_script("textmsg(2)") is True
+    assert sftp.files["/programs/script_code.script"] == b"textmsg(2)"
+
+
+def test_failed_local_write_raises(tmp_path):
+    instance = object.__new__(SSH)
+    instance.path_to_programs_dir = "/programs"
+    instance.local_programs_dir = str(tmp_path / "missing")
+    instance._written_files = dict()
+
+    with pytest.raises(OSError):
+        instance.write_script("textmsg(1)")
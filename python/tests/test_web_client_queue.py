@@ -0,0 +1,85 @@
+import asyncio
+
+from websockets.exceptions import ConnectionClosedOK
+
+from BinaryWireFormat import WireFormat
+from SocketMessages import AckResponse, Status
+from WebClientQueue import WebClientQueue, OutgoingFrame
+
+
+class FakeWebsocket:
+    def __init__(self, fail_on: set[str]):
+        self.fail_on = fail_on
+        self.sent: list[str] = []
+        self.closed = False
+
+    async def send(self, frame: str):
+        if any(marker in frame for marker in self.fail_on):
+            raise RuntimeError("transport failed")
+        self.sent.append(frame)
+
+
+def _frame(message: str) -> OutgoingFrame:
+    return OutgoingFrame(AckResponse(1, "Command", message, Status.Ok))
+
+
+async def _write(websocket, messages: list[str]) -> WebClientQueue:
+    queue = WebClientQueue(websocket, WireFormat.json, 16)
+    queue.start()
+    for message in messages:
+        queue.put(_frame(message))
+    await asyncio.sleep(0.01)
+    return queue
+
+
+def test_writer_keeps_writing_after_a_failed_frame():
+    websocket = FakeWebsocket({"broken"})
+
+    async def run():
+        queue = await _write(websocket, ["first", "broken", "last"])
+        assert queue._writer is not None and not queue._writer.done()
+        queue.put(_frame("later"))
+        await asyncio.sleep(0.01)
+        queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+
+    assert [frame for frame in websocket.sent if "broken" in frame] == []
+    assert len(websocket.sent) == 3
+    assert queue.statistics.failed == 1
+    assert queue.statistics.sent == 3
+
+
+def test_writer_stops_when_the_connection_is_closed():
+    websocket = FakeWebsocket(set())
+
+    async def closed_send(frame: str):
+        raise ConnectionClosedOK(None, None)
+    websocket.send = closed_send
+
+    async def run():
+        queue = await _write(websocket, ["first"])
+        return queue._writer.done()
+
+    assert asyncio.run(run())
+
+
+def test_first_byte_is_marked_when_the_first_frame_is_written():
+    websocket = FakeWebsocket(set())
+    marked_after: list[int] = []
+
+    async def run():
+        queue = WebClientQueue(websocket, WireFormat.json, 16, on_first_sent=lambda: marked_after.append(
+            len(websocket.sent)))
+        queue.put(_frame("first"))
+        queue.put(_frame("second"))
+        # Queued is not sent, the writer has not run yet
+        assert marked_after == []
+        queue.start()
+        await asyncio.sleep(0.01)
+        queue.stop()
+
+    asyncio.run(run())
+
+    assert marked_after == [1]
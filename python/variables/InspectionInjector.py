@@ -0,0 +1,68 @@
+from typing import Callable
+
+from SocketMessages import InspectionPointFormatFromFrontend
+from custom_logging import LogConfig
+
+recurring_logger = LogConfig.get_recurring_logger(__name__)
+non_recurring_logger = LogConfig.get_non_recurring_logger(__name__)
+
+
+class InspectionPointError(ValueError):
+    """Raised when inspection points do not match the script. Holds every mismatch, not only the first one."""
+
+    def __init__(self, errors: list[str]):
+        self.errors: list[str] = errors
+        super().__init__(f"{len(errors)} inspection point(s) do not match the script: " + " ".join(errors))
+
+
+def inject_inspection_points(script_text: list[str], inspection_points: list[InspectionPointFormatFromFrontend],
+                             generate_read_command: Callable[[InspectionPointFormatFromFrontend], str]) -> str:
+    """
+    Builds the final script with the read command of every inspection point placed in front of its line.
+
+    The script lines and the inspection points are merged in a single pass, which also validates every point.
+    Several points may share a line, their read commands keep the order of the points.
+
+        Args:
+            script_text: The lines of the script.
+            inspection_points: The inspection points, sorted by their 0-based line number.
+            generate_read_command: Returns the URScript reading the variables of an inspection point.
+
+        Returns:
+            The script with the read commands as a single string.
+
+        Raises:
+            InspectionPointError: If any point is out of order, out of range, or does not match the command on its line.
+    """
+    errors: list[str] = []
+    parts: list[str] = []
+    copied = 0
+    previous_line_number: int | None = None
+
+    for point in inspection_points:
+        line_number = point.lineNumber
+        if previous_line_number is not None and line_number < previous_line_number:
+            errors.append(f"Inspection point {point.id} at line {line_number} is not sorted by line number.")
+            continue
+        previous_line_number = line_number
+        if not 0 <= line_number < len(script_text):
+            errors.append(f"Line number {line_number} of inspection point {point.id} is outside of the script "
+                          f"with {len(script_text)} lines.")
+            continue
+        if script_text[line_number] != point.command:
+            errors.append(f"Command '{point.command}' does not match the script text ({script_text[line_number]}) "
+                          f"at line {line_number}.")
+            continue
+        if errors:
+            # The script is not sent anyway, only the remaining points are validated
+            continue
+
+        parts.extend(script_text[copied:line_number])
+        parts.append(generate_read_command(point))
+        copied = line_number
+
+    if errors:
+        raise InspectionPointError(errors)
+
+    parts.extend(script_text[copied:])
+    return "\n".join(parts)